@@ -0,0 +1,286 @@
+## run_benchmarks.py
+## Benchmark the NumPy paths of the preprocessing hot paths on synthetic HUC12s (see synthetic_huc.py):
+##   fill           - Fill (flow_functions.fillDepressions)
+##   flowd8         - FlowD8: FlowDirection and AreaD8
+##   tiled_chain    - Fill, FlowDirection and AreaD8 a tile at a time (tile_functions.py, 4x4 tiles)
+##   dropanalysis   - PeukerDouglas, weighted Aread8 and Dropanalysis
+##   mkwsheds       - StreamNet watershed grid used by mkWSheds
+##   sampler_sample - Sampler sampling of the rasters and intersection with fields and STATSGO2
+##   sol_exists     - Sampler SOL_Exists evaluation
+##   sample_store   - writing the good samples to a sample_store file and reading it back a flowpath at a time
+##   tillage_assign - tillageAssign management and tillage codes
+##   tillage_huc8   - tillageAssignHuc8, the grouped assignment of a HUC8's fields (12 HUC12s of the synthetic fields)
+##   table_join     - FBndID joins of LU6 and residue cover through the table_cache
+##
+## Some of these are proxy benchmarks. dropanalysis and mkwsheds time the NumPy reimplementations in
+##  flow_functions.py, not the TauDEM (mpiexec) steps cmd_channel_DEP.py runs, and sampler_sample times
+##  sampler_functions.sampleGrids/zoneCodes in place of Sample and Intersect. A regression in those is a
+##  regression of the NumPy modules only, it says nothing about the arcpy or TauDEM code, time that on real
+##  HUC12s in ArcGIS. The other stages (fill, flowd8, tiled_chain, sol_exists, sample_store, tillage_assign,
+##  tillage_huc8, table_join) time code the tools do run.
+##
+## Each run appends one JSON line per stage and size to the history file (machine, commit, versions,
+##  best of --repeat timings). A stage that is slower than its threshold ratio (thresholds.json) times the
+##  median of its recent history on the same machine is reported as a regression, and the exit code is 1.
+##
+## Usage:
+##   python benchmarks/run_benchmarks.py [--sizes small medium] [--stages fill flowd8] [--repeat 3]
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - added tillage_huc8, inputs shared between stages are only computed once
+## 2026.10.19 - added tiled_chain
+## 2026.10.19 - sampler_sample and table_join keep FBndID, GenLU and CropRotatn dictionary encoded
+## 2026.10.19 - added sample_store
+## 2026.10.19 - header says which stages are proxies for arcpy/TauDEM code
+## 2026.10.19 - fill and flowd8 are no longer proxies, cmd_channel_DEP.py makes its flow grids with flow_functions
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import flow_functions as ff
+import sampler_functions as sf
+import tillage_functions as tf
+import tile_functions
+import table_cache
+import sample_store
+import synthetic_huc
+
+HISTORY = os.path.join(BENCH_DIR, 'history.jsonl')
+THRESHOLDS = os.path.join(BENCH_DIR, 'thresholds.json')
+
+
+##-------------------------------------------------------------------------------------------------------
+## stages take the synthetic HUC and a dictionary of results from earlier stages, they return a callable
+##  to time so the set up of inputs is not part of the timing
+
+def shared(ctx, name, make):
+    '''Input shared between stages, made the first time a stage needs it'''
+    if name not in ctx:
+        ctx[name] = make()
+    return ctx[name]
+
+
+def stageFill(huc, ctx):
+    return lambda: ff.fillDepressions(huc['dem'])
+
+
+def stageFlowD8(huc, ctx):
+    fel = shared(ctx, 'fel', lambda: ff.fillDepressions(huc['dem']))
+    def run():
+        p = ff.flowDirectionD8(fel)
+        return p, ff.areaD8(p)
+    return run
+
+
+def stageTiledChain(huc, ctx):
+    dem = huc['dem']
+    tileSize = max(16, -(-max(dem.shape) // 4))
+    def run():
+        fel = tile_functions.fillTiled(dem, np.empty(dem.shape), tileSize)
+        p = tile_functions.flowDirectionTiled(fel, np.zeros(dem.shape, dtype = np.uint8), tileSize)
+        return tile_functions.areaD8Tiled(p, np.empty(dem.shape), tileSize)
+    return run
+
+
+def stageDropAnalysis(huc, ctx):
+    fel = shared(ctx, 'fel', lambda: ff.fillDepressions(huc['dem']))
+    p = shared(ctx, 'p', lambda: ff.flowDirectionD8(fel))
+    n = huc['georef']['nrows'] * huc['georef']['ncols']
+    # same number of log spaced thresholds as the channel script's -par 1000 2500 50 0, scaled to the grid
+    minThresh = max(10.0, n / 6000.0)
+    def run():
+        ss = ff.peukerDouglas(fel)
+        ssa = ff.areaD8(p, ss)
+        return ff.dropAnalysis(p, fel, ssa, minThresh, minThresh * 2.5, 50)
+    return run
+
+
+def stageMkWSheds(huc, ctx):
+    fel = shared(ctx, 'fel', lambda: ff.fillDepressions(huc['dem']))
+    p = shared(ctx, 'p', lambda: ff.flowDirectionD8(fel))
+    ad8 = shared(ctx, 'ad8', lambda: ff.areaD8(p))
+    src = np.nan_to_num(ad8) >= max(50.0, ad8.size / 2000.0)
+    return lambda: ff.streamWatersheds(p, src)
+
+
+def stageSamplerSample(huc, ctx):
+    grids = {'elev': huc['dem'], 'fpLen': huc['fpLen'], 'ssurgo': huc['ssurgo'], 'gord': huc['gord'],
+             'irrigated': huc['irrigated'], 'canopy_cover': huc['canopy']}
+    fbndids = np.array([None] + huc['FB']['FBndID'], dtype = object)
+    def run():
+        smpl = sf.sampleGrids(huc['fp'], grids)
+        smpl['FBndID'] = sf.zoneCodes(huc['fields'], smpl['row'], smpl['col'], fbndids)
+        smpl['STATSGO2_MUKEY'] = sf.zoneLookup(huc['statsgo'], smpl['row'], smpl['col'])
+        smpl['X'], smpl['Y'] = sf.cellCenters(smpl['row'], smpl['col'], huc['georef'])
+        return smpl
+    return run
+
+
+def stageSolExists(huc, ctx):
+    smpl = shared(ctx, 'sample', stageSamplerSample(huc, ctx))
+    return lambda: sf.solExists(smpl['fp'], smpl['fpLen'], smpl['ssurgo'], smpl['STATSGO2_MUKEY'], huc['solDir'])
+
+
+def stageSampleStore(huc, ctx):
+    smpl = shared(ctx, 'sample', stageSamplerSample(huc, ctx))
+    columns = {'fp': smpl['fp'], 'fpLen': smpl['fpLen'], 'elevation': smpl['elev'], 'gord': smpl['gord'],
+               'SOL_FY': smpl['ssurgo'], 'STATSGO2_MUKEY': smpl['STATSGO2_MUKEY'], 'management': smpl['FBndID'],
+               'rotation': smpl['FBndID'], 'irrigated': smpl['irrigated'], 'canopy': smpl['canopy_cover'],
+               'x': smpl['X'], 'y': smpl['Y']}
+    path = os.path.join(huc['dir'], 'sample_store', 'smpl3m_mean18' + huc['huc12'] + sample_store.EXTENSION)
+    def run():
+        sample_store.writeSampleFile(path, columns, huc['huc12'])
+        with sample_store.SampleFile(path) as samples:
+            return sum(float(f['elevation'][0] - f['elevation'][-1]) for fpId, f in samples.flowpaths(['elevation']))
+    return run
+
+
+def stageTillageAssign(huc, ctx):
+    lu6 = huc['LU6']
+    rc = huc['RC'][synthetic_huc.YEARS[-1]]
+    field_len = synthetic_huc.YEARS[-1] - 2010 + 1
+    return lambda: tf.assignManagements(lu6['GenLU'], lu6['CropRotatn'], rc['MEDIAN'], field_len, 'none')
+
+
+def stageTillageHuc8(huc, ctx):
+    lu6 = huc['LU6']
+    rc = huc['RC'][synthetic_huc.YEARS[-1]]
+    field_len = synthetic_huc.YEARS[-1] - 2010 + 1
+    groups = [huc['huc12'][:8] + '%04d' % (i % 12) for i in range(len(lu6['GenLU']))]
+    return lambda: tf.assignManagementsGrouped(groups, lu6['GenLU'], lu6['CropRotatn'], rc['MEDIAN'], field_len, 'none')
+
+
+def stageTableJoin(huc, ctx):
+    cache = table_cache.TableCache(os.path.join(huc['dir'], 'table_cache'))
+    lu6 = cache.fromColumns(huc['huc12'], 'LU6', huc['LU6'])
+    rc = cache.fromColumns(huc['huc12'], 'RC', huc['RC'][synthetic_huc.YEARS[-1]])
+    fbndids = huc['FB']['FBndID']
+    def run():
+        joined = lu6.joinCodes(fbndids, ['GenLU', 'CropRotatn'])
+        joined.update(rc.join(fbndids, ['MEDIAN']))
+        return joined
+    return run
+
+
+STAGES = {'fill': stageFill,
+          'flowd8': stageFlowD8,
+          'tiled_chain': stageTiledChain,
+          'dropanalysis': stageDropAnalysis,
+          'mkwsheds': stageMkWSheds,
+          'sampler_sample': stageSamplerSample,
+          'sol_exists': stageSolExists,
+          'sample_store': stageSampleStore,
+          'tillage_assign': stageTillageAssign,
+          'tillage_huc8': stageTillageHuc8,
+          'table_join': stageTableJoin}
+
+##-------------------------------------------------------------------------------------------------------
+
+
+def gitCommit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = BENCH_DIR, stderr = subprocess.DEVNULL)
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def loadHistory(historyFile):
+    history = []
+    if os.path.isfile(historyFile):
+        with open(historyFile) as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    continue
+    return history
+
+
+def loadThresholds(thresholdsFile):
+    with open(thresholdsFile) as f:
+        return json.load(f)
+
+
+def baseline(history, node, stage, size, seed, nRecent):
+    '''Median of the most recent timings of a stage on this machine, None without history'''
+    past = [h['seconds'] for h in history
+            if h['node'] == node and h['stage'] == stage and h['size'] == size and h['seed'] == seed]
+    if len(past) == 0:
+        return None
+    return float(np.median(past[-nRecent:]))
+
+
+def timeStage(run, repeat):
+    best = None
+    for r in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - t0
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def runBenchmarks(sizes, stages, repeat, seed, historyFile = HISTORY, thresholdsFile = THRESHOLDS, record = True):
+    thresholds = loadThresholds(thresholdsFile)
+    history = loadHistory(historyFile)
+    node = platform.node()
+    commit = gitCommit()
+    results = []
+    regressions = []
+
+    for size in sizes:
+        huc = synthetic_huc.makeHuc(size, seed)
+        ctx = {}
+        for stage in stages:
+            run = STAGES[stage](huc, ctx)
+            seconds = timeStage(run, repeat)
+            base = baseline(history, node, stage, size, seed, thresholds.get('history', 5))
+            ratio = thresholds.get('stages', {}).get(stage, thresholds['default'])
+            result = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit, 'node': node,
+                      'python': platform.python_version(), 'numpy': np.__version__,
+                      'size': size, 'seed': seed, 'stage': stage, 'repeat': repeat,
+                      'seconds': seconds, 'baseline': base, 'threshold': ratio}
+            status = 'ok'
+            if base is not None and seconds > base * ratio:
+                status = 'REGRESSION'
+                regressions.append(result)
+            result['status'] = status
+            results.append(result)
+            print('%-8s %-15s %9.4f s  baseline %s  %s' % (size, stage, seconds,
+                  '-' if base is None else '%.4f s' % base, status))
+
+    if record:
+        with open(historyFile, 'a') as f:
+            for r in results:
+                f.write(json.dumps(r) + '\n')
+
+    return results, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark DEP preprocessing hot paths on synthetic HUC12s')
+    parser.add_argument('--sizes', nargs = '+', default = ['small', 'medium'], choices = sorted(synthetic_huc.SIZES))
+    parser.add_argument('--stages', nargs = '+', default = list(STAGES), choices = list(STAGES))
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--history', default = HISTORY)
+    parser.add_argument('--thresholds', default = THRESHOLDS)
+    parser.add_argument('--no-record', dest = 'record', action = 'store_false', help = 'do not append to the history')
+    args = parser.parse_args()
+
+    results, regressions = runBenchmarks(args.sizes, args.stages, args.repeat, args.seed,
+                                         args.history, args.thresholds, args.record)
+    if len(regressions) > 0:
+        print(str(len(regressions)) + ' stage(s) slower than their threshold')
+        sys.exit(1)
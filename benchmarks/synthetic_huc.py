@@ -0,0 +1,163 @@
+## synthetic_huc.py
+## Deterministic synthetic HUC12 inputs for benchmarking the preprocessing hot paths without DEP data:
+##  a DEM, flowpath and flowpath length grids, rasterized field boundaries with LU6 rotations and GenLU,
+##  yearly residue cover tables, SSURGO/STATSGO2 MUKEY grids with a matching tree of .sol files,
+##  and irrigation/canopy cover grids.
+##
+## The same size and seed always give the same HUC12.
+##
+## 2026.10.19 - original coding
+
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import flow_functions as ff
+
+# grid size (cells per side) and counts that scale with it
+SIZES = {'small': {'cells': 256, 'fields': 60, 'flowpaths': 150},
+         'medium': {'cells': 768, 'fields': 500, 'flowpaths': 1200},
+         'large': {'cells': 2048, 'fields': 3500, 'flowpaths': 8000}}
+
+HUC12 = '070801059901'
+CELLSIZE = 3.0
+YEARS = list(range(2014, 2024))
+ROTATION_START = 2008
+GENLU = ['Cropland', 'LT 10 ac', 'Forest', 'Pasture|Grass|Hay', 'Water/wetland', None]
+GENLU_WEIGHTS = [0.70, 0.08, 0.08, 0.08, 0.03, 0.03]
+ROTATIONS = ['CB', 'BC', 'CCB', 'C', 'BW', 'PPPP', 'FFFF', 'CBW']
+MAX_FLOWPATH_CELLS = 400
+
+
+def makeDem(rng, n):
+    '''Tilted plane with valleys, hills, pits and noise'''
+    y, x = np.mgrid[0:n, 0:n].astype(np.float64)
+    dem = 300.0 - 0.02 * y * CELLSIZE
+    dem += 4.0 * np.abs(np.sin(x / (n / 7.0)))
+    dem += 2.0 * np.sin(y / (n / 5.0)) * np.cos(x / (n / 3.0))
+    dem += rng.normal(0.0, 0.15, (n, n))
+    # scatter some pits for the fill to work on
+    pits = rng.integers(1, n - 1, (n // 4, 2))
+    dem[pits[:, 0], pits[:, 1]] -= rng.uniform(0.5, 2.0, pits.shape[0])
+    return dem
+
+
+def makePatches(rng, n, nPatches, first = 1):
+    '''Integer patch grid from the nearest of nPatches random seeds (blocky Voronoi)'''
+    block = 8
+    nb = (n + block - 1) // block
+    seeds = rng.uniform(0, nb, (nPatches, 2))
+    by, bx = np.mgrid[0:nb, 0:nb]
+    best = np.zeros((nb, nb), dtype = np.int32)
+    bestD = np.full((nb, nb), np.inf)
+    for i, (sy, sx) in enumerate(seeds):
+        d = (by - sy) ** 2 + (bx - sx) ** 2
+        closer = d < bestD
+        bestD[closer] = d[closer]
+        best[closer] = i
+    return (np.repeat(np.repeat(best, block, axis = 0), block, axis = 1)[:n, :n] + first).astype(np.int32)
+
+
+def traceFlowpaths(rng, p, n, nFlowpaths):
+    '''Flowpath id and length (cm) grids from random start cells traced down the D8 directions'''
+    ds = ff.downstreamIndex(p)
+    fpGrid = np.zeros(n * n, dtype = np.int32)
+    fpLen = np.full(n * n, np.nan, dtype = np.float32)
+    starts = rng.choice(n * n, nFlowpaths, replace = False)
+    fpId = 0
+    for s in starts:
+        if fpGrid[s] != 0:
+            continue
+        fpId += 1
+        cell = s
+        length = 0.0
+        steps = 0
+        while cell >= 0 and fpGrid[cell] == 0 and steps < MAX_FLOWPATH_CELLS:
+            fpGrid[cell] = fpId
+            fpLen[cell] = length
+            nxt = ds[cell]
+            if nxt >= 0:
+                diagonal = (nxt // n != cell // n) and (nxt % n != cell % n)
+                length += CELLSIZE * 100.0 * (np.sqrt(2.0) if diagonal else 1.0)
+            cell = nxt
+            steps += 1
+    return fpGrid.reshape(n, n), fpLen.reshape(n, n)
+
+
+def makeRotation(rng, genlu):
+    nYears = YEARS[-1] - ROTATION_START + 1
+    if genlu == 'Forest':
+        base = 'F'
+    elif genlu == 'Pasture|Grass|Hay':
+        base = 'P'
+    elif genlu == 'Water/wetland':
+        base = 'W' if rng.random() < 0.1 else 'X'
+    else:
+        base = ROTATIONS[rng.integers(len(ROTATIONS))]
+    offset = int(rng.integers(len(base)))
+    return (base * (nYears // len(base) + 2))[offset:offset + nYears]
+
+
+def writeSolFiles(solDir, prefix, keys, rng, missingFraction):
+    os.makedirs(solDir, exist_ok = True)
+    for k in keys:
+        if rng.random() >= missingFraction:
+            with open(os.path.join(solDir, prefix + '_' + str(int(k)) + '.sol'), 'w') as f:
+                f.write('2006.2\n')
+
+
+def makeHuc(size = 'small', seed = 0, outDir = None):
+    '''Build a synthetic HUC12, .sol files are written to outDir (a new temporary directory by default)'''
+    spec = SIZES[size]
+    n = spec['cells']
+    rng = np.random.default_rng(seed)
+    if outDir is None:
+        outDir = tempfile.mkdtemp(prefix = 'synthetic_huc_' + size + '_')
+
+    huc = {'huc12': HUC12, 'size': size, 'seed': seed, 'dir': outDir,
+           'georef': {'xmin': 500000.0, 'ymin': 4600000.0, 'cellsize': CELLSIZE, 'nrows': n, 'ncols': n,
+                      'spatialReference': 'EPSG:26915'}}
+
+    dem = makeDem(rng, n)
+    huc['dem'] = dem
+    # flowpaths follow the filled surface, as they do downstream of the channel step
+    p = ff.flowDirectionD8(ff.fillDepressions(dem))
+    huc['fp'], huc['fpLen'] = traceFlowpaths(rng, p, n, spec['flowpaths'])
+    huc['gord'] = rng.integers(1, 6, (n, n)).astype(np.int16)
+
+    # field boundaries rasterized to 1..nFields, 0 outside fields
+    fields = makePatches(rng, n, spec['fields'])
+    fields[rng.random((n, n)) < 0.02] = 0
+    huc['fields'] = fields
+    fbndids = ['F' + HUC12 + '_' + str(i) for i in range(1, spec['fields'] + 1)]
+    genlu = [GENLU[i] for i in rng.choice(len(GENLU), spec['fields'], p = GENLU_WEIGHTS)]
+    huc['FB'] = {'FBndID': fbndids, 'Acres': rng.uniform(5, 160, spec['fields']).round(1).tolist()}
+    huc['LU6'] = {'FBndID': fbndids, 'GenLU': genlu,
+                  'CropRotatn': [makeRotation(rng, g) for g in genlu]}
+    # median residue cover in percent, -100 and None for no data
+    huc['RC'] = {}
+    for year in YEARS:
+        rc = rng.uniform(0, 90, spec['fields']).round(1)
+        rcList = rc.tolist()
+        for i in np.flatnonzero(rng.random(spec['fields']) < 0.05):
+            rcList[i] = None
+        for i in np.flatnonzero(rng.random(spec['fields']) < 0.03):
+            rcList[i] = -100.0
+        huc['RC'][year] = {'FBndID': fbndids, 'MEDIAN': rcList}
+
+    # soils, a few cells of missing SSURGO like the gSSURGO mosaicing gaps
+    ssurgo = makePatches(rng, n, spec['fields'] * 2, first = 100000).astype(np.float64)
+    ssurgo[rng.random((n, n)) < 0.001] = np.nan
+    huc['ssurgo'] = ssurgo
+    huc['statsgo'] = makePatches(rng, n, max(4, spec['fields'] // 20), first = 600000)
+    huc['solDir'] = os.path.join(outDir, 'dep_WEPP_SOL2023')
+    writeSolFiles(huc['solDir'], 'DEP', np.unique(ssurgo[~np.isnan(ssurgo)]), rng, 0.05)
+    writeSolFiles(huc['solDir'], 'STATSGO', np.unique(huc['statsgo']), rng, 0.0)
+
+    huc['irrigated'] = (makePatches(rng, n, 20) % 7 == 0).astype(np.int16)
+    canopy = rng.uniform(0, 100, (n, n))
+    canopy[makePatches(rng, n, 30) % 3 != 0] = 0
+    huc['canopy'] = canopy.round()
+    return huc
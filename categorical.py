@@ -0,0 +1,142 @@
+## categorical.py
+## Dictionary encoded text columns for sample and tillage attributes that repeat a few distinct values many
+##  times (GenLU, CropRotatn and Management strings, FBndID, MUKEY). A column is held as integer codes into
+##  a per-column dictionary of its distinct values, -1 for null. Comparisons, joins and bulk assignments
+##  work on the codes (or once per distinct value), values are decoded back to strings only when they are
+##  written out.
+##
+## 2026.10.19 - original coding
+
+import numpy as np
+
+MISSING = -1
+
+
+class Categorical(object):
+    '''Integer codes (int32, -1 for null) into a dictionary of category values'''
+
+    def __init__(self, codes, categories):
+        self.codes = np.asarray(codes, dtype = np.int32)
+        self.categories = np.asarray(categories, dtype = object)
+        self._lookup = None
+
+    def __len__(self):
+        return self.codes.size
+
+    def __getitem__(self, index):
+        '''Rows of the column, sharing its dictionary'''
+        return Categorical(np.array(self.codes[index], ndmin = 1), self.categories)
+
+    def __repr__(self):
+        return 'Categorical(' + str(len(self)) + ' rows, ' + str(self.categories.size) + ' categories)'
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(len(str(c)) for c in self.categories.tolist())
+
+    def copy(self):
+        return Categorical(self.codes.copy(), self.categories.copy())
+
+    def code(self, value):
+        '''Code of a value, -1 for None, None if the value is not in the dictionary'''
+        if value is None:
+            return MISSING
+        if self._lookup is None:
+            self._lookup = {v: i for i, v in enumerate(self.categories.tolist())}
+        return self._lookup.get(value)
+
+    def addCategory(self, value):
+        '''Code of a value, adding it to the dictionary if it is new'''
+        c = self.code(value)
+        if c is None:
+            c = self.categories.size
+            self.categories = np.append(self.categories, np.array([value], dtype = object))
+            self._lookup[value] = c
+        return c
+
+    def decode(self):
+        '''Object array of the values, None for nulls'''
+        out = np.full(self.codes.shape, None, dtype = object)
+        has = self.codes >= 0
+        out[has] = self.categories[self.codes[has]]
+        return out
+
+    def tolist(self):
+        return self.decode().tolist()
+
+    def equals(self, value):
+        '''True where the column holds value (None matches nulls)'''
+        c = self.code(value)
+        if c is None:
+            return np.zeros(self.codes.shape, dtype = bool)
+        return self.codes == c
+
+    def isin(self, values):
+        '''True where the column holds one of values (None matches nulls)'''
+        codes = [c for c in (self.code(v) for v in values) if c is not None]
+        return np.isin(self.codes, codes)
+
+    def assign(self, mask, value):
+        '''Set the rows in mask to value, in place'''
+        self.codes[mask] = self.addCategory(value)
+        return self
+
+    def mapCategories(self, func, missing = None, dtype = object):
+        '''Array of func(value) for every row, func is called once per category, nulls get missing'''
+        per = np.array([func(v) for v in self.categories.tolist()] + [missing], dtype = dtype)
+        # code -1 picks the trailing missing entry
+        return per[self.codes]
+
+    def recode(self, categories):
+        '''The same column with codes into another dictionary holding all of its categories'''
+        target = Categorical([], categories)
+        mapping = [target.code(v) for v in self.categories.tolist()]
+        if None in mapping:
+            raise ValueError('categories missing from the new dictionary')
+        return Categorical(np.array(mapping + [MISSING], dtype = np.int32)[self.codes], target.categories)
+
+
+def encode(values, categories = None):
+    '''Categorical of a list or array of values (None for nulls), with a sorted dictionary of the distinct
+    values, or with the given dictionary extended by any values it does not hold'''
+    if isinstance(values, Categorical):
+        return values if categories is None else values.recode(categories)
+    values = np.asarray(values, dtype = object).ravel()
+    present = np.not_equal(values, None).astype(bool)
+    codes = np.full(values.size, MISSING, dtype = np.int32)
+    if categories is None:
+        # let numpy pick a str or number dtype for the values so the unique is not done on objects
+        uniq, inverse = np.unique(np.array(values[present].tolist()), return_inverse = True)
+        codes[present] = inverse.ravel()
+        return Categorical(codes, uniq.astype(object))
+    out = Categorical(codes, list(categories))
+    for v in set(values[present].tolist()):
+        out.addCategory(v)
+    codes[present] = [out.code(v) for v in values[present].tolist()]
+    return out
+
+
+def fromLookup(index, values):
+    '''Categorical of values[index] (-1 for null) where values may hold None and duplicates,
+    e.g. the FBndID of rasterized field numbers'''
+    dictionary = encode(values)
+    index = np.asarray(index)
+    inside = (index >= 0) & (index < dictionary.codes.size)
+    codes = np.full(index.shape, MISSING, dtype = np.int32)
+    codes[inside] = dictionary.codes[index[inside]]
+    return Categorical(codes, dictionary.categories)
+
+
+def concat(columns):
+    '''One Categorical from several, over the union of their dictionaries'''
+    if len(columns) == 0:
+        return Categorical([], [])
+    categories = encode(np.concatenate([c.categories for c in columns])).categories
+    return Categorical(np.concatenate([c.recode(categories).codes for c in columns]), categories)
+
+
+def pairCodes(a, b, nb):
+    '''Distinct (a, b) code pairs (b has nb codes, -1 allowed in both) and the pair of each row'''
+    key = (a.astype(np.int64) + 1) * (nb + 1) + (b.astype(np.int64) + 1)
+    uniq, inverse = np.unique(key, return_inverse = True)
+    return uniq // (nb + 1) - 1, uniq % (nb + 1) - 1, inverse
@@ -38,6 +38,27 @@
 # 2022.04.12 - Updated the 'TMPwshd.shp' that still existed in some error handling to tmpWshed
 # 2022.04.19 - Added arcpy.env.outputCoordinateSystem to convert ws polygons to UTM
 #               conversion errors were causing some issues, see 102400060401 for example
+# 2026.10.19 - intermediate grids are read once into a memory-mapped raster_store, statistics are recorded there
+#               instead of running CalculateStatistics after every TauDEM step
+# 2026.10.19 - ChannelThreshold is appended to a local status_journal instead of an UpdateCursor on statGDB,
+#               run status_journal.py to merge pending results into the status table
+# 2026.10.19 - optional 8th argument tileSize runs Fill, FlowDirection and AreaD8 through the tiled engine in
+#               tile_functions.py, a tile at a time, for HUC12 DEMs too big for the in-memory chain
+# 2026.10.19 - the HAVE_THEIR_CENTER_IN selections in mkWSheds are replaced by looking up subcatchment centroids
+#               in the HUC12 boundary rasterized once onto the demw grid, and link midpoints in the demw cells
+#               of the kept WSNOs, no feature layers or vector overlay
+# 2026.10.19 - the run is a stage_graph of the steps with their inputs and outputs: PeukerDouglas runs alongside
+#               FlowDirection, AreaD8 and the pour points, and the boundary raster alongside Fill, sharing the
+#               cores. Optional 9th argument is the number of stages at a time (default 3, 1 runs them in order)
+# 2026.10.19 - only the grids read in Python go into the raster_store (demad8 and the boundary line for the pour
+#               points, demw), the pour points are found from them rather than ExtractByMask/Con/RasterToPoint
+# 2026.10.19 - exits with code 1 after logging a failure, so batch runs see it failed
+# 2026.10.19 - Fill, FlowDirection and AreaD8 always come from the NumPy engine (tile_functions.channelGrids,
+#               flow_functions.py) instead of ArcGIS Fill/FlowDirection and TauDEM AreaD8, so a tiled run gives
+#               the same demfel, demp and demad8 as an untiled one. The GeoTIFFs have an explicit NoData value
+# 2026.10.19 - channel links are kept by their midpoint in the final watershed (wShed rasterized onto demw),
+#               not in the demw cells of the kept WSNOs, which left out the cells of eliminated slivers
+# 2026.10.19 - the boundary line is rasterized onto the demad8 grid (raster_store add_mask) for the pour points
 
 ##
 ##-----------------------------------------------------------------------------------------------------##-------------------------------------------------------------------------------------------------------
@@ -55,6 +76,11 @@ import subprocess
 sys.path.append("C:\\DEP\\Scripts\\basics")
 import dem_functions as df
 import platform
+import numpy as np
+import raster_store
+import status_journal
+import tile_functions
+import stage_graph
 
 # Set extensions & environments 
 
@@ -65,130 +91,96 @@ arcpy.env.compression = "NONE"
 
 ##-------------------------------------------------------------------------------------------------------
 
-def FlowD8(filledDEM, ProcDir):
-    try:
-##         in support of the ACPF Toolbox, use ArcGIS FlowDirection, then 
-##          mosaic the EOW Flowdirection in on top, then 
-##          reclass to a TauDEM format FlowDirection for further processing
-
-        arcFDir = FlowDirection(filledDEM.getOutput(0))#"PElev.tif")
-
-        fauxFDir = Reclassify(arcFDir, "VALUE",
-                           RemapRange([[1, 1], [128, 2], [64, 3], [32, 4], [16, 5], [8, 6], [4, 7], [2, 8]]))
-
-        arcpy.CopyRaster_management(fauxFDir, "demp.tif")
-        
-        # Contributing area     
-        callstr = "mpiexec -n " + Ncpus + " AreaD8 " + "-p " + ProcDir + "\\demp.tif " + "-ad8 " + ProcDir + "\\demad8.tif -nc"
-        subp = subprocess.check_output(callstr, stderr = subprocess.STDOUT)#, timeout = timeout)
-        string = subp.decode(sys.stdout.encoding)
-    ####    print(string)
-        log.debug(string)
-##        call(callstr, shell=True)
-######        stdout = subprocess.check_output(callstr, stderr=subprocess.STDOUT, env=env)
-######        print(stdout)
-##        os.system(callstr)
-##        process = subprocess.Popen(callstr, shell=True, stdout=subprocess.PIPE)
-##
-##        message = "\n"
-##        for line in process.stdout.readlines():
-##            if isinstance(line, bytes):	    # true in Python 3
-##                line = line.decode()
-##            message = message + line
-##        arcpy.AddMessage(message)
-##        print(message)
-
-        arcpy.CalculateStatistics_management(ProcDir + "\\demad8.tif")
-
-    except:
-        # Get the traceback object
-        tb = sys.exc_info()[2]
-        tbinfo = traceback.format_tb(tb)[0]
-
-        # Concatenate information together concerning the error into a message string
-        pymsg = "PYTHON ERRORS:\nTraceback info:\n" + tbinfo + "\nError Info:\n" + str(sys.exc_info()[1])
-        msgs = "ArcPy ERRORS:\n" + arcpy.GetMessages(2) + "\n"
-
-        # Return python error messages for use in script tool or Python Window
-        arcpy.AddError(pymsg)
-        arcpy.AddError(msgs)
+def runTauDEM(callstr):
+    '''Run an mpiexec TauDEM call, its output goes to the debug log'''
+    subp = subprocess.check_output(callstr, stderr = subprocess.STDOUT)#, timeout = timeout)
+    string = subp.decode(sys.stdout.encoding)
+####    print(string)
+    log.debug(string)
+    # call(callstr, shell=True)
 
-        # Print Python error messages for use in Python / Python Window
-        print(pymsg + "\n")
-        print(msgs)
 
+def writeFlowGrids(ProcDir, store):
+    # GeoTIFFs for PeukerDouglas and the TauDEM steps after it
+    for name in ['demfel', 'demp', 'demad8']:
+        store.to_geotiff(name, ProcDir + "\\" + name + ".tif")
+    store.delete('dem')
 
 
-def extractPoutPts(ws_bndy):#fileGDB, huc12, WSBndsrc):
- 
+def rasterizeBoundary(ws_bndy, ProcDir, store):
     arcpy.AddMessage("Process old watershed boundary...")
     # ws_bndy_lyr = arcpy.MakeFeatureLayer_management(WSBndsrc, "WSBndy_lyr", "\"HUC12\" = \'" + str(huc12) + "\'")
 
     #arcpy.FeatureToLine_management(fileGDB + "\\bnd" + huc12, "WS_bnd.shp")
     ws_bnd_shp = arcpy.FeatureToLine_management(ws_bndy, "WS_bnd.shp")
     #arcpy.PolylineToRaster_conversion("WS_bnd.shp", "FID", "rasWSBndy.tif")
-    ws_bnd_rstr = arcpy.PolylineToRaster_conversion("WS_bnd.shp", "FID", "rasWSBndy")
-            
+    # rasterized onto the demad8 grid so every boundary cell is a demad8 cell
+    store.add_mask('wsbndline', ws_bnd_shp, 'demad8')
+
+
+def pourPoints(ProcDir, store):
+    '''PourPts.shp at the boundary line cells whose contributing area is at least the mean plus 3 standard
+    deviations of demad8 along the boundary line, from the stored grids instead of ExtractByMask,
+    Con and RasterToPoint'''
     arcpy.AddMessage("Extract pour points...")
-    #bndFacc = Con('rasWSBndy.tif', 'demad8.tif', '', 'value = 0')
-    bndFacc = ExtractByMask("demad8.tif", "rasWSBndy")
-    bndFacc.save("bndFAcc.tif")
-    
-    
-    rmean = bndFacc.mean
-    stddevX = bndFacc.standardDeviation * 3
-    thrsh = int(rmean + stddevX)
-    #arcpy.AddMessage(" Flow maximum: " + str(bndFacc.maximum))
+    bGeoref = store.georef('demad8')
+    # the boundary line mask is on the demad8 grid, 0 off the line
+    rows, cols = raster_store.validCells(store.get('wsbndline'), 0)
+    x, y = raster_store.cellCenters(bGeoref, rows, cols)
+    bndFacc = np.asarray(store.get('demad8')[rows, cols], dtype = np.float64)
+    ad8Nodata = store.nodata('demad8')
+    if ad8Nodata is not None:
+        bndFacc[bndFacc == ad8Nodata] = np.nan
+
+    stats = raster_store.gridStatistics(bndFacc[np.newaxis, :])
+    thrsh = int(stats['mean'] + stats['std'] * 3)
+    #arcpy.AddMessage(" Flow maximum: " + str(stats['max']))
     arcpy.AddMessage(" Flow threshhold: " + str(thrsh))
 
 ##                PourPts = Con(intD8Facc >= thrsh, intD8Facc)
-    PourPts = Con(bndFacc >= thrsh, bndFacc)
-    PourPts.save("PourPts.tif")
-    
-    arcpy.RasterToPoint_conversion(PourPts, "PourPts.shp", "VALUE")
-    arcpy.AddField_management("PourPts.shp", "ID", "LONG")
-    arcpy.CalculateField_management("PourPts.shp", "ID", '!POINTID!', "PYTHON_9.3")
+    # row major order, numbered from 1 as RasterToPoint's POINTID
+    keep = np.flatnonzero(bndFacc >= thrsh)
+    sr = None
+    if bGeoref['spatialReference'] is not None:
+        sr = arcpy.SpatialReference()
+        sr.loadFromString(bGeoref['spatialReference'])
+    pourPts = arcpy.CreateFeatureclass_management(ProcDir, "PourPts.shp", "POINT", spatial_reference = sr)
+    arcpy.AddField_management(pourPts, "POINTID", "LONG")
+    arcpy.AddField_management(pourPts, "GRID_CODE", "DOUBLE")
+    # the shapefile's default Id field is the ID TauDEM reads
+    with arcpy.da.InsertCursor(pourPts, ['SHAPE@XY', 'POINTID', 'GRID_CODE', 'Id']) as icur:
+        for pointId, i in enumerate(keep.tolist(), 1):
+            icur.insertRow([(float(x[i]), float(y[i])), pointId, float(bndFacc[i]), pointId])
     
 ##    arcpy.Delete_management("WSBndy_lyr.shp")
 ##    arcpy.Delete_management("WS_bnd.shp")
-    arcpy.Delete_management("rasWSBndy.tif")
 
 
-
-def mkPDougStrm(ProcDir):
+def peukerDouglas(ProcDir, cores):
     # PeukerDouglas
     # This produces a skeleton of a stream network derived entirely from a 
     #  local filter applied to the topograph
 
-    arcpy.AddMessage("Peuker-Douglas")
-    callstr = "mpiexec -n " + Ncpus + " PeukerDouglas " +\
+    log.info("Peuker-Douglas")
+    callstr = "mpiexec -n " + str(cores) + " PeukerDouglas " +\
               "-fel " + ProcDir + "\\demfel.tif " +\
               "-ss " + ProcDir + "\\demss.tif"
-    subp = subprocess.check_output(callstr, stderr = subprocess.STDOUT)#, timeout = timeout)
-    string = subp.decode(sys.stdout.encoding)
-####    print(string)
-    log.debug(string)
-    # call(callstr, shell=True)
-    arcpy.CalculateStatistics_management("demss.tif")
-    
-    
+    runTauDEM(callstr)
+
+
+def pdChannels(ProcDir, cores):
     # Area D8 
     #  check for contamination = false
-    callstr = "mpiexec -n " + Ncpus + " Aread8 " +\
+    callstr = "mpiexec -n " + str(cores) + " Aread8 " +\
               "-p " + ProcDir + "\\demp.tif " +\
               "-o " + ProcDir + "\\PourPts.shp " +\
               "-ad8 " + ProcDir + "\\demssa.tif " +\
               "-wg " + ProcDir + "\\demss.tif -nc"
-    subp = subprocess.check_output(callstr, stderr = subprocess.STDOUT)#, timeout = timeout)
-    string = subp.decode(sys.stdout.encoding)
-####    print(string)
-    log.debug(string)
-    # call(callstr, shell=True)
-    arcpy.CalculateStatistics_management("demssa.tif")
+    runTauDEM(callstr)
     
     
     # Drop analysis
-    callstr = "mpiexec -n " + Ncpus + " Dropanalysis " +\
+    callstr = "mpiexec -n " + str(cores) + " Dropanalysis " +\
               "-p " + ProcDir + "\\demp.tif " +\
               "-fel " + ProcDir + "\\demfel.tif " +\
               "-ad8 " + ProcDir + "\\demad8.tif " +\
@@ -196,11 +188,7 @@ def mkPDougStrm(ProcDir):
               "-drp " + ProcDir + "\\demdrp.txt " +\
               "-o " + ProcDir + "\\PourPts.shp -par 1000 2500 50 0"
               #"-o " + ProcDir + "\\PourPts.shp -par 300 10000 50 0"
-    subp = subprocess.check_output(callstr, stderr = subprocess.STDOUT)#, timeout = timeout)
-    string = subp.decode(sys.stdout.encoding)
-####    print(string)
-    log.debug(string)
-    # call(callstr, shell=True)
+    runTauDEM(callstr)
 
 
     # Get the channel initiation threshold 
@@ -208,19 +196,37 @@ def mkPDougStrm(ProcDir):
 
 
     # Creater channel raster by threshhold
-    arcpy.AddMessage("  Source threshold: " + str(chThresh))
+    log.info("  Source threshold: " + str(chThresh))
     
-    callstr = "mpiexec -n " + Ncpus + " Threshold -ssa " + ProcDir + "\\demssa.tif -src " + ProcDir + "\\demsrc.tif -thresh " + str(chThresh)
-    subp = subprocess.check_output(callstr, stderr = subprocess.STDOUT)#, timeout = timeout)
-    string = subp.decode(sys.stdout.encoding)
-####    print(string)
-    log.debug(string)
-    # call(callstr, shell=True)
-    arcpy.CalculateStatistics_management("demsrc.tif")
+    callstr = "mpiexec -n " + str(cores) + " Threshold -ssa " + ProcDir + "\\demssa.tif -src " + ProcDir + "\\demsrc.tif -thresh " + str(chThresh)
+    runTauDEM(callstr)
     
     return(chThresh)
-    
-    
+
+
+def channelStages(inDEM, ProcDir, sgdb, huc12, ws_bnd, pdCatch, pdChnl, wShed, store, tileSize, cores):
+    '''The channel run as a stage_graph, stages calling arcpy run on the main thread, TauDEM and the flow
+    grids on worker threads. demfel, demp and demad8 come from tile_functions.channelGrids, the whole grid
+    at once or a tile at a time with a tileSize, the same grids either way. The boundary raster and the pour
+    points overlap with them and PeukerDouglas, which gets all the cores.'''
+    stages = [stage_graph.Stage('store_dem', lambda n: store.add_raster('dem', inDEM), ['dem'], ['store/dem'], mainThread = True),
+              stage_graph.Stage('flow_grids', lambda n: tile_functions.channelGrids(store, 'dem', tileSize),
+                                ['store/dem'], ['store/demfel', 'store/demp', 'store/demad8']),
+              stage_graph.Stage('write_grids', lambda n: writeFlowGrids(ProcDir, store),
+                                ['store/demfel', 'store/demp', 'store/demad8'], ['demfel.tif', 'demp.tif', 'demad8.tif'], mainThread = True),
+              # listed in the order the steps used to run, which is the order they run in with one stage at a time
+              # the boundary raster does not depend on any flow grid
+              stage_graph.Stage('boundary', lambda n: rasterizeBoundary(ws_bnd, ProcDir, store), ['ws_bnd', 'store/demad8'], ['store/wsbndline'], mainThread = True),
+              stage_graph.Stage('pour_points', lambda n: pourPoints(ProcDir, store), ['store/demad8', 'store/wsbndline'], ['PourPts.shp'], mainThread = True),
+              stage_graph.Stage('peuker_douglas', lambda n: peukerDouglas(ProcDir, n), ['demfel.tif'], ['demss.tif'], cores),
+              stage_graph.Stage('channels', lambda n: pdChannels(ProcDir, n),
+                                ['demfel.tif', 'demp.tif', 'demad8.tif', 'demss.tif', 'PourPts.shp'], ['demssa.tif', 'demsrc.tif'], cores),
+              stage_graph.Stage('watersheds', lambda n: mkWSheds(ProcDir, sgdb, huc12, ws_bnd, log, pdCatch, wShed, store),
+                                ['demfel.tif', 'demp.tif', 'demad8.tif', 'demsrc.tif', 'PourPts.shp', 'ws_bnd'],
+                                ['pdCatch', 'pdChnl', 'wShed', 'store/demw'], cores, mainThread = True)]
+    return stages
+
+
 def getThresh(ProcDir):
     inf = open(ProcDir + "\\demdrp.txt")
     lineList = inf.readlines()
@@ -236,7 +242,44 @@ def getThresh(ProcDir):
 
 
 
-def mkWSheds(ProcDir, sgdb, huc12, WSBndsrc, log, pdCatch, wShed):
+def featureCenters(features):
+    '''OIDs and centers of features as HAVE_THEIR_CENTER_IN finds them, the centroid of polygons
+    and the midpoint of lines'''
+    isLine = arcpy.Describe(features).shapeType == 'Polyline'
+    oids = []
+    xs = []
+    ys = []
+    with arcpy.da.SearchCursor(features, ['OID@', 'SHAPE@']) as scur:
+        for oid, shape in scur:
+            if shape is None:
+                continue
+            if isLine:
+                pt = shape.positionAlongLine(0.5, True).firstPoint
+            else:
+                pt = shape.centroid
+            oids.append(oid)
+            xs.append(pt.X)
+            ys.append(pt.Y)
+    return np.array(oids, dtype = np.int64), np.array(xs), np.array(ys)
+
+
+def copyCentersIn(inFeatures, outFeatures, inside, georef):
+    '''CopyFeatures of the features whose center falls in a cell where inside is true, in place of
+    SelectLayerByLocation HAVE_THEIR_CENTER_IN. Returns the number of features kept and dropped.'''
+    arcpy.CopyFeatures_management(inFeatures, outFeatures)
+    out = str(outFeatures)
+    oids, x, y = featureCenters(out)
+    keep = raster_store.pointValues(inside, georef, x, y, False).astype(bool)
+    drop = set(oids[~keep].tolist())
+    if len(drop) > 0:
+        with arcpy.da.UpdateCursor(out, ['OID@']) as ucur:
+            for urow in ucur:
+                if urow[0] in drop:
+                    ucur.deleteRow()
+    return int(keep.sum()), len(drop)
+
+
+def mkWSheds(ProcDir, sgdb, huc12, WSBndsrc, log, pdCatch, wShed, store):
 
     arcpy.AddMessage("Watersheds")
     
@@ -256,7 +299,11 @@ def mkWSheds(ProcDir, sgdb, huc12, WSBndsrc, log, pdCatch, wShed):
 ####    print(string)
     log.debug(string)
     # call(callstr, shell=True)
-    arcpy.CalculateStatistics_management("demw.tif")
+    store.add_raster('demw', ProcDir + "\\demw.tif")
+    wGeoref = store.georef('demw')
+
+    # the HUC12 boundary rasterized once onto the demw grid, subcatchment centers are classified against it
+    inHuc12 = store.add_mask('wsbnd', WSBndsrc, 'demw')
     
     # Create subwatershed feature class - WSNO joins to channels
     tmpWshed = arcpy.RasterToPolygon_conversion(ProcDir + "\\demw.tif", os.path.join(sgdb, 'tmpwshd'))#"TMPwshd.shp")
@@ -272,9 +319,8 @@ def mkWSheds(ProcDir, sgdb, huc12, WSBndsrc, log, pdCatch, wShed):
     arcpy.Eliminate_management("Area_lyr", "GT0_wshd.shp")
     
     # save only those features that have centroids in WBD-version of HUC12
-    arcpy.MakeFeatureLayer_management("GT0_wshd.shp", "Inside_lyr")
-    arcpy.SelectLayerByLocation_management("Inside_lyr", "HAVE_THEIR_CENTER_IN", WSBndsrc)#fileGDB + "\\bnd" + huc12)    
-    arcpy.CopyFeatures_management("Inside_lyr", pdCatch)#fileGDB + "\\pdCatch" + huc12)
+    nKept, nDropped = copyCentersIn("GT0_wshd.shp", pdCatch, inHuc12, wGeoref)#fileGDB + "\\pdCatch" + huc12)
+    log.debug(str(nKept) + ' subcatchments kept, ' + str(nDropped) + ' outside the HUC12')
 
     # Create the watershed boundary
     try:
@@ -345,9 +391,8 @@ def mkWSheds(ProcDir, sgdb, huc12, WSBndsrc, log, pdCatch, wShed):
         elimWs = arcpy.Eliminate_management(areaLayer, "GT0_wshd.shp")
         
         # save only those features that have centroids in WBD-version of HUC12
-        insideLayer = arcpy.MakeFeatureLayer_management(elimWs, "Inside_lyr")
-        arcpy.SelectLayerByLocation_management(insideLayer, "HAVE_THEIR_CENTER_IN", WSBndsrc)
-        arcpy.CopyFeatures_management(insideLayer, pdCatch)
+        nKept, nDropped = copyCentersIn(elimWs, pdCatch, inHuc12, wGeoref)
+        log.debug(str(nKept) + ' subcatchments kept, ' + str(nDropped) + ' outside the HUC12')
 
     # Create the watershed boundary
     try:
@@ -391,10 +436,12 @@ def mkWSheds(ProcDir, sgdb, huc12, WSBndsrc, log, pdCatch, wShed):
     
     # Select only those links in the TauDEM stream network shapefile that are in the wastershed
     #  then copy to a fileGeoDatabase and back to resolve drawing issues that are undefined.
-    arcpy.MakeFeatureLayer_management("tempnet.shp", "allChannels_lyr")
-    arcpy.SelectLayerByLocation_management("allChannels_lyr", "HAVE_THEIR_CENTER_IN", wshed)#fileGDB + "\\WShed" + huc12)
-    
-    demnet = arcpy.CopyFeatures_management("allChannels_lyr", sgdb + "\\demnet")
+    #  The final watershed polygons are rasterized onto the demw grid, WSNO values of the kept subcatchments
+    #  would miss the slivers Eliminate merged into them.
+    inWshed = store.add_mask('wshed', wShed, 'demw')
+    demnet = sgdb + "\\demnet"
+    nKept, nDropped = copyCentersIn("tempnet.shp", demnet, inWshed, wGeoref)#fileGDB + "\\WShed" + huc12)
+    log.debug(str(nKept) + ' channel links kept, ' + str(nDropped) + ' outside the watershed')
     arcpy.CopyFeatures_management(demnet, pdChnl)
     arcpy.DefineProjection_management(pdChnl, pdCatch)#, fileGDB + "\\pdCatch" + huc12)
 
@@ -440,7 +487,11 @@ if __name__ == "__main__":
         outputString += 'parameters were passed in via command line'
 
     try:
-        inDEM, ProcDir, statGDB, ws_bnd, pdCatch, pdChnl, wShed  = [i for i in sys.argv[1:]]
+        inDEM, ProcDir, statGDB, ws_bnd, pdCatch, pdChnl, wShed  = [i for i in sys.argv[1:8]]
+        # tile size in cells for the tiled Fill/FlowDirection/AreaD8, the whole DEM at once if not given
+        tileSize = int(sys.argv[8]) if len(sys.argv) > 8 and sys.argv[8] not in ['', '#'] else None
+        # stages run at a time, 1 runs them one after another
+        maxStages = int(sys.argv[9]) if len(sys.argv) > 9 and sys.argv[9] not in ['', '#'] else 3
         # fileGDB = os.path.dirname(pdCatch)#sys.argv[3]
 
         huc12, huc8 = df.figureItOut(inDEM)
@@ -474,25 +525,21 @@ if __name__ == "__main__":
         arcpy.env.scratchWorkspace = ProcDir
         sgdb = arcpy.env.scratchGDB
 
-        # Heavy lifting
-        outFill = Fill(inDEM)
-        outFillCopy = arcpy.CopyRaster_management(outFill, "demfel.tif")
-
-        FlowD8(outFillCopy, ProcDir)
-
-        extractPoutPts(ws_bnd)#fileGDB, huc12, WSBndsrc)
+        # memory-mapped copies of the intermediate grids and their statistics
+        store = raster_store.RasterStore(os.path.join(ProcDir, 'store'))
 
-        chThresh = mkPDougStrm(ProcDir)
+        # Heavy lifting, the TauDEM steps that overlap share the Ncpus cores
+        stages = channelStages(inDEM, ProcDir, sgdb, huc12, ws_bnd, pdCatch, pdChnl, wShed, store, tileSize, int(Ncpus))
+        results = stage_graph.runStages(stages, maxStages, int(Ncpus), ['dem', 'ws_bnd'], log)
+        chThresh = results['channels']
 
-        mkWSheds(ProcDir, sgdb, huc12, ws_bnd, log, pdCatch, wShed)#, WSBndsrc, log, pdCatch, wShed)
+        for name in store.names():
+            log.debug(name + ' statistics: ' + str(store.statistics(name)))
                        
-        # Keep track of the threshhold
-        cursor = arcpy.da.UpdateCursor(statGDB, ["ChannelThreshold"], "\"HUC12\" = \'" + str(huc12) + "\'")
-        for row in cursor:
-            row[0] = chThresh
-            cursor.updateRow(row)
-        del row
-        del cursor
+        # Keep track of the threshhold, merged into statGDB later by status_journal.py
+        journalDir = os.path.join(os.path.dirname(os.path.normpath(ProcDir)), 'status_journal')
+        status_journal.appendResult(journalDir, statGDB, huc12, {'ChannelThreshold': chThresh})
+        log.info('channel threshold journaled to ' + journalDir)
     except:
         # Get the traceback object
         tb = sys.exc_info()[2]
@@ -509,6 +556,8 @@ if __name__ == "__main__":
         # Print Python error messages for use in Python / Python Window
         log.warning(pymsg + "\n")
         log.warning(msgs)
+        # non-zero so huc_batch retries the HUC12 and skips the sampling that depends on it
+        sys.exit(1)
 
     finally:
         log.info("Ending script execution")
@@ -0,0 +1,360 @@
+## flow_functions.py
+## NumPy versions of the grid steps cmd_channel_DEP.py runs through ArcGIS and TauDEM:
+##  Fill, FlowDirection (reclassed to TauDEM D8 codes), AreaD8, PeukerDouglas, Dropanalysis and the
+##  StreamNet watershed grid (demw).
+##
+## These follow the same algorithms as the ArcGIS/TauDEM tools (priority-flood fill, steepest descent D8
+##  with flats routed to their outlets, D8 contributing area, Peuker-Douglas 2x2 filter, Strahler order
+##  drop analysis t-test) but are not bit-for-bit copies of them, e.g. ties between equal drops go to the
+##  first direction in TauDEM order and watershed numbers differ from TauDEM's WSNO numbering.
+##  fillDepressions, flowDirectionD8 and areaD8 make cmd_channel_DEP.py's demfel, demp and demad8 (through
+##  tile_functions.channelGrids, so the whole grid and tiled runs agree). The others let the rest of the channel
+##  steps run and be benchmarked without ArcGIS, MPI or TauDEM installed.
+##
+## Grids are 2D arrays, nodata cells are NaN (float grids) or given with the nodata argument.
+## D8 directions use the TauDEM codes: 1 E, 2 NE, 3 N, 4 NW, 5 W, 6 SW, 7 S, 8 SE, 0 no direction
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - Fill, FlowDirection and AreaD8 here are the ones cmd_channel_DEP.py runs
+
+import heapq
+import collections
+import numpy as np
+
+# row and column offsets for TauDEM D8 codes 1-8
+D8_ROW = np.array([0, -1, -1, -1, 0, 1, 1, 1])
+D8_COL = np.array([1, 1, 0, -1, -1, -1, 0, 1])
+D8_DIST = np.array([1.0, np.sqrt(2), 1.0, np.sqrt(2), 1.0, np.sqrt(2), 1.0, np.sqrt(2)])
+
+# arcpy FlowDirection codes in the same order, as cmd_channel_DEP.py used to remap them
+ARC_D8 = np.array([1, 128, 64, 32, 16, 8, 4, 2])
+
+
+def validMask(grid, nodata = None):
+    '''True where a grid holds data'''
+    grid = np.asarray(grid)
+    valid = np.ones(grid.shape, dtype = bool)
+    if nodata is not None:
+        valid &= grid != nodata
+    if grid.dtype.kind == 'f':
+        valid &= ~np.isnan(grid)
+    return valid
+
+
+def shifted(grid, k, fill):
+    '''Grid of each cell's neighbor in D8 direction k (0-7), cells off the grid get fill'''
+    out = np.full(grid.shape, fill, dtype = grid.dtype)
+    nrows, ncols = grid.shape
+    dr = D8_ROW[k]
+    dc = D8_COL[k]
+    out[max(0, -dr):nrows - max(0, dr), max(0, -dc):ncols - max(0, dc)] = \
+        grid[max(0, dr):nrows - max(0, -dr), max(0, dc):ncols - max(0, -dc)]
+    return out
+
+
+def fillDepressions(dem, nodata = None):
+    '''Fill depressions to their spill elevation (flat fill) with the priority-flood
+    algorithm of Barnes et al. (2014), returns a float64 grid with NaN for nodata'''
+    valid = validMask(dem, nodata)
+    nrows, ncols = valid.shape
+    w = ncols + 2
+
+    # pad by one cell so neighbor lookups never leave the flat array
+    fel = np.full((nrows + 2, ncols + 2), np.nan)
+    fel[1:-1, 1:-1] = np.where(valid, dem, np.nan)
+    fel = fel.ravel()
+    closed = np.ones((nrows + 2, ncols + 2), dtype = bool)
+    closed[1:-1, 1:-1] = ~valid
+    closed = closed.ravel()
+    offsets = [int(dr * w + dc) for dr, dc in zip(D8_ROW, D8_COL)]
+
+    # seed with cells on the edge of the data
+    edge = np.zeros((nrows + 2, ncols + 2), dtype = bool)
+    padValid = ~closed.reshape(nrows + 2, ncols + 2)
+    for k in range(8):
+        edge |= padValid & ~shifted(padValid, k, False)
+    seeds = np.flatnonzero(edge)
+    heap = list(zip(fel[seeds].tolist(), seeds.tolist()))
+    heapq.heapify(heap)
+    closed[seeds] = True
+
+    pit = collections.deque()
+    while heap or pit:
+        if pit:
+            i = pit.popleft()
+            z = fel[i]
+        else:
+            z, i = heapq.heappop(heap)
+        for off in offsets:
+            j = i + off
+            if closed[j]:
+                continue
+            closed[j] = True
+            if fel[j] <= z:
+                fel[j] = z
+                pit.append(j)
+            else:
+                heapq.heappush(heap, (fel[j], j))
+
+    return fel.reshape(nrows + 2, ncols + 2)[1:-1, 1:-1].copy()
+
+
+def flowDirectionD8(fel, nodata = None):
+    '''Steepest descent D8 flow direction in TauDEM codes (uint8, 0 for nodata).
+    Edge cells without a downhill neighbor flow off the edge, flat cells are routed
+    toward the nearest cell of the same elevation that already drains.'''
+    valid = validMask(fel, nodata)
+    z = np.where(valid, fel, np.nan).astype(np.float64)
+    nrows, ncols = z.shape
+
+    best = np.zeros(z.shape)
+    p = np.zeros(z.shape, dtype = np.uint8)
+    outward = np.zeros(z.shape, dtype = np.uint8)
+    for k in range(8):
+        nb = shifted(z, k, np.nan)
+        drop = (z - nb) / D8_DIST[k]
+        better = valid & (drop > best)
+        best[better] = drop[better]
+        p[better] = k + 1
+        # first direction off the edge of the data
+        off = valid & np.isnan(nb) & (outward == 0)
+        outward[off] = k + 1
+
+    edgeOut = valid & (p == 0) & (outward > 0)
+    p[edgeOut] = outward[edgeOut]
+
+    # route flats to a resolved neighbor with the same elevation, one ring at a time
+    flat = valid & (p == 0)
+    while flat.any():
+        resolved = valid & (p > 0)
+        changed = np.zeros(z.shape, dtype = bool)
+        for k in range(8):
+            nbResolved = shifted(resolved, k, False)
+            nbZ = shifted(z, k, np.nan)
+            take = flat & ~changed & nbResolved & (nbZ == z)
+            p[take] = k + 1
+            changed |= take
+        if not changed.any():
+            break
+        flat &= ~changed
+
+    return p
+
+
+def arcToTauDEM(arcFDir):
+    '''Reclass an ArcGIS flow direction grid to TauDEM codes, as the Reclassify in FlowD8'''
+    arcFDir = np.asarray(arcFDir)
+    p = np.zeros(arcFDir.shape, dtype = np.uint8)
+    for k in range(8):
+        p[arcFDir == ARC_D8[k]] = k + 1
+    return p
+
+
+def downstreamIndex(p):
+    '''Flat index of each cell's D8 receiver, -1 where the flow leaves the grid or p is 0'''
+    p = np.asarray(p)
+    nrows, ncols = p.shape
+    rows, cols = np.indices(p.shape)
+    code = p.astype(np.int64) - 1
+    has = (p > 0) & (p <= 8)
+    code = np.where(has, code, 0)
+    r = rows + D8_ROW[code]
+    c = cols + D8_COL[code]
+    inside = has & (r >= 0) & (r < nrows) & (c >= 0) & (c < ncols)
+    ds = np.where(inside, r * ncols + c, -1).ravel()
+    # receivers without a direction (nodata) end the path
+    hasR = has.ravel()
+    m = ds >= 0
+    ds[m] = np.where(hasR[ds[m]], ds[m], -1)
+    return ds
+
+
+def topologicalLevels(ds, active):
+    '''Yield batches of flat indexes in upstream to downstream order, each cell comes
+    after every active cell that drains into it'''
+    n = ds.size
+    inflow = ds[active & (ds >= 0)]
+    indeg = np.bincount(inflow, minlength = n).astype(np.int64)
+    frontier = np.flatnonzero(active & (indeg == 0))
+    while frontier.size > 0:
+        yield frontier
+        t = ds[frontier]
+        t = t[t >= 0]
+        t = t[active[t]]
+        if t.size == 0:
+            break
+        np.subtract.at(indeg, t, 1)
+        t = np.unique(t)
+        frontier = t[indeg[t] == 0]
+
+
+def areaD8(p, weights = None):
+    '''D8 contributing area in cells (including the cell itself) like TauDEM AreaD8,
+    or the sum of upstream weights like TauDEM Aread8 -wg. NaN where p has no direction.'''
+    p = np.asarray(p)
+    active = ((p > 0) & (p <= 8)).ravel()
+    ds = downstreamIndex(p)
+    if weights is None:
+        acc = active.astype(np.float64)
+    else:
+        acc = np.where(active, np.nan_to_num(np.asarray(weights, dtype = np.float64).ravel()), 0.0)
+
+    for level in topologicalLevels(ds, active):
+        t = ds[level]
+        m = t >= 0
+        np.add.at(acc, t[m], acc[level[m]])
+
+    acc[~active] = np.nan
+    return acc.reshape(p.shape)
+
+
+def peukerDouglas(fel, centerWeight = 0.4, sideWeight = 0.1, diagonalWeight = 0.05):
+    '''TauDEM PeukerDouglas: smooth the elevations then flag (1) every cell that is not the
+    highest cell of any 2x2 window, which leaves the upwardly curved valley cells'''
+    z = np.asarray(fel, dtype = np.float64)
+    valid = ~np.isnan(z)
+    zf = np.where(valid, z, 0.0)
+
+    # weighted smoothing over valid neighbors, renormalized at the data edges
+    num = zf * centerWeight
+    den = valid * centerWeight
+    for k in range(8):
+        wgt = sideWeight if k % 2 == 0 else diagonalWeight
+        nbValid = shifted(valid, k, False)
+        num = num + shifted(zf, k, 0.0) * wgt * nbValid
+        den = den + wgt * nbValid
+    smooth = np.where(valid, num / np.where(den > 0, den, 1.0), -np.inf)
+
+    ss = valid.copy()
+    quad = np.stack([smooth[:-1, :-1], smooth[:-1, 1:], smooth[1:, :-1], smooth[1:, 1:]])
+    top = np.argmax(quad, axis = 0)
+    rows, cols = np.indices(top.shape)
+    ss[rows + top // 2, cols + top % 2] = False
+    return np.where(valid, ss.astype(np.float64), np.nan)
+
+
+def strahlerOrder(ds, stream):
+    '''Strahler order of each stream cell (0 off the network) given flat downstream indexes'''
+    n = ds.size
+    dsStream = np.where(ds >= 0, ds, 0)
+    link = stream & (ds >= 0) & stream[dsStream]
+    linkDs = np.where(link, ds, -1)
+    order = np.zeros(n, dtype = np.int32)
+    maxUp = np.zeros(n, dtype = np.int32)
+    cntMax = np.zeros(n, dtype = np.int32)
+
+    for level in topologicalLevels(linkDs, stream):
+        order[level] = np.where(maxUp[level] == 0, 1, maxUp[level] + (cntMax[level] >= 2))
+        t = linkDs[level]
+        m = t >= 0
+        t = t[m]
+        o = order[level[m]]
+        if t.size == 0:
+            continue
+        newMax = maxUp.copy()
+        np.maximum.at(newMax, t, o)
+        tu = np.unique(t)
+        cntMax[tu] = np.where(maxUp[tu] == newMax[tu], cntMax[tu], 0)
+        eq = o == newMax[t]
+        np.add.at(cntMax, t[eq], 1)
+        maxUp = newMax
+
+    return order
+
+
+def segmentEnds(nxt):
+    '''For every cell, the last cell reached by following nxt (-1 ends a segment),
+    found by pointer jumping so it runs in log(segment length) vectorized passes'''
+    idx = np.arange(nxt.size)
+    jump = np.where(nxt >= 0, nxt, idx)
+    while True:
+        nextJump = jump[jump]
+        if np.array_equal(nextJump, jump):
+            return jump
+        jump = nextJump
+
+
+def streamDrops(p, fel, stream):
+    '''Order and elevation drop of each Strahler stream segment on a stream grid'''
+    ds = downstreamIndex(p)
+    stream = np.asarray(stream, dtype = bool).ravel()
+    z = np.asarray(fel, dtype = np.float64).ravel()
+    order = strahlerOrder(ds, stream)
+
+    dsSafe = np.where(ds >= 0, ds, 0)
+    same = stream & (ds >= 0) & stream[dsSafe] & (order[dsSafe] == order)
+    nxt = np.where(same, ds, -1)
+    hasUp = np.zeros(ds.size, dtype = bool)
+    hasUp[nxt[nxt >= 0]] = True
+    starts = np.flatnonzero(stream & ~hasUp)
+    ends = segmentEnds(nxt)[starts]
+    return order[starts], z[starts] - z[ends]
+
+
+def dropAnalysis(p, fel, ssa, minThresh, maxThresh, nThresh, logSpacing = True):
+    '''TauDEM Dropanalysis: for a range of thresholds on the weighted accumulation (ssa),
+    t-test the mean drop of first order streams against higher order streams. Returns the
+    table rows and the optimum threshold, the smallest with |t| < 2 (0 if there is none).'''
+    if logSpacing:
+        thresholds = np.logspace(np.log10(minThresh), np.log10(maxThresh), int(nThresh))
+    else:
+        thresholds = np.linspace(minThresh, maxThresh, int(nThresh))
+
+    ssa = np.asarray(ssa, dtype = np.float64)
+    nValid = max(1, int(np.count_nonzero(~np.isnan(ssa))))
+    rows = []
+    optimum = 0.0
+    for thresh in thresholds:
+        stream = np.nan_to_num(ssa, nan = -1.0) >= thresh
+        order, drop = streamDrops(p, fel, stream)
+        first = drop[order == 1]
+        high = drop[order > 1]
+        if first.size < 2 or high.size < 2:
+            continue
+        se = np.sqrt(first.var(ddof = 1) / first.size + high.var(ddof = 1) / high.size)
+        t = (first.mean() - high.mean()) / se if se > 0 else 0.0
+        rows.append({'threshold': float(thresh), 'drainageDensity': float(np.count_nonzero(stream)) / nValid,
+                     'nFirst': int(first.size), 'nHigh': int(high.size),
+                     'meanFirst': float(first.mean()), 'meanHigh': float(high.mean()),
+                     'stdFirst': float(first.std(ddof = 1)), 'stdHigh': float(high.std(ddof = 1)), 't': float(t)})
+        if optimum == 0.0 and abs(t) < 2:
+            optimum = float(thresh)
+    return rows, optimum
+
+
+def writeDropFile(rows, optimum, drpFile):
+    '''Write a demdrp.txt that cmd_channel_DEP.getThresh can read, optimum threshold on the last line'''
+    with open(drpFile, 'w') as f:
+        f.write('Threshold  DrainDen  NoFirstOrd NoHighOrd MeanDFirstOrd MeanDHighOrd StdDevFirstOrd StdDevHighOrd T\n')
+        for r in rows:
+            f.write('%f %f %d %d %f %f %f %f %f\n' % (r['threshold'], r['drainageDensity'], r['nFirst'], r['nHigh'],
+                                                      r['meanFirst'], r['meanHigh'], r['stdFirst'], r['stdHigh'], r['t']))
+        f.write('Optimum Threshold Value: %f\n' % optimum)
+
+
+def streamWatersheds(p, src):
+    '''Watershed grid like StreamNet -w: each cell labeled (1..n) with the stream link it drains to,
+    links split at junctions. Cells that leave the grid before reaching a stream are 0.'''
+    p = np.asarray(p)
+    ds = downstreamIndex(p)
+    stream = (np.asarray(src) > 0).ravel() & (p.ravel() > 0)
+    dsSafe = np.where(ds >= 0, ds, 0)
+
+    # junctions have two or more stream cells draining into them
+    intoStream = stream & (ds >= 0) & stream[dsSafe]
+    nUp = np.bincount(ds[intoStream], minlength = ds.size)
+    junction = nUp >= 2
+    nxt = np.where(intoStream & ~junction[dsSafe], ds, -1)
+    linkEnd = segmentEnds(nxt)
+
+    # relabel link ends 1..n, then hand each cell the label of the first stream cell below it
+    ends = np.unique(linkEnd[stream])
+    label = np.zeros(ds.size, dtype = np.int32)
+    label[ends] = np.arange(1, ends.size + 1, dtype = np.int32)
+    label[stream] = label[linkEnd[stream]]
+
+    downhill = np.where(~stream & (ds >= 0), ds, -1)
+    reach = segmentEnds(downhill)
+    w = np.where(stream[reach], label[reach], 0).astype(np.int32)
+    w[p.ravel() == 0] = 0
+    return w.reshape(p.shape)
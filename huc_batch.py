@@ -0,0 +1,257 @@
+## huc_batch.py
+## Run the DEP preprocessing tools for a batch of HUC12s (or every HUC12 in a list of HUC8s) in parallel.
+##
+## Each tool still runs as its own process with the same sys.argv list it takes from the command line.
+##  The batch builds a per-HUC12 dependency graph (by default channel network before sampling,
+##  tillage independent of both) and runs it with a concurrency limit for each resource class:
+##   cpu - TauDEM/mpiexec heavy steps (cmd_channel_DEP.py)
+##   io  - sampling and table work (cmd_Sampler_DEP.pyt, cmd_tillage_assign.pyt)
+##   gdb - exclusive writes to shared geodatabases (merging the status_journal into the status table)
+##  Failed tasks are retried (unless the runner raises NoRetry), tasks downstream of a failure are skipped, and throughput and an ETA
+##  are logged as tasks finish.
+##
+## Usage:
+##   python huc_batch.py <batch config json> [HUC8 or HUC12 ...]
+##
+## The config holds the argument template for each tool, {huc12} and {huc8} are filled in per HUC12:
+##  {"python": "C:/Program Files/ArcGIS/Pro/bin/Python/envs/arcgispro-py3/python.exe",
+##   "huc12List": "C:/DEP/Basedata_Summaries/huc12_list.txt",
+##   "limits": {"cpu": 2, "io": 4, "gdb": 1},
+##   "retries": 1,
+##   "tools": [
+##     {"name": "channel", "resource": "cpu", "after": [],
+##      "args": ["C:/DEP/Scripts/basics/cmd_channel_DEP.py", "C:/DEP/LiDAR_Current/elev_CLib_mean18/{huc8}/ec3m{huc12}.tif", ...]},
+##     {"name": "sampler", "resource": "io", "after": ["channel"], "args": [...]},
+##     {"name": "tillage", "resource": "io", "after": [], "args": [...]}],
+##   "statusJournal": {"journalDir": "C:/DEP_Proc/DEMProc/status_journal",
+##                     "statusTable": "C:/DEP/Basedata_Summaries/Basedata_5070.gdb/MW_HUC12_v2022_Status_mean18"}}
+##
+## With "workerSpool": "<spool dir>" in the config the tasks are queued for long-lived huc_worker.py workers
+##  (started separately, one per core to use) instead of each starting its own python process; the tools'
+##  argument lists are the same either way. "workerTimeout" is how many seconds a task waits for its job
+##  (default huc_worker.JOB_TIMEOUT) before it fails, a job a worker has already started is cancelled and
+##  its task not retried.
+##
+## huc12List is a text file with one HUC12 per line (or a table with a HUC12 field) used to expand HUC8s.
+##  When statusJournal is given, one merge of the journal into the status table runs in the gdb class
+##  after all the cmd_channel_DEP.py tasks, found by their script rather than the tool name.
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - added workerSpool to run the tasks in huc_worker.py workers
+## 2026.10.19 - added workerTimeout
+## 2026.10.19 - a runner can raise NoRetry to fail a task without a retry
+## 2026.10.19 - merge_status_journal depends on the tasks running cmd_channel_DEP.py, not names starting 'channel_'
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# the tool whose tasks write the status_journal, the merge runs after all of them
+CHANNEL_TOOL = 'cmd_channel_DEP.py'
+
+DEFAULT_LIMITS = {'cpu': max(1, (os.cpu_count() or 2) // 4), 'io': 4, 'gdb': 1}
+
+# task states
+WAITING = 'waiting'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class NoRetry(Exception):
+    '''Raised by a runner for a failure that retrying would make worse, e.g. a job that is still running'''
+
+
+class Task(object):
+    def __init__(self, name, resource, argv, after = None, huc12 = None, afterFailures = False):
+        self.name = name
+        self.resource = resource
+        self.argv = argv
+        self.after = after if after is not None else []
+        self.huc12 = huc12
+        # run once the tasks in after have finished, even if some of them failed
+        self.afterFailures = afterFailures
+        self.state = WAITING
+        self.attempts = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return 'Task(' + self.name + ', ' + self.state + ')'
+
+
+def expandHucs(hucs, huc12List = None):
+    '''Turn a mix of HUC8s and HUC12s into a sorted list of unique HUC12s'''
+    huc12s = set(h for h in hucs if len(h) == 12)
+    huc8s = [h for h in hucs if len(h) == 8]
+    if len(huc8s) > 0:
+        if huc12List is None:
+            raise ValueError('a huc12List is needed to expand HUC8s: ' + str(huc8s))
+        if huc12List.lower().endswith('.txt') or huc12List.lower().endswith('.csv'):
+            with open(huc12List) as f:
+                allHuc12s = [l.strip().split(',')[0] for l in f if l.strip() != '']
+        else:
+            import arcpy
+            with arcpy.da.SearchCursor(huc12List, ['HUC12']) as scur:
+                allHuc12s = [srow[0] for srow in scur]
+        for a in allHuc12s:
+            if a[:8] in huc8s:
+                huc12s.add(a)
+    bad = [h for h in hucs if len(h) not in [8, 12]]
+    if len(bad) > 0:
+        raise ValueError('not a HUC8 or HUC12: ' + str(bad))
+    return sorted(huc12s)
+
+
+def buildTasks(config, huc12s):
+    '''Build the per-HUC12 dependency graph from the tool templates in the config'''
+    tasks = {}
+    channels = []
+    python = config.get('python', sys.executable)
+    for huc12 in huc12s:
+        huc8 = huc12[:8]
+        for tool in config['tools']:
+            name = tool['name'] + '_' + huc12
+            argv = [python] + [a.format(huc12 = huc12, huc8 = huc8) for a in tool['args']]
+            after = [a + '_' + huc12 for a in tool.get('after', [])]
+            tasks[name] = Task(name, tool.get('resource', 'io'), argv, after, huc12)
+            # the channel tasks are found by the script they run, whatever the tool is called
+            if os.path.basename(tool['args'][0].replace('\\', '/')).lower() == CHANNEL_TOOL.lower():
+                channels.append(name)
+
+    journal = config.get('statusJournal')
+    if journal is not None:
+        argv = [python, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'status_journal.py'),
+                journal['journalDir'], journal['statusTable']]
+        tasks['merge_status_journal'] = Task('merge_status_journal', 'gdb', argv, channels, afterFailures = True)
+
+    for t in tasks.values():
+        for a in t.after:
+            if a not in tasks:
+                raise ValueError(t.name + ' depends on unknown task ' + a)
+    return tasks
+
+
+def runCommand(task):
+    '''Run a task's argument list as a child process, returns (return code, output)'''
+    proc = subprocess.run(task.argv, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+    return proc.returncode, proc.stdout.decode(errors = 'replace')
+
+
+def formatSeconds(s):
+    return time.strftime('%H:%M:%S', time.gmtime(max(0, s)))
+
+
+def runBatch(tasks, limits = None, retries = 1, log = None, runner = runCommand):
+    '''Run the task graph with a concurrency limit per resource class.
+    runner takes a Task and returns (return code, output), a return code of 0 is success.'''
+    if log is None:
+        log = logging.getLogger('huc_batch')
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    for t in tasks.values():
+        if t.resource not in limits:
+            raise ValueError(t.name + ' has unknown resource class ' + t.resource)
+
+    running = {r: 0 for r in limits}
+    futures = {}
+    startTime = time.time()
+    finished = 0
+    total = len(tasks)
+
+    def skipDownstream(failed):
+        for t in tasks.values():
+            if t.state == WAITING and failed in t.after and not t.afterFailures:
+                t.state = SKIPPED
+                log.warning('skipping ' + t.name + ', depends on ' + failed)
+                skipDownstream(t.name)
+
+    def timedRun(task):
+        t0 = time.time()
+        result = runner(task)
+        return result, time.time() - t0
+
+    with ThreadPoolExecutor(max_workers = sum(limits.values())) as pool:
+        while True:
+            # start everything that is ready and fits in its resource class
+            for t in tasks.values():
+                if t.state != WAITING or running[t.resource] >= limits[t.resource]:
+                    continue
+                if t.afterFailures:
+                    ready = all(tasks[a].state in [DONE, FAILED, SKIPPED] for a in t.after)
+                else:
+                    ready = all(tasks[a].state == DONE for a in t.after)
+                if ready:
+                    t.state = RUNNING
+                    t.attempts += 1
+                    running[t.resource] += 1
+                    futures[pool.submit(timedRun, t)] = t
+                    log.info('starting ' + t.name + ' (attempt ' + str(t.attempts) + ')')
+
+            if len(futures) == 0:
+                break
+
+            done, notDone = wait(list(futures), return_when = FIRST_COMPLETED)
+            for fut in done:
+                t = futures.pop(fut)
+                running[t.resource] -= 1
+                retry = True
+                try:
+                    (code, output), seconds = fut.result()
+                except NoRetry as e:
+                    code, output, seconds, retry = -1, str(e), 0.0, False
+                except Exception as e:
+                    code, output, seconds = -1, str(e), 0.0
+                t.seconds += seconds
+
+                if code == 0:
+                    t.state = DONE
+                elif retry and t.attempts <= retries:
+                    t.state = WAITING
+                    log.warning(t.name + ' failed with code ' + str(code) + ', retrying\n' + output[-2000:])
+                    continue
+                else:
+                    t.state = FAILED
+                    log.warning(t.name + ' failed with code ' + str(code) + '\n' + output[-2000:])
+                    skipDownstream(t.name)
+
+                finished = len([x for x in tasks.values() if x.state in [DONE, FAILED, SKIPPED]])
+                elapsed = time.time() - startTime
+                rate = finished / elapsed if elapsed > 0 else 0.0
+                eta = (total - finished) / rate if rate > 0 else 0.0
+                log.info(t.name + ' ' + t.state + ' in ' + formatSeconds(seconds) + '; ' + str(finished) + '/' + str(total) +
+                         ' tasks finished, ' + '%.1f' % (rate * 3600) + ' tasks/hour, ETA ' + formatSeconds(eta))
+
+    summary = {s: sorted(t.name for t in tasks.values() if t.state == s) for s in [DONE, FAILED, SKIPPED]}
+    log.info('batch finished in ' + formatSeconds(time.time() - startTime) + ': ' + str(len(summary[DONE])) + ' done, ' +
+             str(len(summary[FAILED])) + ' failed, ' + str(len(summary[SKIPPED])) + ' skipped')
+    return summary
+
+
+if __name__ == "__main__":
+    configFile = sys.argv[1]
+    with open(configFile) as f:
+        config = json.load(f)
+
+    logging.basicConfig(level = logging.INFO, format = '%(asctime)s %(levelname)s %(message)s',
+                        handlers = [logging.StreamHandler(),
+                                    logging.FileHandler(os.path.splitext(configFile)[0] + '_' + platform.node() + '.log')])
+    log = logging.getLogger('huc_batch')
+
+    hucs = sys.argv[2:] if len(sys.argv) > 2 else config.get('hucs', [])
+    huc12s = expandHucs(hucs, config.get('huc12List'))
+    log.info('running ' + str(len(huc12s)) + ' HUC12s')
+
+    tasks = buildTasks(config, huc12s)
+    runner = runCommand
+    if config.get('workerSpool') is not None:
+        import huc_worker
+        runner = huc_worker.spoolRunner(config['workerSpool'], timeout = config.get('workerTimeout', huc_worker.JOB_TIMEOUT))
+        log.info('sending tasks to the workers on ' + config['workerSpool'])
+    summary = runBatch(tasks, config.get('limits'), config.get('retries', 1), log, runner)
+    if len(summary[FAILED]) > 0:
+        sys.exit(1)
@@ -0,0 +1,442 @@
+## huc_worker.py
+## A long-lived worker that runs the DEP preprocessing tools (cmd_channel_DEP.py, cmd_Sampler_DEP.pyt,
+##  cmd_tillage_assign.pyt, status_journal.py) for one HUC12 after another in the same Python process.
+##
+## Launching a fresh process per HUC12 pays for import arcpy, arcpy.sa, checking out the Spatial and 3D
+##  extensions and importing dem_functions every time, which is a large share of the run time of a small
+##  HUC12. A worker does that once, then takes jobs from a directory spool and runs each tool's
+##  __main__ block with the same sys.argv list it takes from the command line (minus the python exe):
+##   incoming/<job>.json - submitted jobs {"id": ..., "argv": [script, arg1, ...]}, oldest first
+##   running/<job>.json  - jobs claimed by a worker (claimed with a rename, so several workers can share a spool),
+##                         touched every HEARTBEAT seconds while the job runs
+##   done/<job>.json     - results {"id", "argv", "code", "seconds", "worker", "log", "started", "finished"}
+##   running/<job>.cancel - written by huc_batch when it gave up waiting on a claimed job, the job is not run
+##                         again (claimed or requeued) and its result is marked cancelled
+##   logs/<job>.log      - everything the job printed or logged while it ran
+##   scratch/<job>/      - the job's scratch workspace, removed when the job finishes
+##   stop                - create this file to have the workers exit after their current job
+##
+## Each job gets its own log handler and scratch workspace, and sys.argv, sys.path, the working directory,
+##  the logging handlers the tool added and the arcpy environment settings are put back after it, so one
+##  HUC12 does not leak into the next. The geoprocessing set up is behind a backend object (ArcpyBackend,
+##  or StubBackend to run the worker and tools without ArcGIS). Modules the tools import stay loaded between
+##  jobs, so restart the workers after changing tillage_functions.py and the like. Their per-process caches
+##  (RESET_CACHES, e.g. which table_cache tables were checked against their source) are cleared before each job.
+##
+## A running job whose file has not been touched for STALE_AFTER seconds belongs to a worker that died, an
+##  idle worker moves it back to incoming to be run again. huc_batch waits at most its workerTimeout (default
+##  JOB_TIMEOUT) for a job, a job no worker has started by then is withdrawn and the task fails (and is retried).
+##  A job already running is cancelled instead and its task fails without a retry, so a second copy of the
+##  job is never run beside the first.
+##
+## Usage:
+##   python huc_worker.py <spool dir> [--scripts C:/DEP/Scripts/basics] [--max-jobs N] [--idle-exit seconds] [--stub]
+##  huc_batch.py sends its tasks to the workers when its config has "workerSpool": "<spool dir>".
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - per-process caches cleared before each job, running jobs send a heartbeat and stale ones are
+##               requeued, spoolRunner gives up on a job after a timeout
+## 2026.10.19 - a timed out running job gets a cancel marker and its task is not retried
+
+import os
+import sys
+import json
+import time
+import uuid
+import runpy
+import shutil
+import logging
+import argparse
+import threading
+import platform
+import importlib
+import traceback
+import contextlib
+
+import huc_batch
+
+SPOOL_DIRS = ['incoming', 'running', 'done', 'logs', 'scratch']
+STOP_FILE = 'stop'
+CANCEL_EXTENSION = '.cancel'
+
+# seconds between touches of a running job's file, and without one before the job is requeued
+HEARTBEAT = 60.0
+STALE_AFTER = 10 * HEARTBEAT
+# seconds spoolRunner waits for a job to finish
+JOB_TIMEOUT = 12 * 3600.0
+
+# (module, function) called before each job, if the module is loaded, to clear what it cached in the process
+RESET_CACHES = [('table_cache', 'resetChecked')]
+
+
+class ArcpyBackend(object):
+    '''Imports arcpy and checks out the extensions once, resets the arcpy environment around each job'''
+
+    def __init__(self, extensions = ('Spatial', '3D'), preload = ('dem_functions',)):
+        self.extensions = list(extensions)
+        self.preload = list(preload)
+        self.arcpy = None
+
+    def initialize(self):
+        import arcpy
+        import arcpy.sa
+        for ext in self.extensions:
+            status = arcpy.CheckOutExtension(ext)
+            if status != 'CheckedOut':
+                raise RuntimeError('could not check out the ' + ext + ' extension: ' + str(status))
+        for name in self.preload:
+            importlib.import_module(name)
+        self.arcpy = arcpy
+
+    def beginJob(self, scratchDir):
+        self.arcpy.ResetEnvironments()
+        self.arcpy.env.scratchWorkspace = scratchDir
+
+    def endJob(self):
+        # release any locks the job left on its geodatabases
+        self.arcpy.ClearWorkspaceCache_management()
+        self.arcpy.ResetEnvironments()
+
+    def shutdown(self):
+        for ext in self.extensions:
+            self.arcpy.CheckInExtension(ext)
+
+
+class StubBackend(object):
+    '''Backend without ArcGIS for running the worker against stand-in tools, records the calls made to it'''
+
+    def __init__(self):
+        self.calls = []
+        self.scratchDir = None
+
+    def initialize(self):
+        self.calls.append(('initialize',))
+
+    def beginJob(self, scratchDir):
+        self.scratchDir = scratchDir
+        self.calls.append(('beginJob', scratchDir))
+
+    def endJob(self):
+        self.calls.append(('endJob', self.scratchDir))
+        self.scratchDir = None
+
+    def shutdown(self):
+        self.calls.append(('shutdown',))
+
+
+##-------------------------------------------------------------------------------------------------------
+## spool
+
+def makeSpool(spoolDir):
+    for d in SPOOL_DIRS:
+        p = os.path.join(spoolDir, d)
+        if not os.path.isdir(p):
+            os.makedirs(p)
+    return spoolDir
+
+
+def writeJson(path, obj):
+    # write then rename so a reader never sees a half written file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent = 1)
+    os.replace(tmp, path)
+
+
+def submitJob(spoolDir, argv, jobId = None):
+    '''Queue a tool's argument list (script first) for the workers, returns the job id'''
+    makeSpool(spoolDir)
+    if jobId is None:
+        jobId = time.strftime('%Y%m%d%H%M%S') + '_' + uuid.uuid4().hex[:8]
+    writeJson(os.path.join(spoolDir, 'incoming', jobId + '.json'), {'id': jobId, 'argv': list(argv)})
+    return jobId
+
+
+def jobResult(spoolDir, jobId):
+    '''Result of a finished job, None while it is waiting or running'''
+    resultFile = os.path.join(spoolDir, 'done', jobId + '.json')
+    if not os.path.isfile(resultFile):
+        return None
+    with open(resultFile) as f:
+        return json.load(f)
+
+
+def waitJob(spoolDir, jobId, poll = 1.0, timeout = None):
+    '''Wait for a job to finish and return its result'''
+    t0 = time.time()
+    while True:
+        result = jobResult(spoolDir, jobId)
+        if result is not None:
+            return result
+        if timeout is not None and time.time() - t0 > timeout:
+            raise RuntimeError('timed out waiting for job ' + jobId)
+        time.sleep(poll)
+
+
+def cancelFile(spoolDir, jobId):
+    return os.path.join(spoolDir, 'running', jobId + CANCEL_EXTENSION)
+
+
+def dropCancelled(spoolDir, jobId):
+    '''Remove a cancelled job's running file and marker, returns False if the job was not cancelled'''
+    marker = cancelFile(spoolDir, jobId)
+    if not os.path.isfile(marker):
+        return False
+    for path in [os.path.join(spoolDir, 'running', jobId + '.json'), marker]:
+        if os.path.isfile(path):
+            os.remove(path)
+    return True
+
+
+def claimJob(spoolDir):
+    '''Move the oldest incoming job to running, returns the job or None if there are none'''
+    incoming = os.path.join(spoolDir, 'incoming')
+    for name in sorted(f for f in os.listdir(incoming) if f.endswith('.json')):
+        running = os.path.join(spoolDir, 'running', name)
+        try:
+            os.replace(os.path.join(incoming, name), running)
+        except OSError:
+            # another worker claimed it first
+            continue
+        if dropCancelled(spoolDir, name[:-len('.json')]):
+            continue
+        with open(running) as f:
+            return json.load(f)
+    return None
+
+
+def requeueStale(spoolDir, staleAfter = STALE_AFTER):
+    '''Move running jobs without a heartbeat for staleAfter seconds (their worker died) back to incoming,
+    returns their ids'''
+    running = os.path.join(spoolDir, 'running')
+    requeued = []
+    for name in sorted(f for f in os.listdir(running) if f.endswith('.json')):
+        path = os.path.join(running, name)
+        try:
+            if time.time() - os.path.getmtime(path) <= staleAfter:
+                continue
+            # nobody is waiting for a cancelled job any more
+            if dropCancelled(spoolDir, name[:-len('.json')]):
+                continue
+            os.replace(path, os.path.join(spoolDir, 'incoming', name))
+        except OSError:
+            # finished or requeued by someone else meanwhile
+            continue
+        requeued.append(name[:-len('.json')])
+    return requeued
+
+
+def withdrawJob(spoolDir, jobId):
+    '''Take a job no worker has claimed yet out of incoming, returns False if it was already claimed'''
+    try:
+        os.remove(os.path.join(spoolDir, 'incoming', jobId + '.json'))
+        return True
+    except OSError:
+        return False
+
+
+def cancelJob(spoolDir, jobId):
+    '''Mark a claimed job cancelled, the worker running it keeps going but the job is not run again'''
+    writeJson(cancelFile(spoolDir, jobId), {'id': jobId, 'cancelled': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+
+def spoolRunner(spoolDir, poll = 1.0, timeout = JOB_TIMEOUT):
+    '''huc_batch runner that sends a task to the workers instead of starting a process, a task fails if
+    its job has not finished after timeout seconds. A job a worker has started is cancelled and its task
+    is not retried, as the first copy may still be writing the HUC12's outputs.'''
+    def runner(task):
+        # time first so the workers take the jobs in the order they were submitted
+        jobId = submitJob(spoolDir, task.argv[1:], time.strftime('%Y%m%d%H%M%S') + '_' + task.name + '_' + uuid.uuid4().hex[:8])
+        try:
+            result = waitJob(spoolDir, jobId, poll, timeout)
+        except RuntimeError:
+            if withdrawJob(spoolDir, jobId):
+                raise RuntimeError('no worker started job ' + jobId + ' within ' + str(timeout) + ' s')
+            cancelJob(spoolDir, jobId)
+            # it may have finished meanwhile
+            result = jobResult(spoolDir, jobId)
+            if result is None:
+                raise huc_batch.NoRetry('job ' + jobId + ' still running after ' + str(timeout) + ' s, cancelled')
+            dropCancelled(spoolDir, jobId)
+        output = ''
+        if os.path.isfile(result['log']):
+            with open(result['log'], errors = 'replace') as f:
+                output = f.read()
+        return result['code'], output
+    return runner
+
+
+##-------------------------------------------------------------------------------------------------------
+## running jobs
+
+def loggerHandlers():
+    '''Handlers attached to the root logger and every named logger'''
+    loggers = [logging.getLogger()] + [l for l in logging.Logger.manager.loggerDict.values() if isinstance(l, logging.Logger)]
+    return {id(l): (l, list(l.handlers)) for l in loggers}
+
+
+def removeNewHandlers(before):
+    '''Close and remove the handlers added since before, e.g. by df.setupLoggingNoCh'''
+    for key, (logger, handlers) in loggerHandlers().items():
+        old = before[key][1] if key in before else []
+        for h in handlers:
+            if h not in old:
+                logger.removeHandler(h)
+                h.close()
+
+
+def exitCode(code):
+    '''Process exit code for a SystemExit code'''
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code)
+    return 1
+
+
+def resetCaches():
+    '''Clear the per-process caches of the modules in RESET_CACHES that are loaded'''
+    for name, func in RESET_CACHES:
+        if name in sys.modules:
+            getattr(sys.modules[name], func)()
+
+
+@contextlib.contextmanager
+def heartbeat(path, interval = HEARTBEAT):
+    '''Touch path every interval seconds while the block runs'''
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    thread = threading.Thread(target = beat, daemon = True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def runJob(spoolDir, job, backend):
+    '''Run one job's tool in this process, returns the result record'''
+    jobId = job['id']
+    argv = job['argv']
+    script = os.path.abspath(argv[0])
+    logFile = os.path.join(spoolDir, 'logs', jobId + '.log')
+    scratchDir = os.path.join(spoolDir, 'scratch', jobId)
+    os.makedirs(scratchDir, exist_ok = True)
+
+    savedArgv = sys.argv
+    savedPath = list(sys.path)
+    savedCwd = os.getcwd()
+    before = loggerHandlers()
+    started = time.time()
+    code = 0
+
+    with open(logFile, 'a') as out:
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+        root = logging.getLogger()
+        root.addHandler(handler)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            try:
+                resetCaches()
+                backend.beginJob(scratchDir)
+                # the same sys.argv and sys.path[0] the tool gets when python runs it
+                sys.argv = [script] + list(argv[1:])
+                sys.path.insert(0, os.path.dirname(script))
+                runpy.run_path(script, run_name = '__main__')
+            except SystemExit as e:
+                code = exitCode(e.code)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                try:
+                    backend.endJob()
+                except Exception:
+                    traceback.print_exc()
+                    code = code or 1
+                sys.argv = savedArgv
+                sys.path[:] = savedPath
+                os.chdir(savedCwd)
+                root.removeHandler(handler)
+                removeNewHandlers(before)
+    shutil.rmtree(scratchDir, ignore_errors = True)
+
+    return {'id': jobId, 'argv': argv, 'code': code, 'seconds': time.time() - started,
+            'worker': platform.node() + ':' + str(os.getpid()), 'log': logFile,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)),
+            'finished': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def serve(spoolDir, backend, poll = 1.0, maxJobs = None, idleExit = None, log = None,
+          heartbeatInterval = HEARTBEAT, staleAfter = STALE_AFTER):
+    '''Initialize the backend once and run jobs from the spool until it is stopped, maxJobs
+    have run or no job arrived for idleExit seconds. While idle, running jobs without a heartbeat
+    for staleAfter seconds are requeued. Returns the number of jobs run.'''
+    if log is None:
+        log = logging.getLogger('huc_worker')
+    makeSpool(spoolDir)
+    t0 = time.time()
+    backend.initialize()
+    log.info('worker initialized in ' + '%.1f' % (time.time() - t0) + ' s, waiting for jobs in ' + spoolDir)
+
+    nJobs = 0
+    idleSince = time.time()
+    try:
+        while not os.path.isfile(os.path.join(spoolDir, STOP_FILE)):
+            job = claimJob(spoolDir)
+            if job is None:
+                for jobId in requeueStale(spoolDir, staleAfter):
+                    log.warning(jobId + ' had no heartbeat for ' + str(staleAfter) + ' s, requeued')
+                if idleExit is not None and time.time() - idleSince > idleExit:
+                    log.info('no jobs for ' + str(idleExit) + ' s, exiting')
+                    break
+                time.sleep(poll)
+                continue
+
+            log.info('starting ' + job['id'] + ': ' + ' '.join(job['argv']))
+            runningFile = os.path.join(spoolDir, 'running', job['id'] + '.json')
+            with heartbeat(runningFile, heartbeatInterval):
+                result = runJob(spoolDir, job, backend)
+            if os.path.isfile(cancelFile(spoolDir, job['id'])):
+                result['cancelled'] = True
+                log.warning(job['id'] + ' was cancelled while it ran, nobody is waiting for its result')
+            writeJson(os.path.join(spoolDir, 'done', job['id'] + '.json'), result)
+            if not dropCancelled(spoolDir, job['id']) and os.path.isfile(runningFile):
+                os.remove(runningFile)
+            log.info(job['id'] + ' finished with code ' + str(result['code']) + ' in ' + '%.1f' % result['seconds'] + ' s')
+
+            nJobs += 1
+            if maxJobs is not None and nJobs >= maxJobs:
+                break
+            idleSince = time.time()
+    finally:
+        backend.shutdown()
+    log.info('worker ran ' + str(nJobs) + ' jobs')
+    return nJobs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Run DEP preprocessing tools for HUC12 jobs from a spool directory')
+    parser.add_argument('spoolDir')
+    parser.add_argument('--scripts', default = 'C:\\DEP\\Scripts\\basics', help = 'folder holding dem_functions.py')
+    parser.add_argument('--poll', type = float, default = 1.0)
+    parser.add_argument('--max-jobs', dest = 'maxJobs', type = int, default = None)
+    parser.add_argument('--idle-exit', dest = 'idleExit', type = float, default = None)
+    parser.add_argument('--stub', action = 'store_true', help = 'run without ArcGIS using StubBackend')
+    args = parser.parse_args()
+
+    sys.path.append(args.scripts)
+    logging.basicConfig(level = logging.INFO, format = '%(asctime)s %(levelname)s %(message)s',
+                        handlers = [logging.StreamHandler(sys.__stdout__)])
+    log = logging.getLogger('huc_worker')
+    backend = StubBackend() if args.stub else ArcpyBackend()
+    serve(args.spoolDir, backend, args.poll, args.maxJobs, args.idleExit, log)
@@ -0,0 +1,220 @@
+## projection_functions.py
+## Vectorized coordinate transforms for the projections DEP sample points move between:
+##  NAD83 UTM zones 14-17 north (EPSG:26914-26917, or NAD83(2011) EPSG:6343-6346) and
+##  NAD83 CONUS Albers Equal Area (EPSG:5070). Both are on the GRS80 ellipsoid with the NAD83 datum,
+##  so there is no datum shift, only the inverse transverse Mercator and the forward Albers projection.
+##
+## Transverse Mercator uses the Krueger series to 6th order in n (Karney 2011, as PROJ's etmerc/utm),
+##  Albers the ellipsoidal formulas of Snyder (1987, USGS PP 1395, p. 101-102).
+##
+## Accuracy: checked against PROJ 9.5.1 on 80,000 random points (x 160-840 km, y 3200-5500 km in each of
+##  zones 14-17) the largest difference is 1.3e-8 m, the UTM -> Albers -> UTM round trip is within 1.1e-8 m.
+##  REFERENCE_POINTS keeps 20 of those PROJ results at full precision (to 1e-9 m), checkAccuracy() gives the
+##  largest difference from them (4.2e-9 m).
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - reference points at full precision, they were rounded to 0.1 mm and checkAccuracy measured the rounding
+
+import numpy as np
+
+# GRS80
+A_GRS80 = 6378137.0
+F_GRS80 = 1 / 298.257222101
+E2 = F_GRS80 * (2 - F_GRS80)
+E = np.sqrt(E2)
+
+# UTM
+K0_UTM = 0.9996
+FE_UTM = 500000.0
+
+# EPSG:5070 NAD83 / Conus Albers
+ALBERS_LAT1 = 29.5
+ALBERS_LAT2 = 45.5
+ALBERS_LAT0 = 23.0
+ALBERS_LON0 = -96.0
+ALBERS_EPSG = 5070
+
+UTM_ZONES = [14, 15, 16, 17]
+
+# (zone, UTM x, UTM y, Albers x, Albers y) from PROJ 9.5.1, EPSG:269<zone> -> EPSG:5070
+REFERENCE_POINTS = [
+    (14, 500000.0, 4600000.0, -248341.075409102, 2064668.007715106),
+    (14, 250000.0, 4100000.0, -511797.175606613, 1567855.526025322),
+    (14, 760000.0, 5200000.0, 31666.963617006, 2656980.104954450),
+    (14, 300000.0, 3300000.0, -489488.203986106, 761825.732848879),
+    (14, 700000.0, 4900000.0, -39501.401376645, 2359595.775926673),
+    (15, 500000.0, 4600000.0, 248341.075409104, 2064668.007715106),
+    (15, 250000.0, 4100000.0, 16755.720437360, 1552222.906209925),
+    (15, 760000.0, 5200000.0, 490419.948424624, 2673466.777174153),
+    (15, 300000.0, 3300000.0, 89875.801940446, 749206.610370415),
+    (15, 700000.0, 4900000.0, 438156.514957444, 2372184.668761801),
+    (16, 500000.0, 4600000.0, 744033.634439287, 2096005.618720167),
+    (16, 250000.0, 4100000.0, 545241.848133325, 1569969.893325658),
+    (16, 760000.0, 5200000.0, 947218.703337558, 2718865.113495771),
+    (16, 300000.0, 3300000.0, 668881.669949636, 773166.961501198),
+    (16, 700000.0, 4900000.0, 914068.461204405, 2414885.777399247),
+    (17, 500000.0, 4600000.0, 1236761.361439818, 2158555.966331422),
+    (17, 250000.0, 4100000.0, 1071555.291127381, 1621025.769015993),
+    (17, 760000.0, 5200000.0, 1400242.972500451, 2792994.210213625),
+    (17, 300000.0, 3300000.0, 1245222.172164431, 833611.308814956),
+    (17, 700000.0, 4900000.0, 1386338.019089289, 2487528.946070869)]
+
+
+def utmZone(epsg):
+    '''UTM zone of a NAD83 (269zz) or NAD83(2011) (6343-6346) UTM north EPSG code, None otherwise'''
+    epsg = int(epsg)
+    if 26914 <= epsg <= 26917:
+        return epsg - 26900
+    if 6343 <= epsg <= 6346:
+        return epsg - 6329
+    return None
+
+
+##-------------------------------------------------------------------------------------------------------
+## transverse Mercator, Krueger series
+
+_n = F_GRS80 / (2 - F_GRS80)
+_A = A_GRS80 / (1 + _n) * (1 + _n ** 2 / 4 + _n ** 4 / 64 + _n ** 6 / 256)
+_ALPHA = [_n / 2 - 2 * _n ** 2 / 3 + 5 * _n ** 3 / 16 + 41 * _n ** 4 / 180 - 127 * _n ** 5 / 288 + 7891 * _n ** 6 / 37800,
+          13 * _n ** 2 / 48 - 3 * _n ** 3 / 5 + 557 * _n ** 4 / 1440 + 281 * _n ** 5 / 630 - 1983433 * _n ** 6 / 1935360,
+          61 * _n ** 3 / 240 - 103 * _n ** 4 / 140 + 15061 * _n ** 5 / 26880 + 167603 * _n ** 6 / 181440,
+          49561 * _n ** 4 / 161280 - 179 * _n ** 5 / 168 + 6601661 * _n ** 6 / 7257600,
+          34729 * _n ** 5 / 80640 - 3418889 * _n ** 6 / 1995840,
+          212378941 * _n ** 6 / 319334400]
+_BETA = [_n / 2 - 2 * _n ** 2 / 3 + 37 * _n ** 3 / 96 - _n ** 4 / 360 - 81 * _n ** 5 / 512 + 96199 * _n ** 6 / 604800,
+         _n ** 2 / 48 + _n ** 3 / 15 - 437 * _n ** 4 / 1440 + 46 * _n ** 5 / 105 - 1118711 * _n ** 6 / 3870720,
+         17 * _n ** 3 / 480 - 37 * _n ** 4 / 840 - 209 * _n ** 5 / 4480 + 5569 * _n ** 6 / 90720,
+         4397 * _n ** 4 / 161280 - 11 * _n ** 5 / 504 - 830251 * _n ** 6 / 7257600,
+         4583 * _n ** 5 / 161280 - 108847 * _n ** 6 / 3991680,
+         20648693 * _n ** 6 / 638668800]
+_DELTA = [2 * _n - 2 * _n ** 2 / 3 - 2 * _n ** 3 + 116 * _n ** 4 / 45 + 26 * _n ** 5 / 45 - 2854 * _n ** 6 / 675,
+          7 * _n ** 2 / 3 - 8 * _n ** 3 / 5 - 227 * _n ** 4 / 45 + 2704 * _n ** 5 / 315 + 2323 * _n ** 6 / 945,
+          56 * _n ** 3 / 15 - 136 * _n ** 4 / 35 - 1262 * _n ** 5 / 105 + 73814 * _n ** 6 / 2835,
+          4279 * _n ** 4 / 630 - 332 * _n ** 5 / 35 - 399572 * _n ** 6 / 14175,
+          4174 * _n ** 5 / 315 - 144838 * _n ** 6 / 6237,
+          601676 * _n ** 6 / 22275]
+
+
+def centralMeridian(zone):
+    return np.radians(-183.0 + 6.0 * zone)
+
+
+def utmToGeographic(x, y, zone):
+    '''NAD83 latitude, longitude (radians) of UTM north coordinates'''
+    xi = np.asarray(y, dtype = np.float64) / (K0_UTM * _A)
+    eta = (np.asarray(x, dtype = np.float64) - FE_UTM) / (K0_UTM * _A)
+    xi1 = xi.copy()
+    eta1 = eta.copy()
+    for j, b in enumerate(_BETA, 1):
+        xi1 -= b * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+        eta1 -= b * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+    chi = np.arcsin(np.sin(xi1) / np.cosh(eta1))
+    lat = chi.copy()
+    for j, d in enumerate(_DELTA, 1):
+        lat += d * np.sin(2 * j * chi)
+    lon = centralMeridian(zone) + np.arctan2(np.sinh(eta1), np.cos(xi1))
+    return lat, lon
+
+
+def geographicToUtm(lat, lon, zone):
+    '''UTM north coordinates of NAD83 latitude, longitude (radians)'''
+    lat = np.asarray(lat, dtype = np.float64)
+    dlon = np.asarray(lon, dtype = np.float64) - centralMeridian(zone)
+    sinLat = np.sin(lat)
+    t = np.sinh(np.arctanh(sinLat) - E * np.arctanh(E * sinLat))
+    xi1 = np.arctan2(t, np.cos(dlon))
+    eta1 = np.arctanh(np.sin(dlon) / np.sqrt(1 + t * t))
+    xi = xi1.copy()
+    eta = eta1.copy()
+    for j, a in enumerate(_ALPHA, 1):
+        xi += a * np.sin(2 * j * xi1) * np.cosh(2 * j * eta1)
+        eta += a * np.cos(2 * j * xi1) * np.sinh(2 * j * eta1)
+    return FE_UTM + K0_UTM * _A * eta, K0_UTM * _A * xi
+
+
+##-------------------------------------------------------------------------------------------------------
+## Albers equal area conic, EPSG:5070 parameters
+
+def _q(sinLat):
+    esin = E * sinLat
+    return (1 - E2) * (sinLat / (1 - esin * esin) - np.log((1 - esin) / (1 + esin)) / (2 * E))
+
+
+def _m(lat):
+    sinLat = np.sin(lat)
+    return np.cos(lat) / np.sqrt(1 - E2 * sinLat * sinLat)
+
+
+_lat1 = np.radians(ALBERS_LAT1)
+_lat2 = np.radians(ALBERS_LAT2)
+_m1 = _m(_lat1)
+_m2 = _m(_lat2)
+_q1 = _q(np.sin(_lat1))
+_q2 = _q(np.sin(_lat2))
+_N = (_m1 * _m1 - _m2 * _m2) / (_q2 - _q1)
+_C = _m1 * _m1 + _N * _q1
+_RHO0 = A_GRS80 * np.sqrt(_C - _N * _q(np.sin(np.radians(ALBERS_LAT0)))) / _N
+_LON0 = np.radians(ALBERS_LON0)
+_QP = _q(1.0)
+
+
+def geographicToAlbers(lat, lon):
+    '''EPSG:5070 x, y of NAD83 latitude, longitude (radians)'''
+    rho = A_GRS80 * np.sqrt(_C - _N * _q(np.sin(np.asarray(lat, dtype = np.float64)))) / _N
+    theta = _N * (np.asarray(lon, dtype = np.float64) - _LON0)
+    return rho * np.sin(theta), _RHO0 - rho * np.cos(theta)
+
+
+def albersToGeographic(x, y):
+    '''NAD83 latitude, longitude (radians) of EPSG:5070 x, y'''
+    x = np.asarray(x, dtype = np.float64)
+    dy = _RHO0 - np.asarray(y, dtype = np.float64)
+    rho = np.hypot(x, dy)
+    q = (_C - (rho * _N / A_GRS80) ** 2) / _N
+    # authalic latitude series for a start, then Newton on q(lat) (Snyder eq. 3-16)
+    beta = np.arcsin(np.clip(q / _QP, -1.0, 1.0))
+    lat = beta + (E2 / 3 + 31 * E2 ** 2 / 180 + 517 * E2 ** 3 / 5040) * np.sin(2 * beta) \
+               + (23 * E2 ** 2 / 360 + 251 * E2 ** 3 / 3780) * np.sin(4 * beta) \
+               + (761 * E2 ** 3 / 45360) * np.sin(6 * beta)
+    for i in range(2):
+        sinLat = np.sin(lat)
+        esin2 = 1 - E2 * sinLat * sinLat
+        lat = lat + esin2 ** 2 / (2 * np.cos(lat)) * (q / (1 - E2) - sinLat / esin2
+                                                      + np.log((1 - E * sinLat) / (1 + E * sinLat)) / (2 * E))
+    return lat, _LON0 + np.arctan2(x, dy) / _N
+
+
+##-------------------------------------------------------------------------------------------------------
+
+
+def utmToAlbers(x, y, zone):
+    '''EPSG:5070 x, y arrays from NAD83 UTM zone (14-17) north x, y arrays'''
+    lat, lon = utmToGeographic(x, y, zone)
+    return geographicToAlbers(lat, lon)
+
+
+def albersToUtm(x, y, zone):
+    '''NAD83 UTM zone (14-17) north x, y arrays from EPSG:5070 x, y arrays'''
+    lat, lon = albersToGeographic(x, y)
+    return geographicToUtm(lat, lon, zone)
+
+
+def toAlbers(x, y, epsg):
+    '''EPSG:5070 x, y from coordinates in one of the supported UTM EPSG codes'''
+    zone = utmZone(epsg)
+    if zone is None:
+        raise ValueError('no array transform from EPSG:' + str(epsg) + ' to EPSG:' + str(ALBERS_EPSG))
+    return utmToAlbers(x, y, zone)
+
+
+def checkAccuracy(points = REFERENCE_POINTS):
+    '''Largest x or y difference (m) from the reference points'''
+    worst = 0.0
+    for zone, ux, uy, ax, ay in points:
+        x, y = utmToAlbers(ux, uy, zone)
+        worst = max(worst, abs(float(x) - ax), abs(float(y) - ay))
+    return worst
+
+
+if __name__ == "__main__":
+    print('largest difference from the reference points: %.2e m' % checkAccuracy())
@@ -0,0 +1,319 @@
+## raster_store.py
+## A memory-mapped store for the intermediate grids that cmd_channel_DEP.py passes between stages
+##  (demfel, demp, demad8, demss, demssa, demsrc, demw).
+##
+## Only the grids a Python step reads are stored (demad8 and the boundary line mask for the pour points, demw for
+##  mkWSheds, and the grids of the tiled engine), the TauDEM only grids stay GeoTIFFs.
+##
+## Each grid is held as an uncompressed .npy file that is opened with numpy.memmap, alongside a small
+##  JSON sidecar with the georeferencing (lower left corner, cell size, shape, nodata, spatial reference)
+##  and the statistics (count, min, max, mean, std) computed once when the grid is written.
+##  Consumers get read-only views of the file, so nothing is copied or re-parsed between stages and
+##  there is no need for CalculateStatistics just to read a mean or standard deviation.
+##  GeoTIFFs are only written by to_geotiff, when something outside the pipeline asks for one.
+##
+## arcpy is only imported by add_raster, add_mask and to_geotiff, the rest only needs numpy.
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - added add_mask and pointValues, polygons rasterized once onto a stored grid so points can be
+##               classified by array lookup instead of a vector overlay
+## 2026.10.19 - added validCells and cellCenters for the pour points
+## 2026.10.19 - to_geotiff writes a block of rows at a time and mosaics them, instead of the whole grid in one array
+## 2026.10.19 - to_geotiff gives float grids with NaN for nodata the NoData value FLOAT_NODATA
+## 2026.10.19 - add_mask also rasterizes lines and points
+
+import os
+import json
+import numpy as np
+
+STORE_VERSION = 1
+
+# number of rows read, written or summarized at a time so memory stays bounded on large grids
+BLOCK_ROWS = 1024
+
+# NoData of float GeoTIFFs written from grids that mark nodata with NaN, the value ArcGIS gives float rasters
+FLOAT_NODATA = -3.4028234663852886e+38
+
+
+def makeGeoref(xmin, ymin, cellsize, nrows, ncols, spatialReference = None):
+    '''Create the georeferencing dictionary stored in the sidecar for each grid'''
+    return {'xmin': float(xmin), 'ymin': float(ymin), 'cellsize': float(cellsize),
+            'nrows': int(nrows), 'ncols': int(ncols), 'spatialReference': spatialReference}
+
+
+def cellIndex(georef, x, y):
+    '''Row and column of the cells holding points x, y and True where the point is on the grid'''
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    cellsize = georef['cellsize']
+    ymax = georef['ymin'] + georef['nrows'] * cellsize
+    col = np.floor((x - georef['xmin']) / cellsize).astype(np.int64)
+    row = np.floor((ymax - y) / cellsize).astype(np.int64)
+    inside = (row >= 0) & (row < georef['nrows']) & (col >= 0) & (col < georef['ncols'])
+    return row, col, inside
+
+
+def pointValues(grid, georef, x, y, fill = 0):
+    '''Value of a grid at points x, y, fill for points off the grid'''
+    row, col, inside = cellIndex(georef, x, y)
+    out = np.full(row.shape, fill, dtype = np.result_type(grid.dtype, np.min_scalar_type(fill)))
+    out[inside] = grid[row[inside], col[inside]]
+    return out
+
+
+def cellCenters(georef, row, col):
+    '''x, y of the centers of cells row, col'''
+    cellsize = georef['cellsize']
+    x = georef['xmin'] + (np.asarray(col) + 0.5) * cellsize
+    y = georef['ymin'] + (georef['nrows'] - np.asarray(row) - 0.5) * cellsize
+    return x, y
+
+
+def validCells(grid, nodata = None, blockRows = BLOCK_ROWS):
+    '''Row and column (row major order) of the cells of a grid that are not nodata or NaN'''
+    rows = []
+    cols = []
+    for r in range(0, grid.shape[0], blockRows):
+        block = np.asarray(grid[r:r + blockRows])
+        valid = np.ones(block.shape, dtype = bool)
+        if nodata is not None:
+            valid &= block != nodata
+        if block.dtype.kind == 'f':
+            valid &= ~np.isnan(block)
+        br, bc = np.nonzero(valid)
+        rows.append(br + r)
+        cols.append(bc)
+    if len(rows) == 0:
+        return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def gridStatistics(array, nodata = None, blockRows = BLOCK_ROWS):
+    '''Calculate count, min, max, mean and (population) standard deviation of the valid cells
+    of a 2D array, a block of rows at a time. NaN is always treated as nodata.'''
+    count = 0
+    total = 0.0
+    totalSq = 0.0
+    rmin = None
+    rmax = None
+    for r in range(0, array.shape[0], blockRows):
+        block = np.asarray(array[r:r + blockRows])
+        valid = np.ones(block.shape, dtype = bool)
+        if nodata is not None:
+            valid &= block != nodata
+        if block.dtype.kind == 'f':
+            valid &= ~np.isnan(block)
+        vals = block[valid].astype(np.float64)
+        if vals.size == 0:
+            continue
+        count += vals.size
+        total += vals.sum()
+        totalSq += np.square(vals).sum()
+        bmin = vals.min()
+        bmax = vals.max()
+        rmin = bmin if rmin is None else min(rmin, bmin)
+        rmax = bmax if rmax is None else max(rmax, bmax)
+
+    if count == 0:
+        return {'count': 0, 'min': None, 'max': None, 'mean': None, 'std': None}
+
+    mean = total / count
+    var = max(totalSq / count - mean * mean, 0.0)
+    return {'count': int(count), 'min': float(rmin), 'max': float(rmax), 'mean': float(mean), 'std': float(np.sqrt(var))}
+
+
+class RasterStore(object):
+    '''A directory of memory-mapped grids with georeferencing and statistics sidecars'''
+
+    def __init__(self, storeDir):
+        self.storeDir = storeDir
+        if not os.path.isdir(storeDir):
+            os.makedirs(storeDir)
+
+    def _npyPath(self, name):
+        return os.path.join(self.storeDir, name + '.npy')
+
+    def _jsonPath(self, name):
+        return os.path.join(self.storeDir, name + '.json')
+
+    def _readSidecar(self, name):
+        with open(self._jsonPath(name)) as f:
+            return json.load(f)
+
+    def _writeSidecar(self, name, sidecar):
+        # write then rename so a reader never sees a half written sidecar
+        tmp = self._jsonPath(name) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(sidecar, f, indent = 1)
+        os.replace(tmp, self._jsonPath(name))
+
+    def exists(self, name):
+        return os.path.isfile(self._npyPath(name)) and os.path.isfile(self._jsonPath(name))
+
+    def names(self):
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(self.storeDir) if f.endswith('.json'))
+
+    def create(self, name, georef, dtype, nodata = None):
+        '''Create an empty, writable memory-mapped grid. Call finalize once it is filled in
+        to record its statistics.'''
+        arr = np.lib.format.open_memmap(self._npyPath(name), mode = 'w+', dtype = dtype,
+                                        shape = (georef['nrows'], georef['ncols']))
+        sidecar = {'version': STORE_VERSION, 'name': name, 'dtype': np.dtype(dtype).str,
+                   'nodata': None if nodata is None else np.asarray(nodata, dtype = dtype).item(),
+                   'georef': georef, 'statistics': None}
+        self._writeSidecar(name, sidecar)
+        return arr
+
+    def finalize(self, name, arr = None):
+        '''Flush a grid created with create and compute its statistics'''
+        if arr is not None:
+            arr.flush()
+        sidecar = self._readSidecar(name)
+        sidecar['statistics'] = gridStatistics(self.get(name), sidecar['nodata'])
+        self._writeSidecar(name, sidecar)
+        return sidecar['statistics']
+
+    def put(self, name, array, georef, nodata = None):
+        '''Write an in memory array to the store, returns a read-only view of the stored grid'''
+        array = np.asarray(array)
+        if array.shape != (georef['nrows'], georef['ncols']):
+            raise ValueError('array shape ' + str(array.shape) + ' does not match georeferencing for ' + name)
+        out = self.create(name, georef, array.dtype, nodata)
+        for r in range(0, array.shape[0], BLOCK_ROWS):
+            out[r:r + BLOCK_ROWS] = array[r:r + BLOCK_ROWS]
+        self.finalize(name, out)
+        del out
+        return self.get(name)
+
+    def get(self, name):
+        '''Zero-copy, read-only view of a stored grid'''
+        return np.load(self._npyPath(name), mmap_mode = 'r')
+
+    def georef(self, name):
+        return self._readSidecar(name)['georef']
+
+    def nodata(self, name):
+        return self._readSidecar(name)['nodata']
+
+    def statistics(self, name):
+        return self._readSidecar(name)['statistics']
+
+    def delete(self, name):
+        for p in [self._npyPath(name), self._jsonPath(name)]:
+            if os.path.isfile(p):
+                os.remove(p)
+
+    def add_raster(self, name, raster):
+        '''Read an existing raster (e.g. a TauDEM GeoTIFF) into the store a block of rows at a time
+        and record its statistics, replaces CalculateStatistics_management for pipeline rasters'''
+        import arcpy
+
+        ras = arcpy.Raster(str(raster))
+        ext = ras.extent
+        cellsize = ras.meanCellWidth
+        nrows = ras.height
+        ncols = ras.width
+        sr = ras.spatialReference
+        georef = makeGeoref(ext.XMin, ext.YMin, cellsize, nrows, ncols, sr.exportToString() if sr is not None else None)
+        nodata = ras.noDataValue
+
+        # pull the first block to find out what dtype arcpy hands back for this raster
+        out = None
+        for r in range(0, nrows, BLOCK_ROWS):
+            n = min(BLOCK_ROWS, nrows - r)
+            llc = arcpy.Point(ext.XMin, ext.YMax - (r + n) * cellsize)
+            if nodata is None:
+                block = arcpy.RasterToNumPyArray(ras, llc, ncols, n)
+            else:
+                block = arcpy.RasterToNumPyArray(ras, llc, ncols, n, nodata)
+            if out is None:
+                out = self.create(name, georef, block.dtype, nodata)
+            out[r:r + n] = block
+        self.finalize(name, out)
+        del out
+        return self.get(name)
+
+    def add_mask(self, name, features, like):
+        '''Rasterize polygon, line or point features onto the grid of the stored grid like (cells whose
+        center is in a polygon, or that a line or point falls in, are 1, others 0) and store the mask as uint8'''
+        import arcpy
+
+        g = self.georef(like)
+        cellsize = g['cellsize']
+        extent = arcpy.Extent(g['xmin'], g['ymin'], g['xmin'] + g['ncols'] * cellsize, g['ymin'] + g['nrows'] * cellsize)
+        tmpTif = os.path.join(self.storeDir, name + '_features.tif')
+        desc = arcpy.Describe(features)
+        oidField = desc.OIDFieldName
+        with arcpy.EnvManager(extent = extent, cellSize = cellsize, compression = 'NONE'):
+            if desc.shapeType == 'Polygon':
+                arcpy.PolygonToRaster_conversion(features, oidField, tmpTif, 'CELL_CENTER', '', cellsize)
+            elif desc.shapeType == 'Polyline':
+                arcpy.PolylineToRaster_conversion(features, oidField, tmpTif, 'MAXIMUM_LENGTH', '', cellsize)
+            elif desc.shapeType in ['Point', 'Multipoint']:
+                arcpy.PointToRaster_conversion(features, oidField, tmpTif, 'MOST_FREQUENT', '', cellsize)
+            else:
+                raise ValueError('cannot rasterize ' + desc.shapeType + ' features into ' + name)
+        zones = self.add_raster(name + '_features', tmpTif)
+        if zones.shape != (g['nrows'], g['ncols']):
+            raise ValueError(name + ' rasterized to ' + str(zones.shape) + ', expected the shape of ' + like)
+        nodata = self.nodata(name + '_features')
+        out = self.create(name, g, np.uint8, None)
+        for r in range(0, g['nrows'], BLOCK_ROWS):
+            block = np.asarray(zones[r:r + BLOCK_ROWS])
+            valid = np.ones(block.shape, dtype = bool) if nodata is None else block != nodata
+            if block.dtype.kind == 'f':
+                valid &= ~np.isnan(block)
+            out[r:r + BLOCK_ROWS] = valid
+        self.finalize(name, out)
+        del out, zones
+        self.delete(name + '_features')
+        arcpy.Delete_management(tmpTif)
+        return self.get(name)
+
+    def to_geotiff(self, name, outTif):
+        '''Write a stored grid out as an uncompressed GeoTIFF for use outside the pipeline, a block of rows
+        at a time: each block goes to a temporary GeoTIFF and the blocks are mosaicked into the first.
+        NaN cells of a float grid without a nodata value are written as FLOAT_NODATA, the GeoTIFF's NoData.'''
+        import arcpy
+
+        sidecar = self._readSidecar(name)
+        g = sidecar['georef']
+        nodata = sidecar['nodata']
+        grid = self.get(name)
+        nanNodata = nodata is None and grid.dtype.kind == 'f'
+        if nanNodata:
+            nodata = FLOAT_NODATA
+        cellsize = g['cellsize']
+        ymax = g['ymin'] + g['nrows'] * cellsize
+
+        blockTifs = []
+        with arcpy.EnvManager(compression = 'NONE'):
+            for r in range(0, g['nrows'], BLOCK_ROWS):
+                n = min(BLOCK_ROWS, g['nrows'] - r)
+                llc = arcpy.Point(g['xmin'], ymax - (r + n) * cellsize)
+                # a copy, the stored grid is read-only
+                block = np.array(grid[r:r + n])
+                if nanNodata:
+                    block[np.isnan(block)] = nodata
+                if nodata is None:
+                    ras = arcpy.NumPyArrayToRaster(block, llc, cellsize, cellsize)
+                else:
+                    ras = arcpy.NumPyArrayToRaster(block, llc, cellsize, cellsize, nodata)
+                blockTif = os.path.join(self.storeDir, name + '_block' + str(len(blockTifs)) + '.tif')
+                ras.save(blockTif)
+                del ras, block
+                blockTifs.append(blockTif)
+            if len(blockTifs) > 1:
+                arcpy.Mosaic_management(';'.join(blockTifs[1:]), blockTifs[0], 'LAST', 'FIRST', '',
+                                        '' if nodata is None else nodata)
+            if arcpy.Exists(outTif):
+                arcpy.Delete_management(outTif)
+            # copied rather than renamed, outTif is usually in another folder
+            arcpy.CopyRaster_management(blockTifs[0], outTif)
+        for blockTif in blockTifs:
+            arcpy.Delete_management(blockTif)
+        if g['spatialReference'] is not None:
+            sr = arcpy.SpatialReference()
+            sr.loadFromString(g['spatialReference'])
+            arcpy.DefineProjection_management(outTif, sr)
+        return outTif
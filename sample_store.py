@@ -0,0 +1,325 @@
+## sample_store.py
+## A columnar, memory-mappable copy of the Sampler's good samples (smpl3m_mean18<huc12>), one file per HUC12,
+##  for the WEPP input builder to read instead of walking the geodatabase feature class row by row.
+##
+## The samples are sorted by flowpath and flowpath length (sampler_functions.FlowpathIndex) so the points of
+##  one flowpath are a contiguous slice of every column. The file is:
+##   magic      - 8 bytes, b'DEPSMPL\0'
+##   header     - little endian uint64 length, then that many bytes of UTF-8 JSON: format version, HUC12,
+##                number of points and flowpaths, attributes of the run (source feature class, soil year...),
+##                the schema of each column (dtype, kind, null value, source field) and where each block starts
+##   blocks     - raw little endian arrays, each starting on a 64 byte boundary:
+##                fp_ids (int64, flowpath ids in ascending order), fp_offsets (int64, nflowpaths + 1 entries,
+##                the points of fp_ids[i] are rows fp_offsets[i]:fp_offsets[i + 1]) and one block per column
+##
+## Text columns (management, rotation, STATSGO2_MUKEY) are dictionary encoded (categorical.py), the block holds
+##  int32 codes (-1 for null) and the distinct values are in the header. Nulls are NaN in float columns and
+##  the column's nodata value in integer columns.
+##
+## SampleWriter writes a file a block of whole flowpaths at a time (the Sampler's streaming mode), so only one
+##  block's samples are held in memory. A text column's dictionary is then in the order values were first seen.
+##
+## SampleFile maps the file once and hands out read-only views of it, so opening a HUC12 and slicing a
+##  flowpath copies nothing. Only numpy is needed to read or write the file.
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - SampleWriter appends blocks of flowpaths to part files and assembles the file at the end
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+
+import categorical
+import sampler_functions as sf
+
+MAGIC = b'DEPSMPL\0'
+FORMAT_VERSION = 1
+ALIGN = 64
+EXTENSION = '.smpl'
+
+# (column, dtype, kind, nodata) in file order, kind is 'number' or 'categorical'
+SCHEMA = [('fp', '<i4', 'number', 0),
+          ('fpLen', '<f8', 'number', None),
+          ('elevation', '<f8', 'number', None),
+          ('gord', '<i4', 'number', -1),
+          ('SOL_FY', '<i8', 'number', -1),
+          ('STATSGO2_MUKEY', '<i4', 'categorical', categorical.MISSING),
+          ('management', '<i4', 'categorical', categorical.MISSING),
+          ('rotation', '<i4', 'categorical', categorical.MISSING),
+          ('irrigated', '<i4', 'number', -1),
+          ('canopy', '<i4', 'number', -1),
+          ('x', '<f8', 'number', None),
+          ('y', '<f8', 'number', None)]
+
+COLUMNS = [s[0] for s in SCHEMA]
+
+# part files are copied into the sample file this many bytes at a time
+COPY_BYTES = 16 * 1024 * 1024
+
+
+def defaultPath(output):
+    '''Sample file beside the geodatabase holding the Sampler's output feature class'''
+    gdb = os.path.dirname(output)
+    return os.path.join(os.path.dirname(gdb), 'sample_store', os.path.basename(output) + EXTENSION)
+
+
+def aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def typedColumn(values, dtype, nodata):
+    '''Array of a number column, None (or NaN in an integer column) becomes nodata'''
+    values = np.asarray(values)
+    if values.dtype == object:
+        missing = np.equal(values, None)
+        filled = np.where(missing, np.nan if nodata is None else nodata, values)
+        values = filled.astype(np.float64)
+    if np.dtype(dtype).kind in 'iu' and values.dtype.kind == 'f':
+        missing = np.isnan(values)
+        values = np.where(missing, nodata, values)
+    return values.astype(dtype)
+
+
+def writeSampleFile(path, columns, huc12, attributes = None, fields = None):
+    '''Write the sample columns (a dictionary with every name in COLUMNS, values as arrays or lists with None
+    for nulls, text columns may already be categorical.Categorical) to path, sorted by flowpath and length.
+    fields optionally maps the columns to the source feature class fields for the header.
+    Returns the number of points and flowpaths written.'''
+    writer = SampleWriter(path, huc12, attributes, fields)
+    try:
+        writer.add(columns)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+class SampleWriter(object):
+    '''Writes a sample file a block of whole flowpaths at a time (the Sampler's streaming mode), holding only
+    the block being added. Each block is sorted and its columns appended to a part file per column, close
+    writes the header and copies the parts in behind it. Blocks must come in ascending flowpath id order
+    (sampler_functions.flowpathBlocks) and a flowpath must not be split between blocks.'''
+
+    def __init__(self, path, huc12, attributes = None, fields = None):
+        self.path = path
+        self.huc12 = huc12
+        self.attributes = attributes or {}
+        self.fields = fields
+        self.npoints = 0
+        self.nflowpaths = 0
+        self._lastId = None
+        folder = os.path.dirname(path)
+        if folder != '' and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self._names = ['fp_ids', 'fp_offsets'] + COLUMNS
+        self._dtypes = dict([('fp_ids', '<i8'), ('fp_offsets', '<i8')] + [(s[0], s[1]) for s in SCHEMA])
+        self._counts = {name: 0 for name in self._names}
+        self._parts = {name: open(self._partPath(name), 'wb') for name in self._names}
+        # text columns get one dictionary over all the blocks, in the order values are first seen
+        self._categories = {s[0]: categorical.Categorical([], []) for s in SCHEMA if s[2] == 'categorical'}
+        self._append('fp_offsets', np.zeros(1, dtype = '<i8'))
+
+    def _partPath(self, name):
+        return self.path + '.' + name + '.part'
+
+    def _append(self, name, data):
+        data = np.ascontiguousarray(data, dtype = self._dtypes[name])
+        self._parts[name].write(data.tobytes())
+        self._counts[name] += data.size
+
+    def add(self, columns):
+        '''Append a block of samples, columns as for writeSampleFile. Returns the points and flowpaths added.'''
+        missing = [c for c in COLUMNS if c not in columns]
+        if len(missing) > 0:
+            raise ValueError('sample columns missing: ' + ', '.join(missing))
+
+        fp = typedColumn(columns['fp'], '<i4', 0)
+        fpLen = typedColumn(columns['fpLen'], '<f8', None)
+        if fpLen.size != fp.size:
+            raise ValueError('sample columns have different lengths')
+        index = sf.FlowpathIndex(fp, fpLen)
+        if len(index) > 0 and self._lastId is not None and index.ids[0] <= self._lastId:
+            raise ValueError('flowpath ' + str(index.ids[0]) + ' is not after the last block (' + str(self._lastId) + ')')
+
+        blocks = []
+        for name, dtype, kind, nodata in SCHEMA:
+            if kind == 'categorical':
+                column = categorical.encode(columns[name])
+                merged = self._categories[name]
+                mapping = np.array([merged.addCategory(v) for v in column.categories.tolist()] + [categorical.MISSING],
+                                   dtype = np.int32)
+                # code -1 picks the trailing MISSING entry
+                data = mapping[column.codes]
+            else:
+                data = typedColumn(columns[name], dtype, nodata)
+            if data.size != fp.size:
+                raise ValueError('sample column ' + name + ' has ' + str(data.size) + ' values, not ' + str(fp.size))
+            blocks.append((name, data[index.order]))
+
+        self._append('fp_ids', index.ids)
+        self._append('fp_offsets', self.npoints + index.offsets[1:])
+        for name, data in blocks:
+            self._append(name, data)
+        if len(index) > 0:
+            self._lastId = int(index.ids[-1])
+        self.npoints += int(index.npoints)
+        self.nflowpaths += len(index)
+        return int(index.npoints), len(index)
+
+    def _closeParts(self):
+        for f in self._parts.values():
+            f.close()
+
+    def abort(self):
+        '''Drop the part files without writing the sample file'''
+        self._closeParts()
+        for name in self._names:
+            if os.path.exists(self._partPath(name)):
+                os.remove(self._partPath(name))
+
+    def close(self):
+        '''Write the sample file from the blocks added. Returns the number of points and flowpaths written.'''
+        self._closeParts()
+        schema = []
+        for name, dtype, kind, nodata in SCHEMA:
+            entry = {'name': name, 'dtype': dtype, 'kind': kind, 'nodata': nodata}
+            if kind == 'categorical':
+                entry['categories'] = self._categories[name].categories.tolist()
+            if self.fields is not None and name in self.fields:
+                entry['field'] = self.fields[name]
+            schema.append(entry)
+
+        header = {'version': FORMAT_VERSION, 'huc12': self.huc12, 'npoints': self.npoints, 'nflowpaths': self.nflowpaths,
+                  'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'attributes': self.attributes,
+                  'columns': schema, 'blocks': {}}
+
+        # block offsets depend on the header length, so lay the blocks out after a first guess at the header
+        # and redo it until the header fits in front of them
+        start = ALIGN
+        while True:
+            offset = start
+            for name in self._names:
+                dtype = np.dtype(self._dtypes[name])
+                header['blocks'][name] = {'offset': offset, 'dtype': dtype.str, 'count': self._counts[name]}
+                offset = aligned(offset + self._counts[name] * dtype.itemsize)
+            text = json.dumps(header).encode('utf-8')
+            if len(MAGIC) + 8 + len(text) <= start:
+                break
+            start = aligned(len(MAGIC) + 8 + len(text))
+
+        # write then rename so a reader never maps a half written file
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.array([len(text)], dtype = '<u8').tobytes())
+            f.write(text)
+            for name in self._names:
+                f.write(b'\0' * (header['blocks'][name]['offset'] - f.tell()))
+                with open(self._partPath(name), 'rb') as part:
+                    shutil.copyfileobj(part, f, COPY_BYTES)
+        os.replace(tmp, self.path)
+        self.abort()
+        return self.npoints, self.nflowpaths
+
+
+def readHeader(path):
+    '''Header dictionary of a sample file'''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + ' is not a sample file')
+        size = int(np.frombuffer(f.read(8), dtype = '<u8')[0])
+        header = json.loads(f.read(size).decode('utf-8'))
+    if header['version'] > FORMAT_VERSION:
+        raise ValueError(path + ' is sample file version ' + str(header['version']) + ', newer than ' + str(FORMAT_VERSION))
+    return header
+
+
+class SampleFile(object):
+    '''Read-only, memory-mapped view of a sample file. Columns and flowpath slices are views of the mapping.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.header = readHeader(path)
+        self.schema = {c['name']: c for c in self.header['columns']}
+        self._map = np.memmap(path, dtype = np.uint8, mode = 'r')
+        self.ids = self._block('fp_ids')
+        self.offsets = self._block('fp_offsets')
+
+    def __len__(self):
+        return self.ids.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # views handed out keep the mapping open until they are gone
+        self._map = None
+
+    def _block(self, name):
+        block = self.header['blocks'][name]
+        return np.frombuffer(self._map, dtype = block['dtype'], count = block['count'], offset = block['offset'])
+
+    @property
+    def npoints(self):
+        return self.header['npoints']
+
+    @property
+    def huc12(self):
+        return self.header['huc12']
+
+    @property
+    def columns(self):
+        return [c['name'] for c in self.header['columns']]
+
+    def column(self, name):
+        '''Column values in flowpath order, codes for a text column'''
+        if name not in self.schema:
+            raise KeyError(name)
+        return self._block(name)
+
+    def categories(self, name):
+        '''Distinct values of a text column'''
+        return np.array(self.schema[name]['categories'], dtype = object)
+
+    def categoricalColumn(self, name, rows = slice(None)):
+        '''A text column (or rows of it) as a categorical.Categorical'''
+        return categorical.Categorical(self.column(name)[rows], self.categories(name))
+
+    def nulls(self, name):
+        '''True where a column is null'''
+        values = self.column(name)
+        entry = self.schema[name]
+        if entry['nodata'] is None:
+            return np.isnan(values)
+        return values == entry['nodata']
+
+    def position(self, fpId):
+        '''Position of a flowpath id in ids, -1 if there is no such flowpath'''
+        i = int(np.searchsorted(self.ids, fpId))
+        if i < self.ids.size and self.ids[i] == fpId:
+            return i
+        return -1
+
+    def rows(self, i):
+        '''Row slice of the i-th flowpath'''
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def flowpath(self, fpId, names = None):
+        '''Dictionary of column views for one flowpath's points from top to bottom, codes for text columns'''
+        i = self.position(fpId)
+        if i < 0:
+            raise KeyError('no flowpath ' + str(fpId))
+        rows = self.rows(i)
+        return {name: self.column(name)[rows] for name in (self.columns if names is None else names)}
+
+    def flowpaths(self, names = None):
+        '''Flowpath id and column views of every flowpath in id order'''
+        views = [(name, self.column(name)) for name in (self.columns if names is None else names)]
+        for i in range(len(self)):
+            rows = self.rows(i)
+            yield int(self.ids[i]), {name: v[rows] for name, v in views}
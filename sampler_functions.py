@@ -0,0 +1,264 @@
+## sampler_functions.py
+## Array versions of the per-point work in cmd_Sampler_DEP.pyt, kept free of arcpy so they can be run
+##  and benchmarked on grids already read into NumPy:
+##   sampleGrids    - Sample() of aligned rasters at every flowpath cell
+##   FlowpathIndex  - samples sorted once by (fp, fpLen) with an offsets array, in place of ORDER BY cursors
+##   flowpathBlocks - flowpath id ranges for the Sampler's bounded memory streaming mode
+##   zoneLookup     - the Intersect with field boundaries / STATSGO2 polygons, done with rasterized zones
+##   zoneCodes      - zoneLookup with the attribute values left dictionary encoded (categorical.py)
+##   solExists      - the SOL_Exists/STATSGO_Exists UpdateCursor, with one isfile check per soil key
+##   canopyManagement - the canopy cover forest management UpdateCursor
+##
+## Null values are NaN in float columns.
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - added FlowpathIndex, solExists evaluated per flowpath slice instead of point by point
+## 2026.10.19 - added flowpathBlocks
+## 2026.10.19 - added zoneCodes, canopyManagement works on dictionary encoded management columns
+## 2026.10.19 - FlowpathIndex sorts null lengths first in a flowpath, as the geodatabase ORDER BY did
+
+import os
+import numpy as np
+
+import categorical
+
+# canopy cover (percent) lower bounds for forest management letters A-J
+CANOPY_BREAKS = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90]
+CANOPY_LETTERS = 'ABCDEFGHIJ'
+ROTATION_LENGTH = 12
+
+
+def cellCenters(rows, cols, georef):
+    '''x, y of cell centers for row/column indexes on a grid with raster_store style georeferencing'''
+    cellsize = georef['cellsize']
+    x = georef['xmin'] + (np.asarray(cols) + 0.5) * cellsize
+    y = georef['ymin'] + (georef['nrows'] - np.asarray(rows) - 0.5) * cellsize
+    return x, y
+
+
+def sampleGrids(fp, grids, fpNodata = None):
+    '''Gather aligned grids at every flowpath cell (fp > 0), returns a dictionary of columns
+    with the row, col and fp of each sample plus one column per named grid'''
+    fp = np.asarray(fp)
+    use = fp > 0
+    if fpNodata is not None:
+        use &= fp != fpNodata
+    rows, cols = np.nonzero(use)
+    columns = {'row': rows, 'col': cols, 'fp': fp[rows, cols]}
+    for name, grid in grids.items():
+        columns[name] = np.asarray(grid)[rows, cols]
+    return columns
+
+
+def zoneLookup(zoneGrid, rows, cols, zoneValues = None, nodata = 0):
+    '''Zone of each sample from a rasterized polygon layer (e.g. field boundaries or STATSGO2 map units),
+    the array equivalent of intersecting the sample points with the polygons. With zoneValues, zone
+    numbers are translated to attribute values (e.g. FBndID), zones equal to nodata give None.'''
+    zones = np.asarray(zoneGrid)[rows, cols]
+    if zoneValues is None:
+        return zones
+    zoneValues = np.asarray(zoneValues, dtype = object)
+    out = np.full(zones.shape, None, dtype = object)
+    inside = (zones != nodata) & (zones >= 0) & (zones < zoneValues.size)
+    out[inside] = zoneValues[zones[inside]]
+    return out
+
+
+def zoneCodes(zoneGrid, rows, cols, zoneValues, nodata = 0):
+    '''zoneLookup as a categorical.Categorical of the zone attribute values (e.g. FBndID), the zone numbers
+    are already codes into zoneValues so no value is copied per sample'''
+    zones = np.asarray(zoneGrid)[rows, cols]
+    return categorical.fromLookup(np.where(zones != nodata, zones, -1), zoneValues)
+
+
+def solFileExists(soilsDir, prefix, keys):
+    '''Whether soilsDir/<prefix>_<key>.sol exists for each key, checking each distinct key once'''
+    keys = np.asarray(keys, dtype = np.float64)
+    exists = np.zeros(keys.shape, dtype = bool)
+    valid = ~np.isnan(keys)
+    if valid.any():
+        uniq, inverse = np.unique(keys[valid], return_inverse = True)
+        found = np.array([os.path.isfile(os.path.join(soilsDir, prefix + '_' + str(int(k)) + '.sol')) for k in uniq], dtype = bool)
+        exists[valid] = found[inverse]
+    return exists
+
+
+class FlowpathIndex(object):
+    '''Sample points sorted once by (fp, fpLen), the points of the i-th flowpath are the contiguous
+    slice offsets[i]:offsets[i + 1] of the sorted order. Null (NaN) lengths sort first in their flowpath,
+    as in the file geodatabase's ORDER BY fp, fpLen.'''
+
+    def __init__(self, fp, fpLen):
+        fp = np.asarray(fp)
+        fpLen = np.asarray(fpLen, dtype = np.float64)
+        self.order = np.lexsort((fpLen, ~np.isnan(fpLen), fp))
+        fpSorted = fp[self.order]
+        n = fpSorted.size
+        starts = np.flatnonzero(np.r_[n > 0, fpSorted[1:] != fpSorted[:-1]])
+        # flowpath ids in ascending order, and where each one's points start in the sorted order
+        self.ids = fpSorted[starts]
+        self.offsets = np.r_[starts, n].astype(np.int64)
+        self.fpLen = fpLen[self.order]
+
+    def __len__(self):
+        return self.ids.size
+
+    @property
+    def npoints(self):
+        return self.order.size
+
+    def counts(self):
+        '''Number of points on each flowpath'''
+        return np.diff(self.offsets)
+
+    def position(self, fpId):
+        '''Position of a flowpath id in ids, -1 if there is no such flowpath'''
+        i = int(np.searchsorted(self.ids, fpId))
+        if i < self.ids.size and self.ids[i] == fpId:
+            return i
+        return -1
+
+    def points(self, fpId):
+        '''Input indexes of a flowpath's points from top to bottom'''
+        i = self.position(fpId)
+        if i < 0:
+            return self.order[0:0]
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def first(self):
+        '''Input index of the first (top) point of every flowpath'''
+        return self.order[self.offsets[:-1]]
+
+    def last(self):
+        '''Input index of the last (bottom) point of every flowpath'''
+        return self.order[self.offsets[1:] - 1]
+
+    def sort(self, values):
+        '''Column in flowpath order'''
+        return np.asarray(values)[self.order]
+
+    def unsort(self, sortedValues):
+        '''Column in flowpath order back to the input order'''
+        sortedValues = np.asarray(sortedValues)
+        out = np.empty(sortedValues.shape, dtype = sortedValues.dtype)
+        out[self.order] = sortedValues
+        return out
+
+    def starts(self):
+        '''Boolean in flowpath order, True at the first point of each flowpath'''
+        flags = np.zeros(self.npoints, dtype = bool)
+        flags[self.offsets[:-1]] = True
+        return flags
+
+    def flowpathOf(self):
+        '''Position (in ids) of the flowpath of each point, in flowpath order'''
+        return np.repeat(np.arange(self.ids.size), self.counts())
+
+    def cumsum(self, sortedValues):
+        '''Running sum within each flowpath of a column in flowpath order'''
+        total = np.cumsum(sortedValues)
+        if total.size == 0:
+            return total
+        before = np.r_[0, total[self.offsets[1:-1] - 1]]
+        return total - np.repeat(before, self.counts())
+
+    def countWhere(self, mask):
+        '''Number of points per flowpath where mask (input order) is True, e.g. bad samples'''
+        if self.npoints == 0:
+            return np.zeros(0, dtype = np.int64)
+        return np.add.reduceat(np.asarray(mask, dtype = np.int64)[self.order], self.offsets[:-1])
+
+    def monotonic(self, values = None, strict = True):
+        '''Whether a column (input order, fpLen by default) increases down each flowpath, strictly
+        by default so repeated flowpath lengths are caught. Null values fail the check.'''
+        v = self.fpLen if values is None else np.asarray(values, dtype = np.float64)[self.order]
+        if self.npoints == 0:
+            return np.zeros(0, dtype = bool)
+        step = np.diff(v)
+        bad = np.r_[False, (step <= 0) if strict else (step < 0)] | np.isnan(v)
+        # the step into the first point of a flowpath comes from the previous flowpath
+        bad[self.offsets[:-1]] = np.isnan(v[self.offsets[:-1]])
+        return np.add.reduceat(bad.astype(np.int64), self.offsets[:-1]) == 0
+
+    def fpIds(self, year, rep4):
+        '''fp_id_<huc12> of every point (input order), <year><4 digit fp><4 digit replicate>'''
+        labels = np.array([str(year) + "%04d" % f + rep4 for f in self.ids.tolist()], dtype = object)
+        return self.unsort(labels[self.flowpathOf()])
+
+
+def flowpathBlocks(ids, counts, maxPoints):
+    '''Split flowpaths into ranges of consecutive ids, (first id, last id) inclusive, holding at most maxPoints
+    cells each so that every flowpath is whole in one block. A flowpath longer than maxPoints is a block alone.'''
+    ids = np.asarray(ids)
+    counts = np.asarray(counts, dtype = np.int64)
+    order = np.argsort(ids, kind = 'stable')
+    ids = ids[order].tolist()
+    counts = counts[order].tolist()
+    blocks = []
+    first = None
+    points = 0
+    for i, c in zip(ids, counts):
+        if first is not None and points + c > maxPoints:
+            blocks.append((first, last))
+            first = None
+        if first is None:
+            first = i
+            points = 0
+        points += c
+        last = i
+    if first is not None:
+        blocks.append((first, last))
+    return blocks
+
+
+def solExists(fp, fpLen, ssurgo, statsgo, soilsDir, index = None):
+    '''SOL_Exists and STATSGO_Exists for samples, with the same result as the Sampler's UpdateCursor
+    walking them in (fp, fpLen) order: a flowpath is a dead end from the first point where there is no
+    soil file, either at the start of the flowpath or at a change of SSURGO map unit, or at a null SSURGO
+    value after its first valid one. Points before a flowpath's first valid SSURGO value have no soil.
+    Returns (sol_exists, statsgo_exists) in the input order.'''
+    if index is None:
+        index = FlowpathIndex(fp, fpLen)
+    ssurgo = np.asarray(ssurgo, dtype = np.float64)
+    ssurgoFound = solFileExists(soilsDir, 'DEP', ssurgo)
+    statsgoFound = solFileExists(soilsDir, 'STATSGO', statsgo)
+
+    ss = index.sort(ssurgo)
+    valid = ~np.isnan(ss)
+    found = index.sort(ssurgoFound | statsgoFound)
+
+    nValid = index.cumsum(valid)
+    leading = nValid == 0
+    firstValid = valid & (nValid == 1)
+
+    # SSURGO of the previous valid point on the flowpath, to find changes of map unit
+    n = ss.size
+    lastValid = np.maximum.accumulate(np.where(valid, np.arange(n), -1))
+    prevValid = np.r_[-1, lastValid[:-1]]
+    prevSs = np.where(prevValid >= 0, ss[np.maximum(prevValid, 0)], np.nan)
+    change = valid & ~firstValid & (ss != prevSs)
+
+    deadEnd = (~valid & ~leading) | ((firstValid | change) & ~found)
+    alive = index.cumsum(deadEnd) == 0
+    sol = (valid & ~leading & alive).astype(np.int16)
+
+    return index.unsort(sol), index.unsort(valid & index.sort(statsgoFound))
+
+
+def canopyManagement(canopy, management):
+    '''Forest management strings from LANDFIRE canopy cover, A (0-9%) through J (90%+), as the
+    Sampler's canopy UpdateCursor. Samples with a negative or null canopy keep their management.
+    A categorical.Categorical management column gives a Categorical back.'''
+    canopy = np.asarray(canopy, dtype = np.float64)
+    has = ~np.isnan(canopy) & (canopy >= 0)
+    letter = np.digitize(canopy[has], CANOPY_BREAKS) - 1
+    if isinstance(management, categorical.Categorical):
+        # a bulk assignment of codes, the dictionary gets the ten forest managements
+        out = management.copy()
+        letterCodes = np.array([out.addCategory(c * ROTATION_LENGTH) for c in CANOPY_LETTERS], dtype = np.int32)
+        out.codes[has] = letterCodes[letter]
+        return out
+    out = np.array(management, dtype = object)
+    letters = np.array([c * ROTATION_LENGTH for c in CANOPY_LETTERS], dtype = object)
+    out[has] = letters[letter]
+    return out
@@ -0,0 +1,212 @@
+## stage_graph.py
+## Run the steps of one HUC12's processing (e.g. the Fill, FlowD8, PeukerDouglas... chain of cmd_channel_DEP.py)
+##  as a graph of stages instead of a fixed sequence, so steps that do not depend on each other overlap.
+##
+## Each stage declares the names of the inputs it reads and the outputs it writes (file names, store grids,
+##  results), a stage waits for the stages that write its inputs. Stages run with a bound on how many run at
+##  once and a shared core budget: a stage holds its cores (e.g. its mpiexec -n) while it runs and only
+##  starts when they are free, so two TauDEM steps side by side split the cores one would have used alone.
+##
+## arcpy is not thread safe, stages with mainThread (anything calling arcpy) run one at a time on the calling
+##  thread, with the arcpy environment it set up. Other stages (TauDEM mpiexec calls, NumPy work) run on
+##  worker threads alongside them. When a stage fails no new stage starts, the running ones are finished and
+##  the first error is raised again.
+##
+## huc_batch.py does the same across HUC12s with whole tool processes, this is within a single run.
+##
+## 2026.10.19 - original coding
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# stage states
+WAITING = 'waiting'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Stage(object):
+    '''A step of a run, func(cores) does the work and its return value is kept as the stage's result'''
+
+    def __init__(self, name, func, inputs = None, outputs = None, cores = 1, mainThread = False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs) if inputs is not None else []
+        self.outputs = list(outputs) if outputs is not None else []
+        self.cores = cores
+        self.mainThread = mainThread
+        self.state = WAITING
+        self.after = []
+        self.seconds = 0.0
+        self.result = None
+
+    def __repr__(self):
+        return 'Stage(' + self.name + ', ' + self.state + ')'
+
+
+def linkStages(stages, available = None):
+    '''Set each stage's after to the stages writing its inputs, inputs in available are already there.
+    Raises ValueError for an input nobody writes, an output written twice or a cycle.'''
+    available = set(available or [])
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError('stage names are not unique: ' + str(names))
+    writer = {}
+    for s in stages:
+        for o in s.outputs:
+            if o in writer or o in available:
+                raise ValueError(o + ' is written by ' + s.name + ' and ' + writer.get(o, 'the inputs'))
+            writer[o] = s.name
+    for s in stages:
+        missing = [i for i in s.inputs if i not in writer and i not in available]
+        if len(missing) > 0:
+            raise ValueError(s.name + ' reads ' + str(missing) + ' that no stage writes')
+        s.after = sorted(set(writer[i] for i in s.inputs if i in writer))
+
+    # Kahn's algorithm, anything left over is on a cycle
+    byName = {s.name: s for s in stages}
+    waiting = {s.name: len(s.after) for s in stages}
+    ready = [n for n in names if waiting[n] == 0]
+    order = []
+    while len(ready) > 0:
+        n = ready.pop(0)
+        order.append(n)
+        for s in stages:
+            if n in s.after:
+                waiting[s.name] -= 1
+                if waiting[s.name] == 0:
+                    ready.append(s.name)
+    if len(order) != len(stages):
+        raise ValueError('stages depend on each other in a cycle: ' + str([n for n in names if n not in order]))
+    return [byName[n] for n in order]
+
+
+def runStages(stages, maxConcurrent = 2, coreBudget = 1, available = None, log = None):
+    '''Run the stages in dependency order, at most maxConcurrent at a time and holding at most coreBudget
+    cores between them (a stage asking for more gets the whole budget). With more than one at a time, worker
+    thread stages that are ready start ahead of main thread ones, ties start in the order given. With
+    maxConcurrent 1 the first ready stage in the order given runs next, so the stages run in that order
+    whenever it is a valid one. Returns {stage name: result}.'''
+    if log is None:
+        log = logging.getLogger('stage_graph')
+    linkStages(stages, available)
+    maxConcurrent = max(1, int(maxConcurrent))
+    coreBudget = max(1, int(coreBudget))
+    byName = {s.name: s for s in stages}
+
+    futures = {}
+    used = [0]
+    errors = []
+    startTime = time.time()
+
+    def ready(s):
+        return s.state == WAITING and all(byName[a].state == DONE for a in s.after)
+
+    def cores(s):
+        return min(max(1, s.cores), coreBudget)
+
+    def fits(s, running):
+        return running < maxConcurrent and used[0] + cores(s) <= coreBudget
+
+    def timedRun(s, n):
+        t0 = time.time()
+        try:
+            return s.func(n), time.time() - t0
+        except Exception as e:
+            # keep the time it ran for the log, the error is raised again after the run
+            e.seconds = time.time() - t0
+            raise
+
+    def skipDownstream(failed):
+        for s in stages:
+            if s.state == WAITING and failed in s.after:
+                s.state = SKIPPED
+                log.warning('skipping ' + s.name + ', depends on ' + failed)
+                skipDownstream(s.name)
+
+    def finish(s, n, fut):
+        used[0] -= n
+        try:
+            s.result, s.seconds = fut.result()
+            s.state = DONE
+            log.info(s.name + ' done in ' + '%.1f' % s.seconds + ' s on ' + str(n) + ' core(s)')
+        except Exception as e:
+            s.seconds = getattr(e, 'seconds', 0.0)
+            s.state = FAILED
+            errors.append(e)
+            log.warning(s.name + ' failed after ' + '%.1f' % s.seconds + ' s: ' + str(e))
+            skipDownstream(s.name)
+
+    def start(s):
+        n = cores(s)
+        s.state = RUNNING
+        used[0] += n
+        log.info('starting ' + s.name + ' on ' + str(n) + ' core(s)')
+        return n
+
+    with ThreadPoolExecutor(max_workers = maxConcurrent) as pool:
+        while True:
+            inline = None
+            if len(errors) == 0 and maxConcurrent == 1:
+                first = [s for s in stages if ready(s)][:1]
+                if len(futures) == 0 and len(first) > 0:
+                    if first[0].mainThread:
+                        inline = first[0]
+                    else:
+                        n = start(first[0])
+                        futures[pool.submit(timedRun, first[0], n)] = (first[0], n)
+            elif len(errors) == 0:
+                # worker thread stages first so they run while a main thread stage holds this thread
+                for s in stages:
+                    if not s.mainThread and ready(s) and fits(s, len(futures)):
+                        n = start(s)
+                        futures[pool.submit(timedRun, s, n)] = (s, n)
+                for s in stages:
+                    if s.mainThread and ready(s) and fits(s, len(futures)):
+                        inline = s
+                        break
+
+            if inline is not None:
+                n = start(inline)
+                try:
+                    done = timedRun(inline, n)
+                    finish(inline, n, _Finished(done))
+                except Exception as e:
+                    finish(inline, n, _Finished(error = e))
+                # reap whatever finished meanwhile before looking for more work
+                for fut in [f for f in futures if f.done()]:
+                    finish(*futures.pop(fut), fut)
+                continue
+
+            if len(futures) == 0:
+                break
+
+            done, notDone = wait(list(futures), return_when = FIRST_COMPLETED)
+            for fut in done:
+                finish(*futures.pop(fut), fut)
+
+    elapsed = time.time() - startTime
+    busy = sum(s.seconds for s in stages)
+    log.info('stages finished in ' + '%.1f' % elapsed + ' s, ' + '%.1f' % busy + ' s of stage time')
+    if len(errors) > 0:
+        raise errors[0]
+    left = [s.name for s in stages if s.state == WAITING]
+    if len(left) > 0:
+        raise RuntimeError('stages never became ready: ' + str(left))
+    return {s.name: s.result for s in stages}
+
+
+class _Finished(object):
+    '''The outcome of a main thread stage in the shape of a finished future'''
+
+    def __init__(self, value = None, error = None):
+        self.value = value
+        self.error = error
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
@@ -0,0 +1,166 @@
+## status_journal.py
+## An append-only journal of per-HUC12 results (e.g. ChannelThreshold from cmd_channel_DEP.py) that are
+##  headed for the shared MW_HUC12_*_Status table.
+##
+## Rather than each run opening an UpdateCursor on the status table with a HUC12 where clause (which
+##  serializes concurrent jobs on the geodatabase lock and scans the table once per HUC12), each run
+##  appends a JSON line to a small local file named for its HUC12. mergeJournal later applies all pending
+##  results to the status table in a single keyed UpdateCursor pass.
+##
+## Usage to merge pending results:
+##   python status_journal.py <journal directory> <status table>
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - claimed files get unique names and leftovers of an interrupted merge are claimed first,
+##               a pending file no longer overwrites a leftover with the same HUC12
+
+import os
+import sys
+import json
+import time
+import platform
+
+# suffix of journal files still waiting to be merged, and of files claimed by a merge in progress
+PENDING = '.jsonl'
+MERGING = '.merging'
+MERGED_DIR = 'merged'
+
+
+def appendResult(journalDir, statTable, huc12, results):
+    '''Append a dictionary of {status field: value} for a HUC12 to the journal'''
+    if not os.path.isdir(journalDir):
+        os.makedirs(journalDir, exist_ok = True)
+
+    entry = {'HUC12': str(huc12), 'table': os.path.normpath(str(statTable)), 'results': results,
+             'node': platform.node(), 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+    # one line per write so a crash can leave at most one partial line, which readJournal skips
+    with open(os.path.join(journalDir, str(huc12) + PENDING), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return entry
+
+
+def readJournal(journalFile):
+    '''Read entries from a journal file, skipping any partially written line'''
+    entries = []
+    with open(journalFile) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def claimName(journalFile):
+    '''Unique name for a claimed journal file, <HUC12>.jsonl.<time>_<pid>_<n>.merging'''
+    claimName.count += 1
+    base = os.path.basename(journalFile)
+    huc12 = base[:base.index(PENDING)]
+    return os.path.join(os.path.dirname(journalFile), huc12 + PENDING + '.' + time.strftime('%Y%m%d%H%M%S') + '_' +
+                        str(os.getpid()) + '_' + str(claimName.count) + MERGING)
+
+claimName.count = 0
+
+
+def claimPending(journalDir):
+    '''Rename journal files to unique claimed names so new appends start a fresh file while this merge runs.
+    Files left claimed by an interrupted merge are claimed again first, their entries are older than the
+    pending ones. Files that cannot be renamed (e.g. open in another process on Windows, or just claimed by
+    another merge) are left for the next merge.'''
+    claimed = []
+    if not os.path.isdir(journalDir):
+        return claimed
+    names = sorted(os.listdir(journalDir))
+    leftover = [f for f in names if PENDING in f and f.endswith(MERGING)]
+    pending = [f for f in names if f.endswith(PENDING)]
+    for f in leftover + pending:
+        src = os.path.join(journalDir, f)
+        dst = claimName(src)
+        try:
+            os.replace(src, dst)
+        except OSError:
+            continue
+        if dst not in claimed:
+            claimed.append(dst)
+    return claimed
+
+
+def pendingResults(journalFiles, statTable):
+    '''Collapse journal entries for statTable to {HUC12: {field: value}}, later entries win'''
+    table = os.path.normpath(str(statTable))
+    pending = {}
+    for jf in journalFiles:
+        for entry in readJournal(jf):
+            if entry.get('table') != table:
+                continue
+            pending.setdefault(entry['HUC12'], {}).update(entry['results'])
+    return pending
+
+
+def mergeJournal(journalDir, statTable, log = None):
+    '''Apply all pending journal results for statTable in one keyed UpdateCursor pass.
+    Returns the number of status table rows updated.'''
+    import arcpy
+
+    claimed = claimPending(journalDir)
+    pending = pendingResults(claimed, statTable)
+
+    updated = 0
+    if len(pending) > 0:
+        fields = sorted(set(f for r in pending.values() for f in r))
+        tableFields = [f.name for f in arcpy.ListFields(statTable)]
+        missing = [f for f in fields if f not in tableFields]
+        if len(missing) > 0:
+            raise ValueError('status table ' + str(statTable) + ' is missing fields: ' + str(missing))
+
+        found = set()
+        with arcpy.da.UpdateCursor(statTable, ['HUC12'] + fields) as ucur:
+            for urow in ucur:
+                results = pending.get(urow[0])
+                if results is None:
+                    continue
+                for i, f in enumerate(fields):
+                    if f in results:
+                        urow[i + 1] = results[f]
+                ucur.updateRow(urow)
+                found.add(urow[0])
+                updated += 1
+
+        notFound = sorted(set(pending) - found)
+        if len(notFound) > 0 and log is not None:
+            log.warning('HUC12s in journal but not in status table: ' + str(notFound))
+
+    # entries for other status tables go back to pending, merged ones are kept for tracking
+    mergedDir = os.path.join(journalDir, MERGED_DIR)
+    if not os.path.isdir(mergedDir):
+        os.makedirs(mergedDir)
+    table = os.path.normpath(str(statTable))
+    stamp = time.strftime('%Y%m%d%H%M%S')
+    for jf in claimed:
+        entries = readJournal(jf)
+        others = [e for e in entries if e.get('table') != table]
+        mine = [e for e in entries if e.get('table') == table]
+        huc12 = os.path.basename(jf)[:os.path.basename(jf).index(PENDING)]
+        if len(others) > 0:
+            with open(os.path.join(journalDir, huc12 + PENDING), 'a') as f:
+                for e in others:
+                    f.write(json.dumps(e) + '\n')
+        if len(mine) > 0:
+            with open(os.path.join(mergedDir, huc12 + '_' + stamp + PENDING), 'a') as f:
+                for e in mine:
+                    f.write(json.dumps(e) + '\n')
+        os.remove(jf)
+
+    if log is not None:
+        log.info('merged ' + str(len(pending)) + ' HUC12 results into ' + str(statTable) + ', ' + str(updated) + ' rows updated')
+
+    return updated
+
+
+if __name__ == "__main__":
+    journalDir, statTable = sys.argv[1:3]
+    updated = mergeJournal(journalDir, statTable)
+    print('updated ' + str(updated) + ' rows in ' + statTable)
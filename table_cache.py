@@ -0,0 +1,356 @@
+## table_cache.py
+## A columnar cache of the per-HUC12 ACPF tables that get joined on FBndID over and over
+##  (FB field boundaries, LU6 land use, RC_GEE_<year> residue cover).
+##
+## Each cached table is a directory of one .npy file per column, opened memory-mapped, plus a null mask
+##  per column that has nulls, a prebuilt sort order of the key column and a meta.json with the source
+##  path and its modification stamp. A join is then a searchsorted lookup of the target keys followed by an
+##  index gather of the columns, rather than reopening the geodatabase and building a dictionary in joinDict.
+##
+## The stamp of a file geodatabase table is the newest modification time of any file in its .gdb (arcpy
+##  does not give a per-table time), so writing anything to the geodatabase invalidates its cached tables.
+##  Within one process a table is only checked against its source the first time it is used, a long-lived
+##  process (huc_worker.py) calls resetChecked between jobs so each job checks them again.
+##
+## Text columns are dictionary encoded (categorical.py): <field>.npy holds int32 codes (-1 for null) into the
+##  distinct values in <field>.categories.npy. joinCodes hands them back still encoded, column and gather
+##  decode them.
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - text columns are stored dictionary encoded, added joinCodes
+## 2026.10.19 - added resetChecked, a table checked earlier in the process still needs the fields asked for
+## 2026.10.19 - keys are looked up in the stored key's dtype (number keys were compared as text and failed),
+##               null keys never match
+
+import os
+import json
+import shutil
+import numpy as np
+
+import categorical
+
+CACHE_VERSION = 3
+KEY = 'FBndID'
+
+# cached tables already checked against their source in this process
+_checked = {}
+
+
+def resetChecked():
+    '''Forget which tables were checked, the next use of each compares it with its source again'''
+    _checked.clear()
+
+
+def defaultCacheDir(table):
+    '''table_cache directory beside the geodatabase (or folder) holding a source table'''
+    container = sourceContainer(table)
+    return os.path.join(os.path.dirname(container), 'table_cache')
+
+
+def sourceContainer(table):
+    '''The .gdb a geodatabase table is in, or the table file itself'''
+    path = os.path.normpath(str(table))
+    p = path
+    while True:
+        if p.lower().endswith('.gdb'):
+            return p
+        parent = os.path.dirname(p)
+        if parent == p:
+            return path
+        p = parent
+
+
+def sourceStamp(table):
+    '''Modification stamp of a source table (newest file in its geodatabase)'''
+    container = sourceContainer(table)
+    if os.path.isdir(container):
+        stamps = [os.path.getmtime(os.path.join(container, f)) for f in os.listdir(container)]
+        return max(stamps) if len(stamps) > 0 else os.path.getmtime(container)
+    return os.path.getmtime(container)
+
+
+def toColumns(values):
+    '''Column array and null mask (None if no nulls) from a list of values read from a cursor'''
+    nulls = np.array([v is None for v in values], dtype = bool)
+    present = [v for v in values if v is not None]
+    if len(present) > 0 and all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+        col = np.array([0 if v is None else v for v in values], dtype = np.int64)
+    elif len(present) > 0 and all(isinstance(v, (int, float, np.number)) for v in present):
+        col = np.array([np.nan if v is None else v for v in values], dtype = np.float64)
+    else:
+        col = np.array(['' if v is None else str(v) for v in values], dtype = str)
+        if col.dtype.itemsize == 0:
+            col = col.astype('U1')
+    return col, (nulls if nulls.any() else None)
+
+
+class CachedTable(object):
+    '''Memory-mapped columns of one cached table'''
+
+    def __init__(self, tableDir):
+        self.tableDir = tableDir
+        with open(os.path.join(tableDir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.key = self.meta['key']
+        self.nrows = self.meta['nrows']
+        self.fields = self.meta['fields']
+        self.categorical = set(self.meta.get('categorical', []))
+        self._cols = {}
+        self._categories = {}
+        if self.key is not None:
+            self._order = np.load(os.path.join(tableDir, self.key + '.order.npy'), mmap_mode = 'r')
+            self._sorted = np.load(os.path.join(tableDir, self.key + '.sorted.npy'), mmap_mode = 'r')
+
+    def codes(self, field):
+        '''Zero-copy view of a column as stored, the codes of a text column'''
+        if field not in self._cols:
+            self._cols[field] = np.load(os.path.join(self.tableDir, field + '.npy'), mmap_mode = 'r')
+        return self._cols[field]
+
+    def categories(self, field):
+        '''Distinct values of a text column'''
+        if field not in self._categories:
+            self._categories[field] = np.load(os.path.join(self.tableDir, field + '.categories.npy'))
+        return self._categories[field]
+
+    def column(self, field):
+        '''A column, text columns decoded to a str array with '' for nulls (zero-copy view for numbers)'''
+        if field in self.categorical:
+            return np.append(self.categories(field), '')[self.codes(field)]
+        return self.codes(field)
+
+    def textLength(self, field):
+        '''Longest value of a text column'''
+        return max([1] + [len(c) for c in self.categories(field).tolist()])
+
+    def nulls(self, field):
+        '''Boolean null mask of a column'''
+        if field in self.categorical:
+            return np.asarray(self.codes(field)) < 0
+        if field in self.meta['nullable']:
+            return np.load(os.path.join(self.tableDir, field + '.null.npy'), mmap_mode = 'r')
+        return np.zeros(self.nrows, dtype = bool)
+
+    def _keyArray(self, keys):
+        '''Keys (a list or array, numbers or text, None or '' for null) in the dtype of the stored key
+        column, and True where a key can match (not null, and a number for a number key)'''
+        keys = np.asarray(keys)
+        valid = np.ones(keys.shape, dtype = bool)
+        if keys.dtype == object:
+            valid = np.array([k is not None for k in keys.ravel().tolist()], dtype = bool).reshape(keys.shape)
+            keys = np.where(valid, keys, '')
+        if self._sorted.dtype.kind == 'U':
+            keys = keys.astype(str)
+            return keys, valid & (keys != '')
+        if keys.dtype.kind in 'OUS':
+            text = keys.astype(str)
+            valid &= text != ''
+            numbers = np.full(keys.shape, np.nan)
+            for i in np.flatnonzero(valid.ravel()).tolist():
+                try:
+                    numbers.flat[i] = float(text.flat[i])
+                except ValueError:
+                    pass
+            keys = numbers
+        keys = np.asarray(keys, dtype = np.float64)
+        valid &= np.isfinite(keys)
+        if self._sorted.dtype.kind in 'iu':
+            valid &= keys == np.floor(keys)
+        keys = np.where(valid, keys, 0).astype(self._sorted.dtype)
+        return keys, valid
+
+    def rows(self, keys):
+        '''Row index of each key, -1 where the key is not in the table or is null. Keys are compared
+        in the stored key's dtype, numbers as numbers and text as text. Rows with a null key are never
+        found. Duplicated keys resolve to the last row, as a dictionary built from the table would.'''
+        keys, valid = self._keyArray(keys)
+        nkeys = self._sorted.size
+        if nkeys == 0 or keys.size == 0:
+            return np.full(keys.shape, -1, dtype = np.int64)
+        pos = np.searchsorted(self._sorted, keys, side = 'right') - 1
+        posSafe = np.clip(pos, 0, nkeys - 1)
+        found = valid & (pos >= 0) & (self._sorted[posSafe] == keys)
+        return np.where(found, np.asarray(self._order)[posSafe], -1)
+
+    def gather(self, rows, field):
+        '''Values of a column for row indexes from rows(), missing rows and nulls are
+        None for text columns and NaN for numbers'''
+        rows = np.asarray(rows)
+        if field in self.categorical:
+            return self.categoricalColumn(field, rows).decode()
+        col = self.column(field)
+        use = rows >= 0
+        missing = ~use
+        missing[use] = self.nulls(field)[rows[use]]
+        if col.dtype.kind == 'U':
+            out = np.full(rows.shape, None, dtype = object)
+            take = ~missing
+            out[take] = col[rows[take]]
+        else:
+            out = np.full(rows.shape, np.nan)
+            take = ~missing
+            out[take] = col[rows[take]]
+        return out
+
+    def categoricalColumn(self, field, rows = None):
+        '''categorical.Categorical of a text column, or of the row indexes from rows() (-1 for missing rows)'''
+        codes = self.codes(field)
+        if rows is None:
+            return categorical.Categorical(np.array(codes), self.categories(field))
+        rows = np.asarray(rows)
+        out = np.full(rows.shape, categorical.MISSING, dtype = np.int32)
+        use = rows >= 0
+        out[use] = codes[rows[use]]
+        return categorical.Categorical(out, self.categories(field))
+
+    def join(self, keys, fields):
+        '''Dictionary of gathered columns for a set of target keys'''
+        rows = self.rows(keys)
+        return {f: self.gather(rows, f) for f in fields}
+
+    def joinCodes(self, keys, fields):
+        '''join with text columns left encoded as categorical.Categorical. Keys may be a Categorical
+        (e.g. the FBndID of every sample), then each distinct key is only looked up once.'''
+        if isinstance(keys, categorical.Categorical):
+            keyRows = np.append(self.rows(keys.categories), -1)
+            rows = keyRows[keys.codes]
+        else:
+            rows = self.rows(keys)
+        return {f: self.categoricalColumn(f, rows) if f in self.categorical else self.gather(rows, f) for f in fields}
+
+
+class TableCache(object):
+    '''Per-HUC12 directories of cached tables'''
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+
+    def _tableDir(self, huc12, name):
+        return os.path.join(self.cacheDir, str(huc12), name)
+
+    def isCurrent(self, huc12, name, stamp):
+        metaFile = os.path.join(self._tableDir(huc12, name), 'meta.json')
+        if not os.path.isfile(metaFile):
+            return False
+        with open(metaFile) as f:
+            meta = json.load(f)
+        return meta.get('version') == CACHE_VERSION and meta.get('stamp') == stamp
+
+    def fromColumns(self, huc12, name, columns, key = KEY, source = None, stamp = None):
+        '''Write a table to the cache from a dictionary of {field: list of values}'''
+        tableDir = self._tableDir(huc12, name)
+        tmpDir = tableDir + '.tmp'
+        if os.path.isdir(tmpDir):
+            shutil.rmtree(tmpDir)
+        os.makedirs(tmpDir)
+
+        nrows = None
+        nullable = []
+        encoded = []
+        for field, values in columns.items():
+            values = list(values)
+            col, nulls = toColumns(values)
+            if nrows is None:
+                nrows = col.size
+            elif col.size != nrows:
+                raise ValueError('column ' + field + ' has ' + str(col.size) + ' rows, expected ' + str(nrows))
+            if col.dtype.kind == 'U':
+                cat = categorical.encode([None if v is None else str(v) for v in values])
+                np.save(os.path.join(tmpDir, field + '.npy'), cat.codes)
+                cats = np.array(cat.categories.tolist(), dtype = str)
+                if cats.dtype.itemsize == 0:
+                    cats = cats.astype('U1')
+                np.save(os.path.join(tmpDir, field + '.categories.npy'), cats)
+                encoded.append(field)
+            else:
+                np.save(os.path.join(tmpDir, field + '.npy'), col)
+                if nulls is not None:
+                    np.save(os.path.join(tmpDir, field + '.null.npy'), nulls)
+                    nullable.append(field)
+            if field == key:
+                # rows with a null key are left out of the sorted keys, they never match
+                keyed = np.flatnonzero(~nulls) if nulls is not None else np.arange(col.size)
+                order = keyed[np.argsort(col[keyed], kind = 'stable')]
+                np.save(os.path.join(tmpDir, field + '.order.npy'), order)
+                np.save(os.path.join(tmpDir, field + '.sorted.npy'), col[order])
+
+        meta = {'version': CACHE_VERSION, 'huc12': str(huc12), 'name': name, 'source': source, 'stamp': stamp,
+                'key': key if key in columns else None, 'nrows': nrows or 0, 'fields': list(columns), 'nullable': nullable,
+                'categorical': encoded}
+        with open(os.path.join(tmpDir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent = 1)
+
+        if os.path.isdir(tableDir):
+            shutil.rmtree(tableDir)
+        os.replace(tmpDir, tableDir)
+        _checked[tableDir] = stamp
+        return CachedTable(tableDir)
+
+    def table(self, huc12, name, source, fields = None, key = KEY):
+        '''Cached copy of a source table, (re)built from the source if it changed since it was cached'''
+        tableDir = self._tableDir(huc12, name)
+        if tableDir in _checked and os.path.isdir(tableDir):
+            cached = CachedTable(tableDir)
+            if fields is None or all(f in cached.fields for f in fields):
+                return cached
+
+        stamp = sourceStamp(source)
+        if self.isCurrent(huc12, name, stamp):
+            cached = CachedTable(tableDir)
+            if fields is None or all(f in cached.fields for f in fields):
+                _checked[tableDir] = stamp
+                return cached
+
+        import arcpy
+
+        if fields is None:
+            fields = [f.name for f in arcpy.ListFields(source) if f.type not in ['OID', 'Geometry', 'Blob', 'Raster']]
+        elif key not in fields:
+            fields = [key] + list(fields)
+        values = {f: [] for f in fields}
+        with arcpy.da.SearchCursor(source, fields) as scur:
+            for srow in scur:
+                for f, v in zip(fields, srow):
+                    values[f].append(v)
+        return self.fromColumns(huc12, name, values, key, os.path.normpath(str(source)), stamp)
+
+
+def joinCached(target, targetKey, cached, fields, newFields = None):
+    '''Join cached columns onto an arcpy table or feature class by key, like df.joinDict,
+    adding any fields that do not exist yet'''
+    import arcpy
+
+    if newFields is None:
+        newFields = fields
+    existing = [f.name for f in arcpy.ListFields(target)]
+    for f, nf in zip(fields, newFields):
+        if nf not in existing:
+            if f in cached.categorical:
+                arcpy.AddField_management(target, nf, 'TEXT', field_length = cached.textLength(f))
+            elif cached.codes(f).dtype.kind == 'i':
+                arcpy.AddField_management(target, nf, 'LONG')
+            else:
+                arcpy.AddField_management(target, nf, 'DOUBLE')
+
+    oids = []
+    keys = []
+    with arcpy.da.SearchCursor(target, ['OID@', targetKey]) as scur:
+        for srow in scur:
+            oids.append(srow[0])
+            keys.append('' if srow[1] is None else str(srow[1]))
+    joined = cached.join(keys, fields)
+
+    by_oid = {}
+    for i, oid in enumerate(oids):
+        vals = []
+        for f in fields:
+            v = joined[f][i]
+            if v is None or (isinstance(v, float) and v != v):
+                vals.append(None)
+            else:
+                vals.append(v.item() if hasattr(v, 'item') else v)
+        by_oid[oid] = vals
+
+    with arcpy.da.UpdateCursor(target, ['OID@'] + list(newFields)) as ucur:
+        for urow in ucur:
+            ucur.updateRow([urow[0]] + by_oid[urow[0]])
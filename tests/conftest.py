@@ -0,0 +1,7 @@
+## conftest.py
+## The modules under test are flat at the top of the repository, put it on the path for pytest.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import categorical
+
+VALUES = ['CBCB', None, 'BCBC', 'CBCB', 'GGGG', None, 'BCBC']
+
+
+def test_encode_sorted_dictionary():
+    c = categorical.encode(VALUES)
+    assert c.categories.tolist() == ['BCBC', 'CBCB', 'GGGG']
+    assert c.codes.tolist() == [1, -1, 0, 1, 2, -1, 0]
+    assert c.codes.dtype == np.int32
+    assert c.tolist() == VALUES
+    # a Categorical is handed back as it is
+    assert categorical.encode(c) is c
+
+    empty = categorical.encode([None, None])
+    assert empty.codes.tolist() == [-1, -1]
+    assert empty.tolist() == [None, None]
+
+
+def test_encode_with_dictionary():
+    c = categorical.encode(VALUES, ['GGGG', 'CBCB'])
+    # the given dictionary keeps its order, values it does not hold are added after it
+    assert c.categories.tolist() == ['GGGG', 'CBCB', 'BCBC']
+    assert c.tolist() == VALUES
+    assert c.code('GGGG') == 0 and c.code(None) == -1 and c.code('FFFF') is None
+
+
+def test_recode():
+    c = categorical.encode(VALUES)
+    r = c.recode(['GGGG', 'XXXX', 'CBCB', 'BCBC'])
+    assert r.categories.tolist() == ['GGGG', 'XXXX', 'CBCB', 'BCBC']
+    assert r.codes.tolist() == [2, -1, 3, 2, 0, -1, 3]
+    assert r.tolist() == VALUES
+    with pytest.raises(ValueError):
+        c.recode(['CBCB'])
+
+
+def test_concat():
+    a = categorical.encode(['CBCB', None, 'BCBC'])
+    b = categorical.encode(['GGGG', 'CBCB'])
+    c = categorical.concat([a, b])
+    assert c.categories.tolist() == ['BCBC', 'CBCB', 'GGGG']
+    assert c.tolist() == ['CBCB', None, 'BCBC', 'GGGG', 'CBCB']
+    assert len(categorical.concat([])) == 0
+
+
+def test_add_category_and_assign():
+    c = categorical.encode(VALUES)
+    assert c.addCategory('CBCB') == 1
+    assert c.addCategory('FFFF') == 3
+    assert c.addCategory('FFFF') == 3
+    assert c.categories.tolist() == ['BCBC', 'CBCB', 'GGGG', 'FFFF']
+    c.assign(c.equals(None), 'AAAA')
+    assert c.tolist() == ['CBCB', 'AAAA', 'BCBC', 'CBCB', 'GGGG', 'AAAA', 'BCBC']
+    # copies do not share the codes or the dictionary
+    d = c.copy()
+    d.assign(d.equals('CBCB'), 'JJJJ')
+    assert c.tolist()[0] == 'CBCB' and 'JJJJ' not in c.categories.tolist()
+
+
+def test_map_categories_with_nulls():
+    c = categorical.encode(VALUES)
+    calls = []
+
+    def length(v):
+        calls.append(v)
+        return v.count('C')
+
+    out = c.mapCategories(length, missing = -1, dtype = np.int64)
+    assert out.tolist() == [2, -1, 2, 2, 0, -1, 2]
+    # once per category, never for the nulls
+    assert calls == ['BCBC', 'CBCB', 'GGGG']
+    assert c.mapCategories(str.lower).tolist() == ['cbcb', None, 'bcbc', 'cbcb', 'gggg', None, 'bcbc']
+
+
+def test_pair_codes():
+    a = categorical.encode(['h1', 'h1', 'h2', None, 'h2', 'h1'])
+    b = categorical.encode(['x', None, 'y', 'x', 'y', 'x'])
+    pa, pb, inverse = categorical.pairCodes(a.codes, b.codes, b.categories.size)
+    pairs = list(zip(a.tolist(), b.tolist()))
+    # the distinct pairs, nulls included, and each row's pair
+    assert sorted(set(pairs), key = str) == sorted(set(zip(categorical.Categorical(pa, a.categories).tolist(),
+                                                           categorical.Categorical(pb, b.categories).tolist())), key = str)
+    assert len(pa) == len(set(pairs))
+    for row, pair in enumerate(pairs):
+        assert (a.categories[pa[inverse[row]]] if pa[inverse[row]] >= 0 else None,
+                b.categories[pb[inverse[row]]] if pb[inverse[row]] >= 0 else None) == pair
@@ -0,0 +1,100 @@
+import time
+import threading
+
+import pytest
+
+import huc_batch
+
+HUCS = ['070801050901', '070801050902']
+
+
+def config(channelName = 'channel'):
+    return {'python': 'python',
+            'tools': [{'name': channelName, 'resource': 'cpu', 'after': [],
+                       'args': ['C:\\DEP\\Scripts\\basics\\cmd_channel_DEP.py', 'ec3m{huc12}.tif', '{huc8}']},
+                      {'name': 'sampler', 'resource': 'io', 'after': [channelName],
+                       'args': ['C:/DEP/Scripts/basics/cmd_Sampler_DEP.pyt', '{huc12}']},
+                      {'name': 'tillage', 'resource': 'io', 'after': [],
+                       'args': ['C:/DEP/Scripts/basics/cmd_tillage_assign.pyt', '{huc12}']}],
+            'statusJournal': {'journalDir': 'journal', 'statusTable': 'status'}}
+
+
+class Runner(object):
+    '''Stand-in runner with a return code per task name (0 by default), records what ran at once'''
+
+    def __init__(self, codes = None, seconds = 0.02):
+        self.codes = codes or {}
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.calls = []
+        self.running = {}
+        self.maxRunning = {}
+
+    def __call__(self, task):
+        with self.lock:
+            self.calls.append(task.name)
+            self.running[task.resource] = self.running.get(task.resource, 0) + 1
+            self.maxRunning[task.resource] = max(self.maxRunning.get(task.resource, 0), self.running[task.resource])
+        time.sleep(self.seconds)
+        with self.lock:
+            self.running[task.resource] -= 1
+        code = self.codes.get(task.name, 0)
+        if isinstance(code, list):
+            code = code.pop(0)
+        return code, task.name + ' output'
+
+
+@pytest.mark.parametrize('channelName', ['channel', 'streams'])
+def test_merge_after_channel_tool(channelName):
+    tasks = huc_batch.buildTasks(config(channelName), HUCS)
+    merge = tasks['merge_status_journal']
+    # found by the script the tasks run, not by their name
+    assert sorted(merge.after) == [channelName + '_' + h for h in HUCS]
+    assert merge.afterFailures
+    assert tasks['sampler_070801050902'].after == [channelName + '_070801050902']
+    assert tasks[channelName + '_070801050901'].argv == ['python', 'C:\\DEP\\Scripts\\basics\\cmd_channel_DEP.py',
+                                                         'ec3m070801050901.tif', '07080105']
+
+
+def test_resource_limits():
+    tasks = {'c' + str(i): huc_batch.Task('c' + str(i), 'cpu', []) for i in range(4)}
+    tasks.update({'i' + str(i): huc_batch.Task('i' + str(i), 'io', []) for i in range(6)})
+    runner = Runner(seconds = 0.05)
+    summary = huc_batch.runBatch(tasks, {'cpu': 2, 'io': 3, 'gdb': 1}, runner = runner)
+    assert len(summary[huc_batch.DONE]) == 10
+    assert runner.maxRunning == {'cpu': 2, 'io': 3}
+
+    with pytest.raises(ValueError, match = 'unknown resource'):
+        huc_batch.runBatch({'x': huc_batch.Task('x', 'gpu', [])}, runner = runner)
+
+
+def test_retries():
+    tasks = {'flaky': huc_batch.Task('flaky', 'io', []), 'broken': huc_batch.Task('broken', 'io', [])}
+    runner = Runner({'flaky': [1, 0], 'broken': 2})
+    summary = huc_batch.runBatch(tasks, retries = 2, runner = runner)
+    assert summary[huc_batch.DONE] == ['flaky']
+    assert summary[huc_batch.FAILED] == ['broken']
+    assert tasks['flaky'].attempts == 2
+    assert tasks['broken'].attempts == 3
+
+    # a runner that raises is a failure that is retried, NoRetry is not
+    def raises(task):
+        if task.name == 'final':
+            raise huc_batch.NoRetry('still running')
+        raise OSError('no python')
+    tasks = {'again': huc_batch.Task('again', 'io', []), 'final': huc_batch.Task('final', 'io', [])}
+    summary = huc_batch.runBatch(tasks, retries = 1, runner = raises)
+    assert summary[huc_batch.FAILED] == ['again', 'final']
+    assert (tasks['again'].attempts, tasks['final'].attempts) == (2, 1)
+
+
+def test_skip_downstream():
+    tasks = huc_batch.buildTasks(config(), HUCS)
+    runner = Runner({'channel_070801050901': 1})
+    summary = huc_batch.runBatch(tasks, retries = 0, runner = runner)
+    assert summary[huc_batch.FAILED] == ['channel_070801050901']
+    # the sampler of the failed HUC12 is skipped, the merge still runs after the failure
+    assert summary[huc_batch.SKIPPED] == ['sampler_070801050901']
+    assert 'merge_status_journal' in summary[huc_batch.DONE]
+    assert runner.calls.index('merge_status_journal') > max(runner.calls.index('channel_' + h) for h in HUCS)
+    assert 'sampler_070801050901' not in runner.calls
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+import pytest
+
+import huc_batch
+import huc_worker
+import table_cache
+
+# stand-in tools, each is run as __main__ the way the real ones are
+TOOLS = {
+    'ok.py': "import sys\nprint('args ' + ' '.join(sys.argv[1:]))\n",
+    'exit3.py': "import sys\nsys.exit(3)\n",
+    'exitmsg.py': "import sys\nsys.exit('gave up on ' + sys.argv[1])\n",
+    'raises.py': "raise ValueError('bad input')\n",
+    'slow.py': "import sys, time\ntime.sleep(float(sys.argv[1]))\n",
+    # what the tools do to the process: own loggers and handlers, argv, path and working directory changes
+    'messy.py': "import os, sys, logging\n"
+                "log = logging.getLogger('messy_tool')\n"
+                "log.addHandler(logging.FileHandler(os.path.join(sys.argv[1], 'messy.log')))\n"
+                "logging.getLogger().addHandler(logging.StreamHandler())\n"
+                "log.warning('hello')\n"
+                "sys.argv.append('extra')\n"
+                "sys.path.append('nowhere')\n"
+                "os.chdir(sys.argv[1])\n",
+    'checked.py': "import table_cache\n"
+                  "print('checked ' + str(len(table_cache._checked)))\n"
+                  "table_cache._checked['somewhere'] = 1\n",
+}
+
+
+@pytest.fixture
+def tools(tmp_path):
+    d = tmp_path / 'tools'
+    d.mkdir()
+    for name, text in TOOLS.items():
+        (d / name).write_text(text)
+    return d
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return huc_worker.makeSpool(str(tmp_path / 'spool'))
+
+
+def runJobs(spool, jobs, backend = None):
+    backend = backend or huc_worker.StubBackend()
+    ids = [huc_worker.submitJob(spool, argv, '%03d' % i) for i, argv in enumerate(jobs)]
+    n = huc_worker.serve(spool, backend, poll = 0.01, maxJobs = len(jobs))
+    assert n == len(jobs)
+    return [huc_worker.jobResult(spool, jobId) for jobId in ids], backend
+
+
+def readLog(result):
+    with open(result['log']) as f:
+        return f.read()
+
+
+def test_exit_codes(spool, tools):
+    results, backend = runJobs(spool, [[str(tools / 'ok.py'), 'a', 'b'], [str(tools / 'exit3.py')],
+                                       [str(tools / 'exitmsg.py'), '070801050303'], [str(tools / 'raises.py')]])
+    assert [r['code'] for r in results] == [0, 3, 1, 1]
+    assert 'args a b' in readLog(results[0])
+    assert 'gave up on 070801050303' in readLog(results[2])
+    assert 'ValueError: bad input' in readLog(results[3])
+    assert os.listdir(os.path.join(spool, 'running')) == []
+    assert backend.calls[0] == ('initialize',)
+    assert backend.calls[-1] == ('shutdown',)
+
+
+def test_process_state_restored(spool, tools, tmp_path):
+    work = tmp_path / 'work'
+    work.mkdir()
+    argv = list(sys.argv)
+    path = list(sys.path)
+    cwd = os.getcwd()
+    rootHandlers = list(logging.getLogger().handlers)
+
+    results, backend = runJobs(spool, [[str(tools / 'messy.py'), str(work)]])
+
+    assert results[0]['code'] == 0
+    assert sys.argv == argv
+    assert sys.path == path
+    assert os.getcwd() == cwd
+    assert logging.getLogger().handlers == rootHandlers
+    assert logging.getLogger('messy_tool').handlers == []
+    assert 'hello' in (work / 'messy.log').read_text()
+
+
+def test_scratch_removed(spool, tools):
+    results, backend = runJobs(spool, [[str(tools / 'ok.py')], [str(tools / 'raises.py')]])
+    begins = [c[1] for c in backend.calls if c[0] == 'beginJob']
+    ends = [c[1] for c in backend.calls if c[0] == 'endJob']
+    assert begins == ends
+    assert [os.path.basename(b) for b in begins] == [r['id'] for r in results]
+    assert not any(os.path.exists(b) for b in begins)
+    assert os.listdir(os.path.join(spool, 'scratch')) == []
+
+
+def test_table_cache_checks_reset_between_jobs(spool, tools):
+    table_cache._checked['left over'] = 1
+    results, backend = runJobs(spool, [[str(tools / 'checked.py')], [str(tools / 'checked.py')]])
+    assert ['checked 0' in readLog(r) for r in results] == [True, True]
+
+
+def test_stale_running_job_requeued(spool, tools):
+    jobId = huc_worker.submitJob(spool, [str(tools / 'ok.py')], 'stale')
+    job = huc_worker.claimJob(spool)
+    assert job['id'] == jobId
+    # the worker that claimed it died an hour ago
+    running = os.path.join(spool, 'running', jobId + '.json')
+    old = time.time() - 3600
+    os.utime(running, (old, old))
+    fresh = huc_worker.submitJob(spool, [str(tools / 'ok.py')], 'fresh')
+    huc_worker.claimJob(spool)
+
+    assert huc_worker.requeueStale(spool, staleAfter = 60) == [jobId]
+    assert huc_worker.serve(spool, huc_worker.StubBackend(), poll = 0.01, maxJobs = 1, staleAfter = 60) == 1
+    assert huc_worker.jobResult(spool, jobId)['code'] == 0
+    assert os.listdir(os.path.join(spool, 'running')) == [fresh + '.json']
+
+
+def test_heartbeat_keeps_running_job_fresh(tmp_path):
+    path = tmp_path / 'job.json'
+    path.write_text('{}')
+    old = time.time() - 3600
+    os.utime(str(path), (old, old))
+    with huc_worker.heartbeat(str(path), interval = 0.01):
+        time.sleep(0.1)
+    assert time.time() - os.path.getmtime(str(path)) < 60
+
+
+def test_spool_runner(spool, tools):
+    worker = threading.Thread(target = huc_worker.serve, args = (spool, huc_worker.StubBackend()),
+                              kwargs = {'poll': 0.01, 'maxJobs': 1})
+    worker.start()
+    runner = huc_worker.spoolRunner(spool, poll = 0.01, timeout = 30)
+    code, output = runner(huc_batch.Task('channel', 'cpu', [sys.executable, str(tools / 'exit3.py')]))
+    worker.join()
+    assert code == 3
+
+
+def test_spool_runner_timeout_withdraws_job(spool, tools):
+    runner = huc_worker.spoolRunner(spool, poll = 0.01, timeout = 0.05)
+    with pytest.raises(RuntimeError, match = 'no worker started'):
+        runner(huc_batch.Task('channel', 'cpu', [sys.executable, str(tools / 'ok.py')]))
+    assert os.listdir(os.path.join(spool, 'incoming')) == []
+
+
+def test_spool_runner_timeout_cancels_running_job(spool, tools):
+    worker = threading.Thread(target = huc_worker.serve, args = (spool, huc_worker.StubBackend()),
+                              kwargs = {'poll': 0.01, 'maxJobs': 1})
+    worker.start()
+    runner = huc_worker.spoolRunner(spool, poll = 0.01, timeout = 0.3)
+    task = huc_batch.Task('channel', 'cpu', [sys.executable, str(tools / 'slow.py'), '1.0'])
+    summary = huc_batch.runBatch({'channel': task}, retries = 2, runner = runner)
+    # failed on the first attempt, no second copy of the job was submitted
+    assert summary[huc_batch.FAILED] == ['channel']
+    assert task.attempts == 1
+    running = os.listdir(os.path.join(spool, 'running'))
+    assert len([f for f in running if f.endswith(huc_worker.CANCEL_EXTENSION)]) == 1
+
+    worker.join()
+    done = os.listdir(os.path.join(spool, 'done'))
+    assert len(done) == 1
+    assert huc_worker.jobResult(spool, done[0][:-len('.json')])['cancelled']
+    assert os.listdir(os.path.join(spool, 'running')) == []
+    assert os.listdir(os.path.join(spool, 'incoming')) == []
+
+
+def test_cancelled_job_not_requeued(spool, tools):
+    jobId = huc_worker.submitJob(spool, [str(tools / 'ok.py')], 'cancelled')
+    huc_worker.claimJob(spool)
+    huc_worker.cancelJob(spool, jobId)
+    running = os.path.join(spool, 'running', jobId + '.json')
+    old = time.time() - 3600
+    os.utime(running, (old, old))
+    assert huc_worker.requeueStale(spool, staleAfter = 60) == []
+    assert os.listdir(os.path.join(spool, 'running')) == []
+    assert os.listdir(os.path.join(spool, 'incoming')) == []
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import raster_store
+
+# 4 rows, 5 columns of 10 m cells with the lower left corner at (1000, 2000)
+GEOREF = raster_store.makeGeoref(1000.0, 2000.0, 10.0, 4, 5)
+
+
+def grid():
+    g = np.arange(20, dtype = np.float32).reshape(4, 5)
+    g[0, 0] = -9999.0
+    g[2, 3] = np.nan
+    return g
+
+
+def test_put_get_round_trip(tmp_path):
+    store = raster_store.RasterStore(str(tmp_path / 'store'))
+    stored = store.put('dem', grid(), GEOREF, -9999.0)
+    np.testing.assert_array_equal(stored, grid())
+    assert stored.dtype == np.float32
+    assert not stored.flags.writeable
+    assert store.georef('dem') == GEOREF
+    assert store.nodata('dem') == -9999.0
+    assert store.names() == ['dem']
+    # statistics recorded once when written, without the nodata and NaN cells
+    assert store.statistics('dem')['count'] == 18
+
+    # a fresh store on the same directory sees the grid
+    again = raster_store.RasterStore(str(tmp_path / 'store'))
+    np.testing.assert_array_equal(again.get('dem'), grid())
+    again.delete('dem')
+    assert not store.exists('dem')
+
+    with pytest.raises(ValueError):
+        store.put('wrong', np.zeros((5, 4)), GEOREF)
+
+
+@pytest.mark.parametrize('blockRows', [1, 3, 1024])
+def test_grid_statistics_with_nodata(blockRows):
+    g = grid()
+    vals = g[(g != -9999.0) & ~np.isnan(g)].astype(np.float64)
+    stats = raster_store.gridStatistics(g, -9999.0, blockRows)
+    assert stats['count'] == vals.size
+    assert stats['min'] == vals.min()
+    assert stats['max'] == vals.max()
+    assert stats['mean'] == pytest.approx(vals.mean())
+    assert stats['std'] == pytest.approx(vals.std())
+
+    empty = raster_store.gridStatistics(np.full((3, 3), -1, dtype = np.int16), -1, blockRows)
+    assert empty == {'count': 0, 'min': None, 'max': None, 'mean': None, 'std': None}
+
+
+def test_cell_index_at_grid_edges():
+    # the upper left corner and just inside the lower right one are on the grid, cells hold their top
+    # and left edges, so points on the right or bottom edge or just off the top or left are not
+    x = np.array([1000.0, 1049.999, 999.999, 1050.0, 1020.0, 1020.0])
+    y = np.array([2040.0, 2000.001, 2020.0, 2020.0, 2000.0, 2040.001])
+    row, col, inside = raster_store.cellIndex(GEOREF, x, y)
+    assert inside.tolist() == [True, True, False, False, False, False]
+    assert (row[:2].tolist(), col[:2].tolist()) == ([0, 3], [0, 4])
+
+    values = raster_store.pointValues(grid(), GEOREF, x, y, -1)
+    assert values.tolist() == [-9999.0, 19.0, -1.0, -1.0, -1.0, -1.0]
+
+    # cell centers map back to their own cells
+    rows, cols = np.meshgrid(np.arange(4), np.arange(5), indexing = 'ij')
+    cx, cy = raster_store.cellCenters(GEOREF, rows.ravel(), cols.ravel())
+    r, c, inside = raster_store.cellIndex(GEOREF, cx, cy)
+    assert inside.all()
+    assert r.tolist() == rows.ravel().tolist() and c.tolist() == cols.ravel().tolist()
+
+
+@pytest.mark.parametrize('blockRows', [1, 3, 1024])
+def test_valid_cells(blockRows):
+    rows, cols = raster_store.validCells(grid(), -9999.0, blockRows)
+    expected = np.nonzero((grid() != -9999.0) & ~np.isnan(grid()))
+    assert rows.tolist() == expected[0].tolist()
+    assert cols.tolist() == expected[1].tolist()
+
+    # a 0/1 mask with 0 as nodata gives its 1 cells in row major order
+    mask = np.zeros((4, 5), dtype = np.uint8)
+    mask[[3, 0, 2], [1, 4, 0]] = 1
+    rows, cols = raster_store.validCells(mask, 0, blockRows)
+    assert list(zip(rows.tolist(), cols.tolist())) == [(0, 4), (2, 0), (3, 1)]
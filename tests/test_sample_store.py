@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import sample_store
+import sampler_functions as sf
+
+MANAGEMENT = ['333333333333', '222222222222', None, '111111111111', 'AAAAAAAAAAAA']
+
+
+def samples(seed = 0, nFlowpaths = 12):
+    '''Sample columns in shuffled order, flowpath ids 1..nFlowpaths with a few null lengths'''
+    rng = np.random.default_rng(seed)
+    fp = np.repeat(np.arange(1, nFlowpaths + 1), rng.integers(1, 9, nFlowpaths))
+    n = fp.size
+    fpLen = rng.permutation(n).astype(np.float64)
+    fpLen[rng.random(n) < 0.1] = np.nan
+    order = rng.permutation(n)
+    pick = lambda values: [values[i] for i in rng.integers(0, len(values), n)]
+    columns = {'fp': fp, 'fpLen': fpLen, 'elevation': rng.random(n) * 100, 'gord': rng.integers(1, 5, n),
+               'SOL_FY': rng.integers(100, 110, n), 'STATSGO2_MUKEY': pick(['12', '34', None, '56']),
+               'management': pick(MANAGEMENT), 'rotation': pick(['CBCB', 'BCBC', None]),
+               'irrigated': rng.integers(0, 2, n), 'canopy': rng.integers(-1, 100, n),
+               'x': rng.random(n), 'y': rng.random(n)}
+    return {c: [v[i] for i in order] if isinstance(v, list) else np.asarray(v)[order] for c, v in columns.items()}
+
+
+def rowsOf(columns, keep):
+    return {c: [x for x, k in zip(v, keep) if k] if isinstance(v, list) else np.asarray(v)[keep]
+            for c, v in columns.items()}
+
+
+def decoded(path):
+    '''Every column of a sample file as plain values, text columns decoded'''
+    with sample_store.SampleFile(path) as f:
+        out = {'ids': f.ids.tolist(), 'offsets': f.offsets.tolist()}
+        for c in f.columns:
+            if f.schema[c]['kind'] == 'categorical':
+                out[c] = f.categoricalColumn(c).tolist()
+            else:
+                out[c] = np.array(f.column(c)).tolist()
+        return out
+
+
+def test_blocks_match_one_write(tmp_path):
+    columns = samples()
+    whole = str(tmp_path / 'whole.smpl')
+    assert sample_store.writeSampleFile(whole, columns, '070801050902') == (len(columns['fp']), 12)
+
+    ids, counts = np.unique(columns['fp'], return_counts = True)
+    streamed = str(tmp_path / 'streamed.smpl')
+    writer = sample_store.SampleWriter(streamed, '070801050902')
+    for first, last in sf.flowpathBlocks(ids, counts, 15):
+        fp = np.asarray(columns['fp'])
+        writer.add(rowsOf(columns, (fp >= first) & (fp <= last)))
+    assert writer.close() == (len(columns['fp']), 12)
+
+    np.testing.assert_equal(decoded(streamed), decoded(whole))
+    assert sample_store.readHeader(streamed)['npoints'] == len(columns['fp'])
+    # no part files left beside the sample file
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['streamed.smpl', 'whole.smpl']
+
+
+def test_blocks_out_of_order(tmp_path):
+    columns = samples()
+    fp = np.asarray(columns['fp'])
+    path = str(tmp_path / 'out.smpl')
+    writer = sample_store.SampleWriter(path, '070801050902')
+    writer.add(rowsOf(columns, fp > 6))
+    with pytest.raises(ValueError):
+        writer.add(rowsOf(columns, fp <= 6))
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+
+import categorical
+import sampler_functions as sf
+
+CANOPY = [None, -1, 0, 5, 9.99, 10, 19, 20, 35, 40, 55, 60, 70, 85, 90, 100]
+MANAGEMENT = ['333333333333', None, '222222222222', '333333333333', None, '111111111111', '333333333333', None,
+              '222222222222', '333333333333', None, '111111111111', '222222222222', None, '333333333333', None]
+
+
+def ifChain(canopy, management):
+    '''The Sampler's canopy UpdateCursor before canopyManagement, with null canopy left alone'''
+    if canopy is None or canopy < 0:
+        return management
+    for threshold, letter in zip([90, 80, 70, 60, 50, 40, 30, 20, 10, 0], 'JIHGFEDCBA'):
+        if canopy >= threshold:
+            return letter * 12
+
+
+def test_canopy_management_matches_if_chain():
+    expected = [ifChain(c, m) for c, m in zip(CANOPY, MANAGEMENT)]
+    canopy = [np.nan if c is None else c for c in CANOPY]
+    assert sf.canopyManagement(canopy, MANAGEMENT).tolist() == expected
+
+    encoded = categorical.encode(MANAGEMENT)
+    out = sf.canopyManagement(canopy, encoded)
+    assert isinstance(out, categorical.Categorical)
+    assert out.tolist() == expected
+    # the input column is left as it was
+    assert encoded.tolist() == MANAGEMENT
+
+
+# (fp, fpLen, SSURGO, STATSGO, elevation) per flowpath, None for nulls. SSURGO 10 and 11 and STATSGO 500 have
+# soil files, 12, 13 and 501 do not
+FLOWPATHS = [
+    # leading nulls (a null length sorts first), then a change of map unit with a soil file
+    [(1, None, None, 500, 300.0), (1, 1.0, None, 500, 299.0), (1, 2.0, 10, 500, 298.0), (1, 3.0, 10, 500, 297.0),
+     (1, 4.0, 11, 501, 296.0)],
+    # a null after the first valid value is a dead end, even back on the same map unit
+    [(2, 1.0, 10, 500, 280.0), (2, 2.0, None, 500, 279.0), (2, 3.0, 10, 500, None), (2, 4.0, 11, 500, 277.0)],
+    # a change to a map unit without a soil file ends the flowpath
+    [(3, 1.0, 10, 501, 260.0), (3, 2.0, 12, 501, 259.0), (3, 3.0, 10, 501, 258.0)],
+    # the null length point with a valid value starts the flowpath, STATSGO keeps it alive
+    [(4, None, 13, 500, 240.0), (4, 1.0, 13, 500, 239.0), (4, 2.0, 11, 501, 238.0)],
+    # no soil file at the start
+    [(5, 1.0, 12, 501, 220.0), (5, 2.0, 12, 501, 219.0)],
+    [(0, 1.0, 10, 500, 200.0)],
+]
+
+
+def cursorWalk(rows, soilsDir):
+    '''The Sampler's SOL_Exists UpdateCursor before FlowpathIndex, rows in ORDER BY fp, fpLen order'''
+    out = []
+    prevFp = -9999
+    prevSol = -9999
+    deadEndFp = False
+    solExists = False
+    for fp, fpLen, ssurgo, statsgo, elev in rows:
+        if ssurgo is None:
+            solExists = False
+            statsgoExists = False
+            deadEndFp = True
+        else:
+            ssurgoExists = os.path.isfile(os.path.join(soilsDir, 'DEP_' + str(int(ssurgo)) + '.sol'))
+            statsgoExists = os.path.isfile(os.path.join(soilsDir, 'STATSGO_' + str(int(statsgo)) + '.sol'))
+            if prevFp == -9999 or fp != prevFp:
+                if ssurgoExists or statsgoExists:
+                    deadEndFp = False
+                    solExists = True
+                else:
+                    solExists = False
+                    deadEndFp = True
+            if prevFp != -9999 and fp == prevFp:
+                if ssurgo != prevSol:
+                    if (ssurgoExists or statsgoExists) and not deadEndFp:
+                        solExists = True
+                    else:
+                        solExists = False
+                        deadEndFp = True
+            prevFp = fp
+            prevSol = ssurgo
+        out.append((int(solExists), statsgoExists))
+    return out
+
+
+def test_sol_exists_matches_cursor_walk(tmp_path):
+    for name in ['DEP_10', 'DEP_11', 'STATSGO_500']:
+        (tmp_path / (name + '.sol')).write_text('')
+    rows = [r for fp in FLOWPATHS for r in fp]
+    # the geodatabase order: by flowpath, null lengths first, then by length
+    ordered = sorted(rows, key = lambda r: (r[0], r[1] is not None, r[1] or 0.0))
+    expected = dict(zip(ordered, cursorWalk(ordered, str(tmp_path))))
+
+    shuffled = [rows[i] for i in np.random.default_rng(0).permutation(len(rows))]
+    nan = lambda v: np.nan if v is None else v
+    fp = np.array([r[0] for r in shuffled])
+    fpLen = np.array([nan(r[1]) for r in shuffled], dtype = np.float64)
+    index = sf.FlowpathIndex(fp, fpLen)
+    sol, statsgoExists = sf.solExists(fp, fpLen, [nan(r[2]) for r in shuffled], [r[3] for r in shuffled],
+                                      str(tmp_path), index)
+    assert list(zip(sol.tolist(), statsgoExists.tolist())) == [expected[r] for r in shuffled]
+    assert [shuffled[i] for i in index.order] == ordered
+
+    # bad samples per flowpath (null_flowpaths), as a Statistics_analysis of the badSQL selection
+    elevNull = np.array([r[4] is None for r in shuffled])
+    bad = (fp == 0) | elevNull | (sol == 0) | np.isnan(fpLen)
+    badCounts = {}
+    for r in ordered:
+        if r[0] == 0 or r[4] is None or expected[r][0] == 0 or r[1] is None:
+            badCounts[r[0]] = badCounts.get(r[0], 0) + 1
+    perFp = index.countWhere(bad)
+    assert dict(zip(index.ids[perFp > 0].tolist(), perFp[perFp > 0].tolist())) == badCounts
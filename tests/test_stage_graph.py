@@ -0,0 +1,112 @@
+import time
+import threading
+
+import pytest
+
+import stage_graph as sg
+
+
+class Recorder(object):
+    '''Stage functions that record the order they ran in, their thread and the cores held at once'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []
+        self.threads = {}
+        self.cores = 0
+        self.maxCores = 0
+        self.running = 0
+        self.maxRunning = 0
+
+    def func(self, name, seconds = 0.0, fail = False):
+        def run(cores):
+            with self.lock:
+                self.order.append(name)
+                self.threads[name] = threading.current_thread()
+                self.cores += cores
+                self.running += 1
+                self.maxCores = max(self.maxCores, self.cores)
+                self.maxRunning = max(self.maxRunning, self.running)
+            time.sleep(seconds)
+            with self.lock:
+                self.cores -= cores
+                self.running -= 1
+            if fail:
+                raise ValueError(name + ' failed')
+            return name + ' on ' + str(cores)
+        return run
+
+
+def test_dependency_order():
+    rec = Recorder()
+    stages = [sg.Stage('ad8', rec.func('ad8'), ['p'], ['ad8']),
+              sg.Stage('fill', rec.func('fill'), ['dem'], ['fel']),
+              sg.Stage('p', rec.func('p', 0.02), ['fel'], ['p']),
+              sg.Stage('src', rec.func('src'), ['ad8', 'p'], ['src'])]
+    results = sg.runStages(stages, maxConcurrent = 3, coreBudget = 4, available = ['dem'])
+    assert rec.order == ['fill', 'p', 'ad8', 'src']
+    assert results['src'] == 'src on 1'
+    assert [s.name for s in sg.linkStages(stages, ['dem'])] == ['fill', 'p', 'ad8', 'src']
+    assert stages[3].after == ['ad8', 'p']
+
+
+def test_link_errors():
+    noop = lambda cores: None
+    with pytest.raises(ValueError, match = 'cycle'):
+        sg.linkStages([sg.Stage('a', noop, ['y'], ['x']), sg.Stage('b', noop, ['x'], ['y']),
+                       sg.Stage('c', noop, [], ['z'])])
+    with pytest.raises(ValueError, match = 'no stage writes'):
+        sg.linkStages([sg.Stage('a', noop, ['missing'], ['x'])])
+    with pytest.raises(ValueError, match = 'written by'):
+        sg.linkStages([sg.Stage('a', noop, [], ['x']), sg.Stage('b', noop, [], ['x'])])
+
+
+def test_core_budget():
+    rec = Recorder()
+    # four independent TauDEM-like stages asking for 2 cores each, and one asking for more than the budget
+    stages = [sg.Stage('t' + str(i), rec.func('t' + str(i), 0.05), [], ['o' + str(i)], cores = 2) for i in range(4)]
+    stages.append(sg.Stage('big', rec.func('big', 0.05), [], ['big'], cores = 16))
+    results = sg.runStages(stages, maxConcurrent = 4, coreBudget = 4)
+    assert rec.maxCores <= 4
+    # two 2 core stages side by side, never more
+    assert rec.maxRunning == 2
+    assert results['big'] == 'big on 4'
+
+
+def test_main_thread_stages_inline():
+    rec = Recorder()
+    stages = [sg.Stage('arc1', rec.func('arc1', 0.02), [], ['a'], mainThread = True),
+              sg.Stage('tau', rec.func('tau', 0.05), [], ['t']),
+              sg.Stage('arc2', rec.func('arc2', 0.02), ['a'], ['b'], mainThread = True)]
+    sg.runStages(stages, maxConcurrent = 2, coreBudget = 2)
+    main = threading.current_thread()
+    assert rec.threads['arc1'] is main
+    assert rec.threads['arc2'] is main
+    assert rec.threads['tau'] is not main
+    # the worker thread stage ran alongside the main thread ones
+    assert rec.maxRunning == 2
+
+
+def test_failure_skips_dependents():
+    rec = Recorder()
+    stages = [sg.Stage('fill', rec.func('fill', fail = True), [], ['fel']),
+              sg.Stage('p', rec.func('p'), ['fel'], ['p']),
+              sg.Stage('ad8', rec.func('ad8'), ['p'], ['ad8']),
+              sg.Stage('bndy', rec.func('bndy', 0.02), [], ['bndy'])]
+    with pytest.raises(ValueError, match = 'fill failed'):
+        sg.runStages(stages, maxConcurrent = 2, coreBudget = 2)
+    assert [s.state for s in stages] == [sg.FAILED, sg.SKIPPED, sg.SKIPPED, sg.DONE]
+    assert 'p' not in rec.order and 'ad8' not in rec.order
+
+
+def test_one_at_a_time_keeps_listed_order():
+    rec = Recorder()
+    names = ['boundary', 'fill', 'pour', 'p', 'ad8']
+    stages = [sg.Stage('boundary', rec.func('boundary'), [], ['bndy'], mainThread = True),
+              sg.Stage('fill', rec.func('fill'), [], ['fel']),
+              sg.Stage('pour', rec.func('pour'), ['bndy'], ['pour'], mainThread = True),
+              sg.Stage('p', rec.func('p'), ['fel'], ['p']),
+              sg.Stage('ad8', rec.func('ad8'), ['p', 'pour'], ['ad8'], cores = 4)]
+    sg.runStages(stages, maxConcurrent = 1, coreBudget = 4)
+    assert rec.order == names
+    assert rec.maxRunning == 1
@@ -0,0 +1,34 @@
+import os
+
+import status_journal as sj
+
+
+def test_leftover_merge_is_claimed_before_pending(tmp_path):
+    d = str(tmp_path)
+    sj.appendResult(d, 'T', '070801050303', {'ChannelThreshold': 1000})
+    # an interrupted merge left its claimed file behind
+    os.replace(os.path.join(d, '070801050303' + sj.PENDING), os.path.join(d, '070801050303' + sj.PENDING + sj.MERGING))
+    sj.appendResult(d, 'T', '070801050303', {'ChannelThreshold': 2500})
+    sj.appendResult(d, 'T', '070801050304', {'ChannelThreshold': 1500})
+
+    claimed = sj.claimPending(d)
+
+    assert len(claimed) == 3
+    assert len(set(claimed)) == 3
+    assert all(os.path.isfile(c) for c in claimed)
+    # the leftover entry is older, the new one wins
+    assert sj.pendingResults(claimed, 'T') == {'070801050303': {'ChannelThreshold': 2500},
+                                               '070801050304': {'ChannelThreshold': 1500}}
+    assert not any(f.endswith(sj.PENDING) for f in os.listdir(d))
+
+
+def test_claim_again_after_interruption(tmp_path):
+    d = str(tmp_path)
+    sj.appendResult(d, 'T', '070801050303', {'ChannelThreshold': 1000})
+    first = sj.claimPending(d)
+    # the merge died before removing its claims, the next merge picks them up
+    second = sj.claimPending(d)
+    assert len(first) == len(second) == 1
+    assert first != second
+    assert not os.path.isfile(first[0])
+    assert sj.pendingResults(second, 'T') == {'070801050303': {'ChannelThreshold': 1000}}
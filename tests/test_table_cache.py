@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+import categorical
+import table_cache
+
+HUC12 = '070801050902'
+
+
+@pytest.fixture(autouse = True)
+def checked():
+    table_cache.resetChecked()
+    yield
+    table_cache.resetChecked()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return table_cache.TableCache(str(tmp_path / 'table_cache'))
+
+
+def test_text_keys_duplicates_and_nulls(cache):
+    columns = {'FBndID': ['F1', 'F2', None, 'F1', 'F3'],
+               'GenLU': ['Cropland', 'Forest', 'Water', 'Pasture', None],
+               'Acres': [10.5, None, 3.0, 7.25, 1.0]}
+    table = cache.fromColumns(HUC12, 'FB', columns)
+    rows = table.rows(['F1', 'F2', 'F3', 'F9', None, ''])
+    # the duplicated F1 resolves to its last row, a null key in the table or the target never matches
+    assert rows.tolist() == [3, 1, 4, -1, -1, -1]
+
+    joined = table.join(['F3', 'F1', None], ['GenLU', 'Acres'])
+    assert joined['GenLU'].tolist() == [None, 'Pasture', None]
+    np.testing.assert_array_equal(joined['Acres'], [1.0, 7.25, np.nan])
+
+
+def test_number_keys(cache):
+    columns = {'FBndID': [12, 7, None, 12, 30], 'Value': ['a', 'b', 'c', 'd', 'e']}
+    table = cache.fromColumns(HUC12, 'LU6', columns)
+    assert table._sorted.dtype.kind == 'i'
+    # numbers, text read from a cursor and nulls are all looked up against the int64 key
+    assert table.rows([12, 7, 30, 5]).tolist() == [3, 1, 4, -1]
+    assert table.rows(['12', '7', '', 'x', '12.5', None]).tolist() == [3, 1, -1, -1, -1, -1]
+    assert table.rows(np.array([12.0, 7.5, np.nan])).tolist() == [3, -1, -1]
+    assert table.join(['30', None], ['Value'])['Value'].tolist() == ['e', None]
+
+
+def test_join_codes(cache):
+    columns = {'FBndID': ['F1', 'F2', 'F3', 'F4'],
+               'CropRotatn': ['CBCB', 'BCBC', None, 'CBCB'],
+               'Residue': [55.0, 12.0, 30.0, None]}
+    table = cache.fromColumns(HUC12, 'RC', columns)
+    targets = ['F4', 'F9', 'F3', None, 'F1', 'F4']
+    plain = table.join(targets, ['CropRotatn', 'Residue'])
+    for keys in [targets, categorical.encode(targets)]:
+        coded = table.joinCodes(keys, ['CropRotatn', 'Residue'])
+        assert isinstance(coded['CropRotatn'], categorical.Categorical)
+        assert coded['CropRotatn'].tolist() == plain['CropRotatn'].tolist() == ['CBCB', None, None, None, 'CBCB', 'CBCB']
+        np.testing.assert_array_equal(coded['Residue'], plain['Residue'])
+
+
+def test_stamp_invalidation_and_reset_checked(cache, tmp_path):
+    source = tmp_path / 'acpf.gdb'
+    source.mkdir()
+    (source / 'a.gdbtable').write_text('1')
+    os.utime(str(source / 'a.gdbtable'), (1000, 1000))
+    sourceTable = str(source / 'FB070801050902')
+    stamp = table_cache.sourceStamp(sourceTable)
+    assert stamp == 1000
+
+    cache.fromColumns(HUC12, 'FB', {'FBndID': ['F1'], 'GenLU': ['Cropland']}, source = sourceTable, stamp = stamp)
+    assert cache.isCurrent(HUC12, 'FB', stamp)
+    # a table with the fields asked for is used as it is, without arcpy
+    assert cache.table(HUC12, 'FB', sourceTable, ['GenLU']).rows(['F1']).tolist() == [0]
+
+    # anything written to the geodatabase makes the cached table stale
+    os.utime(str(source / 'a.gdbtable'), (2000, 2000))
+    newStamp = table_cache.sourceStamp(sourceTable)
+    assert not cache.isCurrent(HUC12, 'FB', newStamp)
+    # within the process it was checked already, so it is not looked at again until resetChecked
+    assert cache.table(HUC12, 'FB', sourceTable, ['GenLU']).nrows == 1
+    table_cache.resetChecked()
+    assert table_cache._checked == {}
+
+    cache.fromColumns(HUC12, 'FB', {'FBndID': ['F1', 'F2'], 'GenLU': ['Cropland', 'Forest']},
+                      source = sourceTable, stamp = newStamp)
+    table_cache.resetChecked()
+    assert cache.isCurrent(HUC12, 'FB', newStamp)
+    assert cache.table(HUC12, 'FB', sourceTable, ['GenLU']).rows(['F2']).tolist() == [1]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import flow_functions as ff
+import raster_store
+import tile_functions
+
+
+def makeDem(n = 60, seed = 3):
+    '''Sloping surface with pits, a flat plateau and a nodata corner'''
+    rng = np.random.default_rng(seed)
+    r, c = np.mgrid[0:n, 0:n].astype(np.float64)
+    dem = 100.0 + 0.2 * r + 0.05 * c + rng.normal(0.0, 0.3, (n, n))
+    dem[10:20, 30:45] = 105.0
+    dem[rng.integers(0, n, 40), rng.integers(0, n, 40)] -= 2.0
+    dem[:8, :8] = np.nan
+    return np.round(dem, 2)
+
+
+@pytest.fixture(scope = 'module')
+def wholeGrid():
+    dem = makeDem()
+    fel = ff.fillDepressions(dem)
+    p = ff.flowDirectionD8(fel)
+    return dem, fel, p, ff.areaD8(p)
+
+
+@pytest.mark.parametrize('tileSize', [7, 16, 33, 60])
+def test_tiled_matches_whole_grid(wholeGrid, tileSize):
+    dem, fel, p, ad8 = wholeGrid
+    tFel = tile_functions.fillTiled(dem, np.empty(dem.shape), tileSize)
+    np.testing.assert_array_equal(tFel, fel)
+    tP = tile_functions.flowDirectionTiled(tFel, np.zeros(dem.shape, dtype = np.uint8), tileSize)
+    np.testing.assert_array_equal(tP, p)
+    # cell counts, so the different order of the sums does not show
+    tAd8 = tile_functions.areaD8Tiled(tP, np.empty(dem.shape), tileSize)
+    np.testing.assert_array_equal(tAd8, ad8)
+
+
+def test_channel_grids_tiled_in_store(tmp_path, wholeGrid):
+    dem, fel, p, ad8 = wholeGrid
+    store = raster_store.RasterStore(str(tmp_path / 'store'))
+    store.put('dem', dem, raster_store.makeGeoref(0.0, 0.0, 3.0, dem.shape[0], dem.shape[1]))
+    sFel, sP, sAd8 = tile_functions.channelGridsTiled(store, 'dem', 16)
+    np.testing.assert_array_equal(sFel, fel)
+    np.testing.assert_array_equal(sP, p)
+    np.testing.assert_array_equal(sAd8, ad8)
+    assert store.georef('demad8') == store.georef('dem')
+
+
+@pytest.mark.parametrize('tileSize', [7, 16, 33])
+def test_channel_grids_tiled_equals_untiled(tmp_path, tileSize):
+    # the two paths of cmd_channel_DEP.channelStages, a DEM with a nodata value as add_raster stores it
+    dem = makeDem().astype(np.float32)
+    nodata = np.float32(-3.4028235e+38)
+    dem[np.isnan(dem)] = nodata
+    georef = raster_store.makeGeoref(0.0, 0.0, 3.0, dem.shape[0], dem.shape[1])
+    grids = []
+    for name, size in [('untiled', None), ('tiled', tileSize)]:
+        store = raster_store.RasterStore(str(tmp_path / name))
+        store.put('dem', dem, georef, nodata)
+        grids.append(tile_functions.channelGrids(store, 'dem', size))
+        assert store.nodata('demp') == 0
+    for untiled, tiled in zip(*grids):
+        assert untiled.dtype == tiled.dtype
+        np.testing.assert_array_equal(untiled, tiled)
+    assert np.isnan(grids[0][0][:8, :8]).all()
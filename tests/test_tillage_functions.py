@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import categorical
+import tillage_functions as tf
+
+GENLU = ['Cropland', 'Cropland', 'LT 10 ac', 'Forest', 'Pasture|Grass|Hay', 'Water/wetland', None, 'Cropland']
+ROTATIONS = ['CBCBCBCBCBCBCB', 'BCBCBCBCBCBCBC', 'WWCCBBWWCCBBGG', 'FFFFFFFFFFFFFF', None, 'PPPPPPPPPPPPPP',
+             'CCCCCCCCCCCCCB', 'GCGCGCGCGCGCGC']
+RESIDUE = [55.0, 12.0, 30.0, 80.0, 20.0, None, 3.0, -100.0]
+FIELD_LEN = 14
+
+
+@pytest.fixture(autouse = True)
+def noFlipFlop(monkeypatch):
+    # ties in the mean code are broken by the clock, pin them
+    monkeypatch.setattr(tf, 'flip_flop', lambda: True)
+
+
+def fields(nHucs):
+    '''The test fields repeated for each HUC12, residue shifted so the HUC12 defaults differ'''
+    groups, genlu, rotations, residue = [], [], [], []
+    for h in range(nHucs):
+        huc12 = '0708010503' + '%02d' % h
+        for g, c, r in zip(GENLU, ROTATIONS, RESIDUE):
+            groups.append(huc12)
+            genlu.append(g)
+            rotations.append(c)
+            residue.append(None if r is None or r < 0 else r + 7.0 * h)
+    return groups, genlu, rotations, residue
+
+
+@pytest.mark.parametrize('option', ['none', 'uniform', 'linear'])
+def test_grouped_matches_per_huc12(option):
+    groups, genlu, rotations, residue = fields(4)
+    managements, till_codes, defaults = tf.assignManagementsGrouped(groups, genlu, rotations, residue, FIELD_LEN, option)
+
+    for huc12 in sorted(set(groups)):
+        rows = [i for i, g in enumerate(groups) if g == huc12]
+        m, t, default, n_default = tf.assignManagements([genlu[i] for i in rows], [rotations[i] for i in rows],
+                                                        [residue[i] for i in rows], FIELD_LEN, option)
+        assert [managements[i] for i in rows] == m
+        assert [till_codes[i] for i in rows] == t
+        assert defaults[huc12] == (default, n_default)
+
+
+def test_grouped_encoded_decodes_to_lists():
+    groups, genlu, rotations, residue = fields(3)
+    plain = tf.assignManagementsGrouped(groups, genlu, rotations, residue, FIELD_LEN, 'none')
+    encoded = tf.assignManagementsGrouped(categorical.encode(groups), categorical.encode(genlu),
+                                          categorical.encode(rotations), residue, FIELD_LEN, 'none', encoded = True)
+    assert encoded[0].tolist() == plain[0]
+    assert encoded[1].tolist() == plain[1]
+    assert encoded[2] == plain[2]
+
+
+def test_fallback_default_without_residue():
+    managements, till_codes, default, n_default = tf.assignManagements(['Cropland'], ['CBCB'], [None], 4, 'none')
+    assert (default, n_default) == (tf.FALLBACK_MANAGEMENT, 0)
+    assert managements == [tf.FALLBACK_MANAGEMENT * 4]
+
+
+YEARS = ['2019', '2020', '2021', '2022', '2023']
+FIRST_MAN = {'F1': '0000234', 'F2': '1111111', 'F3': '0000000'}
+CODES = {'F1': ['2', '3', '0', '4', '4'], 'F2': ['1', '1', '2', '1', '2'], 'F3': ['0', '0', '0', '0', '0']}
+
+
+def fullState(start, end):
+    n = YEARS.index(end) + 1
+    state = tf.newTillageState(start, end)
+    for fbndid in FIRST_MAN:
+        tf.addFieldState(state, fbndid, FIRST_MAN[fbndid], CODES[fbndid][:n])
+    return state
+
+
+@pytest.mark.parametrize('prevEnd', YEARS[:-1])
+def test_incremental_matches_full_summary(prevEnd):
+    # from every previous summary, including a single year one (prevEnd == start)
+    state = fullState(YEARS[0], prevEnd)
+    for year in YEARS[YEARS.index(prevEnd) + 1:]:
+        i = YEARS.index(year)
+        tf.appendYear(state, year, {f: CODES[f][i] for f in CODES})
+
+    assert state == fullState(YEARS[0], YEARS[-1])
+    for fbndid in FIRST_MAN:
+        # the first management is kept as it was, the summary table gets it back from the state
+        assert state['fields'][fbndid]['first_man'] == FIRST_MAN[fbndid]
+        assert tf.summarizeFieldState(state['fields'][fbndid]) == tf.summarizeTillCodes(FIRST_MAN[fbndid], CODES[fbndid])
+
+
+def test_append_year_checks_year_and_fields():
+    state = fullState(YEARS[0], YEARS[1])
+    with pytest.raises(ValueError):
+        tf.appendYear(state, YEARS[3], {f: '1' for f in CODES})
+    with pytest.raises(ValueError):
+        tf.appendYear(state, YEARS[2], {'F1': '1'})
+
+
+def test_state_round_trip(tmp_path):
+    state = fullState(YEARS[0], YEARS[-1])
+    stateFile = str(tmp_path / 'state' / 'till.json')
+    assert tf.loadTillageState(stateFile) is None
+    tf.saveTillageState(state, stateFile)
+    assert tf.loadTillageState(stateFile) == state
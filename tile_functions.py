@@ -0,0 +1,499 @@
+## tile_functions.py
+## Tiled, out-of-core versions of the Fill, FlowDirection and AreaD8 steps of flow_functions.py, for HUC12
+##  DEMs too big for the whole grid chain to sit in memory (or in one MPI job) at once.
+##
+## Grids are read and written a tile at a time (memory-mapped arrays, e.g. from raster_store.RasterStore),
+##  each tile with a one cell halo of its neighbors, so peak memory follows the tile size rather than the
+##  HUC12 size. Only small per-tile summaries of the tile edges are kept for the whole grid:
+##   fill           - a tile-boundary spill elevation graph (Barnes 2016, "Parallel priority-flood depression
+##                    filling for trillion cell digital elevation models"). Each tile is flooded once from its
+##                    edge to label its cells by the perimeter cell that reached them, the labels are joined by
+##                    their lowest shared spill elevation, the graph is solved from the edge of the data and
+##                    each tile is flooded again from its perimeter raised to the solved spill elevations.
+##   flow direction - steepest descent per tile, then the distance of flat cells to the nearest draining cell
+##                    of the same elevation is relaxed tile by tile, exchanging halos until no tile changes.
+##   contributing   - each tile records its entry cells (flow in from a neighbor tile) with the cell their flow
+##   area             leaves the tile to, and the local area leaving each exit. The entry graph is accumulated
+##                    in D8 order and each tile is accumulated again with its inflows added.
+##
+## Results are the same as flow_functions.fillDepressions, flowDirectionD8 and areaD8 on the whole grid
+##  (weighted contributing area to rounding, the sums are added in a different order), whatever the tile size.
+##  cmd_channel_DEP.py makes demfel, demp and demad8 with channelGrids, the whole grid at once with
+##  flow_functions or a tile at a time here, so a tiled run gives the same grids as an untiled one.
+##
+## 2026.10.19 - original coding
+## 2026.10.19 - added channelGrids, the whole grid or tiled flow grids of cmd_channel_DEP.py from one engine
+
+import os
+import heapq
+import shutil
+import tempfile
+import collections
+import numpy as np
+
+import flow_functions as ff
+
+TILE_SIZE = 2048
+
+# largest flat distance, flat cells that never reach a draining cell keep it
+FLAT_INF = np.iinfo(np.int32).max - 1
+
+
+def tileWindows(nrows, ncols, tileSize = TILE_SIZE):
+    '''(r0, r1, c0, c1) of each tile of a grid in row major order'''
+    return [(r0, min(r0 + tileSize, nrows), c0, min(c0 + tileSize, ncols))
+            for r0 in range(0, nrows, tileSize) for c0 in range(0, ncols, tileSize)]
+
+
+def readWindow(grid, window, halo, fill):
+    '''Copy of a tile of a grid with halo cells of its neighbors all around, cells off the grid get fill'''
+    r0, r1, c0, c1 = window
+    nrows, ncols = grid.shape
+    out = np.full((r1 - r0 + 2 * halo, c1 - c0 + 2 * halo), fill, dtype = np.result_type(grid.dtype, np.min_scalar_type(fill)))
+    rr0 = max(0, r0 - halo)
+    rr1 = min(nrows, r1 + halo)
+    cc0 = max(0, c0 - halo)
+    cc1 = min(ncols, c1 + halo)
+    out[rr0 - r0 + halo:rr1 - r0 + halo, cc0 - c0 + halo:cc1 - c0 + halo] = grid[rr0:rr1, cc0:cc1]
+    return out
+
+
+def readElevations(grid, window, nodata = None):
+    '''float64 tile with a one cell halo, NaN for nodata and off the grid'''
+    r0, r1, c0, c1 = window
+    nrows, ncols = grid.shape
+    win = readWindow(grid, window, 1, np.nan if grid.dtype.kind == 'f' else 0)
+    valid = ff.validMask(win, nodata)
+    # integer grids have no NaN, so mark the halo off the grid by position
+    rows = np.arange(r0 - 1, r1 + 1)
+    cols = np.arange(c0 - 1, c1 + 1)
+    valid &= ((rows >= 0) & (rows < nrows))[:, None] & ((cols >= 0) & (cols < ncols))[None, :]
+    return np.where(valid, win, np.nan).astype(np.float64)
+
+
+def neighborOffCore(shape, k):
+    '''True for the cells of a tile whose D8 neighbor k is outside the tile'''
+    nrows, ncols = shape
+    rows = np.arange(nrows) + ff.D8_ROW[k]
+    cols = np.arange(ncols) + ff.D8_COL[k]
+    return ((rows < 0) | (rows >= nrows))[:, None] | ((cols < 0) | (cols >= ncols))[None, :]
+
+
+def globalIndex(window, ncols):
+    '''Flat index in the whole grid of each cell of a tile'''
+    r0, r1, c0, c1 = window
+    return (np.arange(r0, r1)[:, None] * ncols + np.arange(c0, c1)[None, :]).astype(np.int64)
+
+
+def scratchDir(workDir):
+    '''Temporary directory for scratch grids, under workDir if given'''
+    if workDir is not None and not os.path.isdir(workDir):
+        os.makedirs(workDir)
+    return tempfile.mkdtemp(prefix = 'tiles_', dir = workDir)
+
+
+##-------------------------------------------------------------------------------------------------------
+## Fill
+
+def priorityFlood(z, seeds, seedZ, seedLabels = None):
+    '''Priority-flood a tile (NaN for nodata) from seed cells given as flat indexes with their
+    starting elevations. Returns the filled tile and, with seedLabels, the label of the seed
+    that reached each cell (-1 where no seed did).'''
+    nrows, ncols = z.shape
+    w = ncols + 2
+    fel = np.full((nrows + 2, ncols + 2), np.nan)
+    fel[1:-1, 1:-1] = z
+    fel = fel.ravel()
+    closed = np.ones((nrows + 2, ncols + 2), dtype = bool)
+    closed[1:-1, 1:-1] = np.isnan(z)
+    closed = closed.ravel()
+    offsets = [int(dr * w + dc) for dr, dc in zip(ff.D8_ROW, ff.D8_COL)]
+
+    s = (seeds // ncols + 1) * w + seeds % ncols + 1
+    fel[s] = seedZ
+    closed[s] = True
+    lab = None
+    if seedLabels is not None:
+        lab = np.full(fel.size, -1, dtype = np.int64)
+        lab[s] = seedLabels
+    heap = list(zip(fel[s].tolist(), s.tolist()))
+    heapq.heapify(heap)
+
+    pit = collections.deque()
+    while heap or pit:
+        if pit:
+            i = pit.popleft()
+            zi = fel[i]
+        else:
+            zi, i = heapq.heappop(heap)
+        for off in offsets:
+            j = i + off
+            if closed[j]:
+                continue
+            closed[j] = True
+            if lab is not None:
+                lab[j] = lab[i]
+            if fel[j] <= zi:
+                fel[j] = zi
+                pit.append(j)
+            else:
+                heapq.heappush(heap, (fel[j], j))
+
+    fel = fel.reshape(nrows + 2, ncols + 2)[1:-1, 1:-1]
+    if lab is None:
+        return fel
+    return fel, lab.reshape(nrows + 2, ncols + 2)[1:-1, 1:-1]
+
+
+def fillSeeds(zwin):
+    '''Edge of the data (valid cells next to nodata or the grid edge) and the remaining
+    valid cells on the tile perimeter, for a tile read with a one cell halo'''
+    validWin = ~np.isnan(zwin)
+    valid = validWin[1:-1, 1:-1]
+    ocean = np.zeros(valid.shape, dtype = bool)
+    for k in range(8):
+        ocean |= ~ff.shifted(validWin, k, False)[1:-1, 1:-1]
+    ocean &= valid
+    border = np.zeros(valid.shape, dtype = bool)
+    border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+    perimeter = valid & border & ~ocean
+    return valid, ocean, perimeter, border
+
+
+def minEdges(a, b, w):
+    '''Keep the lowest weight of each (a, b) pair of label graph edges, a < b'''
+    a, b = np.minimum(a, b), np.maximum(a, b)
+    keep = a != b
+    a, b, w = a[keep], b[keep], w[keep]
+    if a.size == 0:
+        return a, b, w
+    order = np.lexsort((w, b, a))
+    a, b, w = a[order], b[order], w[order]
+    first = np.ones(a.size, dtype = bool)
+    first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+    return a[first], b[first], w[first]
+
+
+def tileSpillEdges(zwin, window, ncols):
+    '''Label graph edges of one tile: labels meeting inside the tile at their spill
+    elevation, perimeter cells to their neighbors in the next tile, and perimeter cells
+    on the edge of the data to the outside (label 0). Perimeter cell labels are the
+    cell's flat index + 1.'''
+    z = zwin[1:-1, 1:-1]
+    valid, ocean, perimeter, border = fillSeeds(zwin)
+    gidx = globalIndex(window, ncols)
+    seeds = np.flatnonzero(ocean | perimeter)
+    labels = np.where(ocean.ravel()[seeds], 0, gidx.ravel()[seeds] + 1)
+    fel, lab = priorityFlood(np.where(valid, z, np.nan), seeds, z.ravel()[seeds], labels)
+
+    ea, eb, ew = [], [], []
+    # labels meeting inside the tile, E, NE, N and NW cover every pair of neighbors once
+    for k in range(4):
+        nbLab = ff.shifted(lab, k, -1)
+        nbFel = ff.shifted(fel, k, np.nan)
+        m = valid & (nbLab >= 0) & (nbLab != lab)
+        ea.append(lab[m])
+        eb.append(nbLab[m])
+        ew.append(np.maximum(fel[m], nbFel[m]))
+
+    # perimeter cells reached by the edge of the data drain out at their own elevation
+    m = border & ocean
+    ea.append(gidx[m] + 1)
+    eb.append(np.zeros(int(m.sum()), dtype = np.int64))
+    ew.append(z[m])
+
+    # perimeter cells to their neighbors across the tile boundary
+    for k in range(8):
+        nbZ = ff.shifted(zwin, k, np.nan)[1:-1, 1:-1]
+        m = valid & border & neighborOffCore(z.shape, k) & ~np.isnan(nbZ)
+        ea.append(gidx[m] + 1)
+        eb.append(gidx[m] + int(ff.D8_ROW[k] * ncols + ff.D8_COL[k]) + 1)
+        ew.append(np.maximum(z[m], nbZ[m]))
+
+    return minEdges(np.concatenate(ea).astype(np.int64), np.concatenate(eb).astype(np.int64), np.concatenate(ew))
+
+
+def solveSpillGraph(a, b, w):
+    '''Lowest spill elevation from the edge of the data (label 0) to every label,
+    a minimax Dijkstra over the label graph. Returns the sorted labels and their spill elevations.'''
+    a, b, w = minEdges(a, b, w)
+    nodes = np.unique(np.concatenate([[0], a, b]))
+    ia = np.searchsorted(nodes, a)
+    ib = np.searchsorted(nodes, b)
+    src = np.concatenate([ia, ib])
+    dst = np.concatenate([ib, ia])
+    wt = np.concatenate([w, w])
+    order = np.argsort(src, kind = 'stable')
+    dst = dst[order].tolist()
+    wt = wt[order].tolist()
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(src, minlength = nodes.size))]).tolist()
+
+    spill = np.full(nodes.size, np.inf)
+    spill[0] = -np.inf
+    done = np.zeros(nodes.size, dtype = bool)
+    heap = [(-np.inf, 0)]
+    while heap:
+        g, i = heapq.heappop(heap)
+        if done[i]:
+            continue
+        done[i] = True
+        for e in range(offsets[i], offsets[i + 1]):
+            j = dst[e]
+            gj = max(g, wt[e])
+            if gj < spill[j]:
+                spill[j] = gj
+                heapq.heappush(heap, (gj, j))
+    return nodes, spill
+
+
+def fillTiled(dem, out, tileSize = TILE_SIZE, nodata = None):
+    '''Fill depressions a tile at a time into out (float grid, NaN for nodata), the same
+    result as flow_functions.fillDepressions on the whole grid. Returns out.'''
+    nrows, ncols = dem.shape
+    windows = tileWindows(nrows, ncols, tileSize)
+
+    ea, eb, ew = [], [], []
+    for window in windows:
+        a, b, w = tileSpillEdges(readElevations(dem, window, nodata), window, ncols)
+        ea.append(a)
+        eb.append(b)
+        ew.append(w)
+    nodes, spill = solveSpillGraph(np.concatenate(ea), np.concatenate(eb), np.concatenate(ew))
+    del ea, eb, ew
+
+    for window in windows:
+        r0, r1, c0, c1 = window
+        zwin = readElevations(dem, window, nodata)
+        z = zwin[1:-1, 1:-1]
+        valid, ocean, perimeter, border = fillSeeds(zwin)
+        seeds = np.flatnonzero(ocean | perimeter)
+        seedZ = z.ravel()[seeds]
+        per = perimeter.ravel()[seeds]
+        labels = globalIndex(window, ncols).ravel()[seeds[per]] + 1
+        seedZ[per] = np.maximum(seedZ[per], spill[np.searchsorted(nodes, labels)])
+        out[r0:r1, c0:c1] = priorityFlood(np.where(valid, z, np.nan), seeds, seedZ)
+    return out
+
+
+##-------------------------------------------------------------------------------------------------------
+## Flow direction
+
+def steepestDescent(zwin):
+    '''TauDEM D8 codes of the steepest downhill neighbor of each cell of a tile read with a
+    one cell halo, cells on the edge of the data without one flow off it, flats are 0'''
+    z = zwin[1:-1, 1:-1]
+    valid = ~np.isnan(z)
+    best = np.zeros(z.shape)
+    p = np.zeros(z.shape, dtype = np.uint8)
+    outward = np.zeros(z.shape, dtype = np.uint8)
+    for k in range(8):
+        nb = ff.shifted(zwin, k, np.nan)[1:-1, 1:-1]
+        drop = (z - nb) / ff.D8_DIST[k]
+        better = valid & (drop > best)
+        best[better] = drop[better]
+        p[better] = k + 1
+        off = valid & np.isnan(nb) & (outward == 0)
+        outward[off] = k + 1
+    edgeOut = valid & (p == 0) & (outward > 0)
+    p[edgeOut] = outward[edgeOut]
+    return p
+
+
+def relaxFlatDistance(zwin, dwin, flat):
+    '''Distance of the flat cells of a tile to the nearest draining cell of the same
+    elevation, given the distances of the halo cells. Returns the tile's distances.'''
+    z = zwin[1:-1, 1:-1]
+    same = [ff.shifted(zwin, k, np.nan)[1:-1, 1:-1] == z for k in range(8)]
+    d = dwin.copy()
+    while True:
+        core = d[1:-1, 1:-1]
+        cand = core.copy()
+        for k in range(8):
+            nbD = ff.shifted(d, k, FLAT_INF)[1:-1, 1:-1] + 1
+            cand = np.where(flat & same[k] & (nbD < cand), nbD, cand)
+        if np.array_equal(cand, core):
+            return core
+        d[1:-1, 1:-1] = cand
+
+
+def flowDirectionTiled(fel, out, tileSize = TILE_SIZE, nodata = None, workDir = None):
+    '''D8 flow direction (TauDEM codes) a tile at a time into out (uint8 grid), the same
+    result as flow_functions.flowDirectionD8 on the whole grid. Returns out.'''
+    nrows, ncols = fel.shape
+    windows = tileWindows(nrows, ncols, tileSize)
+    tmpDir = scratchDir(workDir)
+    try:
+        dist = np.lib.format.open_memmap(os.path.join(tmpDir, 'flatdist.npy'), mode = 'w+',
+                                         dtype = np.int32, shape = (nrows, ncols))
+        for window in windows:
+            r0, r1, c0, c1 = window
+            p = steepestDescent(readElevations(fel, window, nodata))
+            out[r0:r1, c0:c1] = p
+            dist[r0:r1, c0:c1] = np.where(p > 0, 0, FLAT_INF)
+
+        # exchange halos until the flat distances settle
+        changed = True
+        while changed:
+            changed = False
+            for window in windows:
+                r0, r1, c0, c1 = window
+                zwin = readElevations(fel, window, nodata)
+                flat = ~np.isnan(zwin[1:-1, 1:-1]) & (out[r0:r1, c0:c1] == 0)
+                if not flat.any():
+                    continue
+                dwin = readWindow(dist, window, 1, FLAT_INF).astype(np.int64)
+                d = relaxFlatDistance(zwin, dwin, flat)
+                if not np.array_equal(d, dwin[1:-1, 1:-1]):
+                    dist[r0:r1, c0:c1] = d
+                    changed = True
+
+        # flat cells take the first direction toward a neighbor one step closer
+        for window in windows:
+            r0, r1, c0, c1 = window
+            zwin = readElevations(fel, window, nodata)
+            z = zwin[1:-1, 1:-1]
+            p = np.array(out[r0:r1, c0:c1])
+            flat = ~np.isnan(z) & (p == 0)
+            if not flat.any():
+                continue
+            dwin = readWindow(dist, window, 1, FLAT_INF).astype(np.int64)
+            d = dwin[1:-1, 1:-1]
+            flat &= d < FLAT_INF
+            for k in range(8):
+                nbD = ff.shifted(dwin, k, FLAT_INF)[1:-1, 1:-1]
+                nbZ = ff.shifted(zwin, k, np.nan)[1:-1, 1:-1]
+                take = flat & (p == 0) & (nbZ == z) & (nbD < d)
+                p[take] = k + 1
+            out[r0:r1, c0:c1] = p
+        del dist
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors = True)
+    return out
+
+
+##-------------------------------------------------------------------------------------------------------
+## Contributing area
+
+def localAccumulate(ds, active, acc):
+    '''Add each active cell's accumulation to its receivers, in place'''
+    for level in ff.topologicalLevels(ds, active):
+        t = ds[level]
+        m = t >= 0
+        np.add.at(acc, t[m], acc[level[m]])
+    return acc
+
+
+def tileFlow(pwin, window, ncols, weights = None):
+    '''Receivers, starting accumulation, entry cells and exit targets of a tile of D8
+    codes read with a one cell halo (0 off the grid)'''
+    r0, r1, c0, c1 = window
+    pc = pwin[1:-1, 1:-1]
+    shape = pc.shape
+    active = ((pc > 0) & (pc <= 8)).ravel()
+    ds = ff.downstreamIndex(pc)
+    if weights is None:
+        acc = active.astype(np.float64)
+    else:
+        acc = np.where(active, np.nan_to_num(np.asarray(weights[r0:r1, c0:c1], dtype = np.float64).ravel()), 0.0)
+
+    gidx = globalIndex(window, ncols).ravel()
+    exitTo = np.full(pc.size, -1, dtype = np.int64)
+    entry = np.zeros(pc.size, dtype = bool)
+    code = np.where(active, pc.ravel().astype(np.int64) - 1, 0)
+    for k in range(8):
+        offCore = neighborOffCore(shape, k).ravel()
+        nbP = ff.shifted(pwin, k, 0)[1:-1, 1:-1].ravel()
+        nbActive = (nbP > 0) & (nbP <= 8)
+        # flow out of the tile into an active cell of the next tile
+        m = active & (code == k) & offCore & nbActive
+        exitTo[m] = gidx[m] + int(ff.D8_ROW[k] * ncols + ff.D8_COL[k])
+        # flow into the tile from the next tile
+        entry |= active & offCore & (nbP == (k + 4) % 8 + 1)
+    return ds, active, acc, exitTo, entry
+
+
+def areaD8Tiled(p, out, tileSize = TILE_SIZE, weights = None):
+    '''D8 contributing area (or summed weights) a tile at a time into out (float grid, NaN
+    where p has no direction), the same result as flow_functions.areaD8 on the whole grid.
+    Returns out.'''
+    nrows, ncols = p.shape
+    windows = tileWindows(nrows, ncols, tileSize)
+
+    # per tile: where the flow through each entry cell leaves the tile, and how much local area leaves
+    entryIds, entryExit, outIds, outArea = [], [], [], []
+    for window in windows:
+        ds, active, acc, exitTo, entry = tileFlow(readWindow(p, window, 1, 0), window, ncols, weights)
+        acc = localAccumulate(ds, active, acc)
+        ends = ff.segmentEnds(ds)
+        gidx = globalIndex(window, ncols).ravel()
+        entryIds.append(gidx[entry])
+        entryExit.append(exitTo[ends[entry]])
+        m = exitTo >= 0
+        outIds.append(exitTo[m])
+        outArea.append(acc[m])
+
+    # accumulate the entry cell graph, every exit lands on an entry cell of the next tile
+    entryIds = np.concatenate(entryIds)
+    entryExit = np.concatenate(entryExit)
+    outIds = np.concatenate(outIds)
+    outArea = np.concatenate(outArea)
+    order = np.argsort(entryIds)
+    entryIds = entryIds[order]
+    entryExit = entryExit[order]
+    inflow = np.zeros(entryIds.size)
+    np.add.at(inflow, np.searchsorted(entryIds, outIds), outArea)
+    dsEntry = np.where(entryExit >= 0, np.searchsorted(entryIds, entryExit), -1)
+    inflow = localAccumulate(dsEntry, np.ones(entryIds.size, dtype = bool), inflow)
+    del entryExit, outIds, outArea, dsEntry
+
+    for window in windows:
+        r0, r1, c0, c1 = window
+        ds, active, acc, exitTo, entry = tileFlow(readWindow(p, window, 1, 0), window, ncols, weights)
+        gidx = globalIndex(window, ncols).ravel()
+        acc[entry] += inflow[np.searchsorted(entryIds, gidx[entry])]
+        acc = localAccumulate(ds, active, acc)
+        acc[~active] = np.nan
+        out[r0:r1, c0:c1] = acc.reshape(r1 - r0, c1 - c0)
+    return out
+
+
+##-------------------------------------------------------------------------------------------------------
+
+def channelGridsTiled(store, demName, tileSize = TILE_SIZE, felName = 'demfel', pName = 'demp', ad8Name = 'demad8'):
+    '''Filled DEM, D8 flow direction and contributing area of a DEM in a RasterStore,
+    written to the store a tile at a time'''
+    dem = store.get(demName)
+    georef = store.georef(demName)
+
+    # keep the DEM's precision so the flow directions match the whole grid path
+    fel = store.create(felName, georef, np.result_type(dem.dtype, np.float32), None)
+    fillTiled(dem, fel, tileSize, store.nodata(demName))
+    store.finalize(felName, fel)
+    del fel
+    fel = store.get(felName)
+
+    p = store.create(pName, georef, np.uint8, 0)
+    flowDirectionTiled(fel, p, tileSize, workDir = store.storeDir)
+    store.finalize(pName, p)
+    del p
+
+    ad8 = store.create(ad8Name, georef, np.float32, None)
+    areaD8Tiled(store.get(pName), ad8, tileSize)
+    store.finalize(ad8Name, ad8)
+    del ad8
+    return store.get(felName), store.get(pName), store.get(ad8Name)
+
+
+def channelGrids(store, demName, tileSize = None, felName = 'demfel', pName = 'demp', ad8Name = 'demad8'):
+    '''channelGridsTiled, or without a tileSize the same grids from flow_functions on the whole grid at once'''
+    if tileSize is not None:
+        return channelGridsTiled(store, demName, tileSize, felName, pName, ad8Name)
+    dem = store.get(demName)
+    georef = store.georef(demName)
+
+    # stored at the precision channelGridsTiled keeps, the flow directions are found from the stored grid
+    fel = ff.fillDepressions(dem, store.nodata(demName))
+    fel = store.put(felName, fel.astype(np.result_type(dem.dtype, np.float32)), georef, None)
+    p = store.put(pName, ff.flowDirectionD8(fel), georef, 0)
+    store.put(ad8Name, ff.areaD8(p).astype(np.float32), georef, None)
+    return store.get(felName), store.get(pName), store.get(ad8Name)
@@ -0,0 +1,423 @@
+## tillage_functions.py
+## Management/tillage code logic used by cmd_tillage_assign.pyt, kept free of arcpy so it can be
+##  run and benchmarked on plain Python/NumPy arrays of field attributes.
+##
+## 2026.10.19 - moved getManagement, calc_rescover, getCropDict and flip_flop out of cmd_tillage_assign.pyt,
+##               added assignManagements for the per-field loops of tillageAssign
+## 2026.10.19 - moved the multi-year summary logic here as summarizeTillCodes, added the running tillage
+##               state used by the incremental mode of cmd_tillage_assign.pyt
+## 2026.10.19 - added assignManagementsGrouped, the array version of assignManagements for the fields of
+##               many HUC12s at once with a default management per HUC12
+## 2026.10.19 - assignManagementsGrouped takes and returns dictionary encoded columns (categorical.py)
+
+import os
+import json
+import math
+import time
+import numpy as np
+
+import categorical
+
+## fill all crop management fields by setting breaks between tillage classes)
+# bcover = [0.25, 0.15, 0.10, 0.05, 0.02]#soybeans, ## these values from David Mulla's calculations
+bcover = [0.54, 0.18, 0.06, 0.03, 0.02]# from Eduardo Luquin re-analysis of Bean/Corn rotation in WEPP 2022
+# ccover = [0.70, 0.45, 0.30, 0.15, 0.05]#corn, ## these values from David Mulla's calculations
+ccover = [0.82, 0.57, 0.33, 0.17, 0.08]# from Eduardo Luquin re-analysis of Bean/Corn rotation in WEPP 2022
+cccover = [0.73, 0.27, 0.19, 0.11, 0.07]
+## these values from DEP 2018 paper
+gcover = [0.65, 0.40, 0.12, 0.06, 0.03]#sorghum
+wcover = [0.50, 0.40, 0.20, 0.15, 0.06]#wheat
+
+# GenLU values left out when finding the default management
+DEFAULT_EXCLUDED_GENLU = ['LT 10 ac', 'Forest', 'Pasture|Grass|Hay', 'Water/wetland']
+# GenLU values that never get a residue cover based management
+NO_RESIDUE_GENLU = ['Forest', 'Pasture|Grass|Hay', "Water/wetland"]
+
+# used when no field in the HUC12 has a valid residue cover
+FALLBACK_MANAGEMENT = '3'
+
+
+def getManagement(rescover, crop, coverlist):
+    '''This function takes a residue cover value and crop type and determines the tillage code'''
+    ## assign tillage codes by average crop residue cover/crop type
+    ## 1- no-till planter tillage
+    ## 2- very high mulch tillage
+    ## 3- high mulch tillage
+    ## 4- medium mulch tillage
+    ## 5- low mulch tillage
+    ## 6- fall moldboard plow (plow
+
+    if rescover < 0:
+        rescover = 0
+
+    if coverlist is not None:
+        if rescover > coverlist[0]:
+            management = '1'
+        elif rescover > coverlist[1]:
+            management = '2'
+        elif rescover > coverlist[2]:
+            management = '3'
+        elif rescover > coverlist[3]:
+            management = '4'
+        elif rescover > coverlist[4]:
+            management = '5'
+        else:
+            management = '6'
+    else:
+        management = '0'
+
+    return management
+
+
+def adjustResCover(residue, option = 'straight'):
+    """determine the DEP residue cover given the median residue cover (percent).
+    Minnesota residue cover doubling should already be removed so it
+    equals GEE residue cover"""
+
+    if residue >= 0:#-100 indicates no data
+        res_fraction = residue/100.0                    #0.20
+        if option == 'uniform':
+            # adjust residue cover from GEE down 10% due to anchored r2 still having a high intercept
+            # needs to be removed after improved GEE regressions
+            adj_rescover = res_fraction - 0.1               #0.10
+
+        elif option == 'linear':
+            # adjustment altered to linearly ramp correction from 10% at 0% RC to 0% at 100% RC - 2023.07.26, bkgelder
+            soil_fraction = 1.0 - res_fraction              #0.80
+            adjustment = 0.1 * soil_fraction                #0.08
+            adj_rescover = res_fraction - adjustment        #0.12
+
+        elif option == 'none':
+             adj_rescover = res_fraction                    #0.20
+
+        rescover = max(0.0, adj_rescover)
+##        print(f"initial residue {res_fraction}, soil {soil_fraction}, adjustment {adjustment}, adj_res {adj_rescover}, final_res {rescover}")
+
+    else:
+        rescover = None
+
+    return rescover
+
+
+def calc_rescover(urow, option = 'straight'):
+    """determine the DEP residue cover from the residue cover in urow[3]"""
+    return adjustResCover(urow[3], option)
+
+
+def getCropDict(bcover, ccover, gcover, wcover):
+    """Create the crop dictionary, add new residue cover levels as needed"""
+    cropDict = {'B': bcover}
+    cropDict.update({'C': ccover})
+    cropDict.update({'G': gcover})
+    cropDict.update({'W': wcover})
+    #sugarbeets, all following, assume wheat for now
+    cropDict.update({'E': wcover})
+    #rice
+    cropDict.update({'J': wcover})
+    #oilseeds (canola, safflower, flax, rape
+    cropDict.update({'O': wcover})
+    #double crops, assume residue cover calced for winter wheat
+    cropDict.update({'L': wcover})
+
+    return cropDict
+
+
+def flip_flop():
+    str_time = str(time.perf_counter())
+    last_digit = int(str_time[-1])
+    if last_digit % 2 == 0:
+        ff = True
+    else:
+        ff = False
+    return ff
+
+
+def fieldManagement(genlu, croprotate, residue, field_len, option, cropDict, excluded = NO_RESIDUE_GENLU):
+    '''Management code from residue cover for a single field, False if it cannot be calculated'''
+    if croprotate is None:
+        return False
+    # go two years back in crop rotation to align with spring residue cover type (e.g. 2021 res cover is from 2020 crop)
+    mancrop = croprotate[:field_len][-2]
+    if residue is not None and genlu not in excluded:
+        adj_rescover = adjustResCover(residue, option)
+    else:
+        adj_rescover = None
+    if mancrop in cropDict and adj_rescover is not None:
+        return getManagement(adj_rescover, mancrop, cropDict[mancrop])
+    return False
+
+
+def defaultManagement(genlu, croprotate, residue, field_len, option, cropDict):
+    '''Median management code of the larger crop fields with a valid residue cover,
+    returns the default and the number of fields it was calculated from'''
+    man_list = []
+    for g, c, r in zip(genlu, croprotate, residue):
+        if g is None or g in DEFAULT_EXCLUDED_GENLU:
+            continue
+        got_man = fieldManagement(g, c, r, field_len, option, cropDict, excluded = [])
+        if got_man is not False:
+            man_list.append(int(got_man))
+
+    if len(man_list) == 0:
+        return FALLBACK_MANAGEMENT, 0
+    return str(int(np.median(np.array(man_list, dtype = float)))), len(man_list)
+
+
+def managementString(croprotate, got_man, default, field_len, cropDict):
+    '''Management codes for every year of a field's rotation, and the tillage code for the field'''
+    if croprotate is None:
+        # no data on crop rotation, managements = 0
+        managements = '0' * field_len
+    else:
+        managements = ''
+        for crop in croprotate[:field_len]:
+            if crop in cropDict:
+                if got_man is not False:
+                    managements += got_man
+                else:
+                    managements += default
+            else:
+                managements += '0'
+
+    till_code_long = managements.replace('0', '')
+    if len(till_code_long) == 0:
+        till_code = '0'
+    else:
+        till_code = till_code_long[0]
+    return managements, till_code
+
+
+def assignManagements(genlu, croprotate, residue, field_len, option, cropDict = None):
+    '''Management strings and tillage codes for a HUC12's fields given lists of GenLU, CropRotatn
+    and median residue cover (None where missing). Returns (managements, till_codes, default, n_default).'''
+    if cropDict is None:
+        cropDict = getCropDict(bcover, ccover, gcover, wcover)
+
+    default, n_default = defaultManagement(genlu, croprotate, residue, field_len, option, cropDict)
+
+    managements = []
+    till_codes = []
+    for g, c, r in zip(genlu, croprotate, residue):
+        got_man = fieldManagement(g, c, r, field_len, option, cropDict)
+        m, t = managementString(c, got_man, default, field_len, cropDict)
+        managements.append(m)
+        till_codes.append(t)
+
+    return managements, till_codes, default, n_default
+
+
+def managementCodes(residue, mancrop, option, cropDict):
+    '''Array version of getManagement(adjustResCover(residue, option), crop, cropDict[crop]) for median
+    residue cover (percent, NaN for missing) and crop letters, '' where no code can be calculated'''
+    residue = np.asarray(residue, dtype = np.float64)
+    mancrop = np.asarray(mancrop)
+    valid = ~np.isnan(residue)
+    valid[valid] = residue[valid] >= 0#-100 indicates no data
+    res_fraction = np.where(valid, residue, 0.0) / 100.0
+    if option == 'uniform':
+        adj_rescover = res_fraction - 0.1
+    elif option == 'linear':
+        adj_rescover = res_fraction - 0.1 * (1.0 - res_fraction)
+    elif option == 'none':
+        adj_rescover = res_fraction
+    else:
+        raise ValueError('unknown residue cover option: ' + str(option))
+    rescover = np.maximum(0.0, adj_rescover)
+
+    codes = np.full(residue.shape, '', dtype = 'U1')
+    for crop, coverlist in cropDict.items():
+        use = valid & (mancrop == crop)
+        if coverlist is None:
+            codes[use] = '0'
+            continue
+        # the first break the residue cover is over gives the code, 6 if none
+        crop_codes = np.full(int(use.sum()), '6', dtype = 'U1')
+        r = rescover[use]
+        for k in range(len(coverlist) - 1, -1, -1):
+            crop_codes[r > coverlist[k]] = str(k + 1)
+        codes[use] = crop_codes
+    return codes
+
+
+def groupedMedianCode(inverse, ngroups, codes):
+    '''int() of the median of the integer codes in each group as in defaultManagement, codes of '' are left
+    out. Returns the median (-1 for groups without codes) and the number of codes of each group.'''
+    use = codes != ''
+    vals = codes[use].astype(np.int64)
+    grp = inverse[use]
+    order = np.lexsort((vals, grp))
+    vals = vals[order]
+    counts = np.bincount(grp, minlength = ngroups)
+    starts = np.cumsum(counts) - counts
+    median = np.full(ngroups, -1, dtype = np.int64)
+    has = counts > 0
+    lo = vals[starts[has] + (counts[has] - 1) // 2]
+    hi = vals[starts[has] + counts[has] // 2]
+    median[has] = np.floor((lo + hi) / 2.0).astype(np.int64)
+    return median, counts
+
+
+def assignManagementsGrouped(groups, genlu, croprotate, residue, field_len, option, cropDict = None, encoded = False):
+    '''assignManagements for the fields of many HUC12s in one pass, groups holds each field's HUC12 and the
+    default management is the median of each HUC12's own fields. Returns (managements, till_codes,
+    {group: (default, n_default)}), the same as assignManagements run on each HUC12 separately.
+    groups, genlu and croprotate may be lists or categorical.Categorical columns, the GenLU and rotation
+    work is done once per distinct value. With encoded, managements and till_codes come back as
+    Categorical columns to be decoded when they are written.'''
+    if cropDict is None:
+        cropDict = getCropDict(bcover, ccover, gcover, wcover)
+
+    groups = categorical.encode(groups)
+    genlu = categorical.encode(genlu)
+    croprotate = categorical.encode(croprotate)
+    width = max(field_len, 1)
+
+    # crop letters of each distinct rotation, plus a last empty rotation for fields without one
+    rot = np.array([c[:field_len] for c in croprotate.categories.tolist()] + [''], dtype = 'U' + str(width))
+    chars = np.ascontiguousarray(rot).view('U1').reshape(rot.size, width)[:, :field_len]
+    rot_len = np.char.str_len(rot)
+    rot_codes = croprotate.codes
+    has_rot = rot_codes >= 0
+
+    # go two years back in crop rotation to align with spring residue cover type (e.g. 2021 res cover is from 2020 crop)
+    rot_mancrop = np.full(rot.size, '', dtype = 'U1')
+    long_enough = rot_len >= 2
+    rot_mancrop[long_enough] = chars[long_enough, rot_len[long_enough] - 2]
+
+    residue = np.array([np.nan if r is None else r for r in residue], dtype = np.float64)
+    got = managementCodes(residue, rot_mancrop[rot_codes], option, cropDict)
+    got[~has_rot] = ''
+
+    # default from the larger crop fields of each HUC12, per field codes leave out forest, grass and water
+    default_use = genlu.mapCategories(lambda g: g not in DEFAULT_EXCLUDED_GENLU, missing = False, dtype = bool)
+    median, n_default = groupedMedianCode(groups.codes, groups.categories.size, np.where(default_use, got, ''))
+    defaults = np.where(median >= 0, median.astype(str), FALLBACK_MANAGEMENT)
+    field_use = genlu.mapCategories(lambda g: g not in NO_RESIDUE_GENLU, missing = True, dtype = bool)
+    code = np.where(field_use & (got != ''), got, defaults[groups.codes])
+
+    # management strings are built once per distinct (rotation, code) pair
+    is_crop = np.isin(chars, list(cropDict))
+    code_values, code_idx = np.unique(code, return_inverse = True)
+    pair_rot, pair_code, pair_of = categorical.pairCodes(rot_codes, code_idx.ravel(), code_values.size)
+    man_chars = np.where(is_crop[pair_rot], code_values[pair_code][:, None], np.where(chars[pair_rot] == '', '', '0'))
+    # no data on crop rotation, managements = 0
+    man_chars[pair_rot < 0] = '0'
+    pair_man = categorical.encode(np.ascontiguousarray(man_chars.astype('U1')).view('U' + str(width)).ravel())
+    managements = categorical.Categorical(pair_man.codes[pair_of], pair_man.categories)
+    till_codes = np.where(is_crop.any(axis = 1)[rot_codes] & (code != '0'), code, '0')
+
+    group_defaults = {g: (d, int(c)) for g, d, c in zip(groups.categories.tolist(), defaults.tolist(), n_default.tolist())}
+    if encoded:
+        return managements, categorical.encode(till_codes), group_defaults
+    return managements.tolist(), till_codes.tolist(), group_defaults
+
+
+def roundMeanCode(float_mean_management):
+    '''Round a mean tillage code, ties (x.5) go up half the time and down the other half'''
+    try:
+        ir = float_mean_management.as_integer_ratio()
+        if ir[1] == 2:
+            ff = flip_flop()
+            if ff:
+                int_mean_management = math.floor(float_mean_management)
+            else:
+                int_mean_management = math.ceil(float_mean_management)
+        else:
+            int_mean_management = round(float_mean_management)
+    except:
+        int_mean_management = -1
+    return int_mean_management
+
+
+def meanCodes(all_codes, int_mean_management):
+    '''Replace every nonzero code in a management string with the mean code'''
+    mean_codes = ""
+    for c in all_codes:
+        if c != '0':
+            c = str(int_mean_management)
+        mean_codes += c
+    return mean_codes
+
+
+def summarizeTillCodes(first_man, till_codes):
+    '''Dynamic management string, mean tillage code and mean management string for a field from its
+    first year's management string and the tillage code of every year in the summary'''
+    dynam_codes = "".join(till_codes)
+
+    # seed with the mean for non-observed years
+    # last value in first_man is same as first value in dynamic codes, so omit
+    all_codes = first_man[:-1] + dynam_codes
+
+    # try to figure out the mean value for all the tillage codes in the timeframe
+    try:
+        str_arr = np.array(till_codes)
+        int_arr = np.asarray(str_arr, dtype = int)
+        int_arr_nz = int_arr[int_arr > 0]
+        if len(int_arr_nz) > 0:
+            float_mean_management = np.mean(int_arr_nz)
+        else:
+            float_mean_management = 0
+    except:
+        float_mean_management = -1
+
+    int_mean_management = roundMeanCode(float_mean_management)
+    return all_codes, str(int_mean_management), meanCodes(all_codes, int_mean_management)
+
+
+##-------------------------------------------------------------------------------------------------------
+## running per-field tillage state, so a new residue cover year only needs that year's tillage codes
+##  {'start': 2014, 'end': 2023, 'fields': {FBndID: {'first_man': str, 'codes': str, 'count': int, 'sum': int}}}
+##  codes holds one tillage code per year from start to end, count and sum are over the nonzero codes
+
+def newTillageState(start, end):
+    return {'version': 1, 'start': int(start), 'end': int(end), 'fields': {}}
+
+
+def addFieldState(state, fbndid, first_man, till_codes):
+    '''Record a field's first management string and yearly tillage codes'''
+    codes = "".join(till_codes)
+    nz = [int(c) for c in codes if c != '0']
+    state['fields'][fbndid] = {'first_man': first_man, 'codes': codes, 'count': len(nz), 'sum': sum(nz)}
+
+
+def appendYear(state, year, till_codes):
+    '''Append one year's {FBndID: tillage code} to the running state'''
+    if int(year) != state['end'] + 1:
+        raise ValueError('tillage state ends in ' + str(state['end']) + ', cannot append ' + str(year))
+    if set(till_codes) != set(state['fields']):
+        raise ValueError('fields in ' + str(year) + ' do not match the fields in the tillage state')
+    for fbndid, code in till_codes.items():
+        f = state['fields'][fbndid]
+        f['codes'] += code
+        if code != '0':
+            f['count'] += 1
+            f['sum'] += int(code)
+    state['end'] = int(year)
+
+
+def summarizeFieldState(fstate):
+    '''summarizeTillCodes from the running count and sum instead of re-reading every year'''
+    all_codes = fstate['first_man'][:-1] + fstate['codes']
+    if fstate['count'] > 0:
+        float_mean_management = fstate['sum'] / fstate['count']
+    else:
+        float_mean_management = 0
+    int_mean_management = roundMeanCode(float_mean_management)
+    return all_codes, str(int_mean_management), meanCodes(all_codes, int_mean_management)
+
+
+def saveTillageState(state, stateFile):
+    stateDir = os.path.dirname(stateFile)
+    if stateDir != '' and not os.path.isdir(stateDir):
+        os.makedirs(stateDir)
+    tmp = stateFile + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, stateFile)
+
+
+def loadTillageState(stateFile):
+    if not os.path.isfile(stateFile):
+        return None
+    with open(stateFile) as f:
+        return json.load(f)